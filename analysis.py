@@ -0,0 +1,86 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def daily_usage(df):
+    """
+    Aggregate sessions (or daily rollups) into per-user daily totals
+
+    Everything is computed from a single groupby over (user_id, date), so
+    the cost is linear in the number of rows regardless of how many users
+    there are.
+
+    Args:
+        df: DataFrame with user_id, username, date (datetime64) and
+            duration (seconds) columns, plus an optional sessions column
+            with the number of sessions each row stands for (1 if absent)
+
+    Returns:
+        tuple: (daily, users) where daily is a DataFrame of hours indexed by
+        date with one column per user_id (NaN on days without activity) and
+        users is a list of {'user_id', 'username', 'total_hours',
+        'daily_avg', 'sessions'} ordered by first active day
+    """
+    if 'sessions' not in df:
+        df = df.assign(sessions=1)
+
+    grouped = df.groupby(['user_id', 'date'], sort=True, observed=True).agg(
+        duration=('duration', 'sum'),
+        sessions=('sessions', 'sum')
+    )
+    daily = grouped['duration'].unstack('user_id') / 3600
+
+    per_user = grouped.reset_index().groupby('user_id', observed=True).agg(
+        total=('duration', 'sum'),
+        days=('duration', 'size'),
+        sessions=('sessions', 'sum'),
+        first_day=('date', 'min')
+    )
+    per_user = per_user.sort_values(['first_day']).reset_index()
+
+    # Usernames change; show the most recent one for each user_id
+    usernames = df.sort_values('date', kind='stable').drop_duplicates('user_id', keep='last')
+    usernames = dict(zip(usernames['user_id'], usernames['username']))
+
+    total_hours = per_user['total'] / 3600
+    users = [
+        {
+            'user_id': user_id,
+            'username': usernames[user_id],
+            'total_hours': round(float(hours), 1),
+            'daily_avg': round(float(hours / days), 1),
+            'sessions': int(sessions)
+        }
+        for user_id, hours, days, sessions in zip(
+            per_user['user_id'], total_hours, per_user['days'], per_user['sessions'])
+    ]
+    return daily[[u['user_id'] for u in users]], users
+
+
+def _synthetic_sessions(rows, users=50, days=365, seed=0):
+    rng = np.random.default_rng(seed)
+    user_ids = rng.integers(0, users, rows).astype(str)
+    return pd.DataFrame({
+        'user_id': user_ids,
+        'username': np.char.add('user_', user_ids),
+        'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, days, rows), unit='D'),
+        'duration': rng.integers(60, 4 * 3600, rows)
+    })
+
+
+def benchmark(sizes=(10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)):
+    """Print daily_usage wall time per input size to check linear scaling"""
+    print(f"{'rows':>10} {'seconds':>10} {'us/row':>8}")
+    for rows in sizes:
+        df = _synthetic_sessions(rows)
+        start = time.perf_counter()
+        daily_usage(df)
+        elapsed = time.perf_counter() - start
+        print(f"{rows:>10} {elapsed:>10.4f} {elapsed / rows * 1e6:>8.3f}")
+
+
+if __name__ == "__main__":
+    benchmark(tuple(int(arg) for arg in sys.argv[1:]) or (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6))
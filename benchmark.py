@@ -0,0 +1,287 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import test_data
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+SESSIONS_PER_DAY = 10
+MAX_DAYS = 365
+
+
+def data_shape(size):
+    """Return (days, users) giving size sessions at SESSIONS_PER_DAY per user"""
+    days = min(MAX_DAYS, math.ceil(size / (len(test_data.BASE_USERS) * SESSIONS_PER_DAY)))
+    users = math.ceil(size / (days * SESSIONS_PER_DAY))
+    return days, users
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+
+def prepare_workdir(workdir, backend):
+    """
+    Point a copy of config.json at a scratch directory and import the bots
+
+    The bots read config.json from the working directory at import time, so
+    this chdirs into workdir first. Webhook sends are dropped so a run never
+    posts to the configured webhooks.
+    """
+    with open(os.path.join(REPO_DIR, 'config.json'), 'r') as f:
+        config = json.load(f)
+
+    fonts = {name: os.path.join(REPO_DIR, path) for name, path in config['paths']['fonts'].items()}
+    config['paths'] = {
+        'session_data': os.path.join(workdir, 'data', 'session_data.json'),
+        'logs': os.path.join(workdir, 'logs', 'bot_logs.txt'),
+        'fonts': fonts,
+        'images': os.path.join(workdir, 'images', ''),
+        'temp': os.path.join(workdir, 'temp', '')
+    }
+    config['storage'] = dict(config.get('storage', {}), mode=backend,
+                             database=os.path.join(workdir, 'data', 'session_data.db'))
+    config['logging'] = dict(config.get('logging', {}), level='WARNING')
+
+    os.makedirs(os.path.join(workdir, 'data'), exist_ok=True)
+    with open(os.path.join(workdir, 'config.json'), 'w') as f:
+        json.dump(config, f, indent=4)
+    os.chdir(workdir)
+
+    import dataanalyst
+    import selbot
+    for bot_module in (selbot, dataanalyst):
+        bot_module.webhooks.send_text = lambda *args, **kwargs: None
+        bot_module.webhooks.send_payload = lambda *args, **kwargs: None
+    # Every stats image call should draw and encode, not hit the cache
+    selbot.stats_renderer.max_age = 0
+    return config, selbot, dataanalyst
+
+
+def load_data(config, selbot, dataanalyst, size, seed):
+    """Generate size sessions and reopen both bots' stores on them"""
+    import range_stats
+    import session_feed
+    import session_store
+
+    selbot.store.close()
+    dataanalyst.store.close()
+
+    days, users = data_shape(size)
+    sessions = test_data.generate_sessions(days=days, users=users, sessions_per_day=(SESSIONS_PER_DAY, SESSIONS_PER_DAY),
+                                           inactive_rate=0, seed=seed)
+    path = config['paths']['session_data']
+    storage = config['storage']
+    test_data.write_sessions(itertools.islice(sessions, size), path, storage['mode'], storage['database'])
+
+    selbot.store = session_store.open_store(path, storage)
+    dataanalyst.store = session_store.open_store(path, storage, readonly=True)
+    # Everything selbot builds on its store at import has to follow it, or
+    # saves and /stats would run against the empty startup data
+    selbot.ranges = range_stats.RangeIndex.from_store(selbot.store)
+    selbot.store.subscribe(selbot.ranges.on_save)
+    if selbot.feed is not None:
+        selbot.feed = session_feed.FeedServer(selbot.feed.address, selbot.store.daily_totals())
+        selbot.store.subscribe(selbot.feed.on_save)
+    return [user['id'] for user in test_data.make_users(users)], days
+
+
+def make_benchmarks(selbot, dataanalyst, user_ids, days, seed):
+    """
+    Return {name: (run(ops), ops)} for the operations being measured
+
+    run(ops) performs the operation ops times with inputs drawn from the
+    generated data set.
+    """
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [datetime.fromtimestamp(today.timestamp() - d * 86400).strftime('%Y-%m-%d') for d in range(1, days + 1)]
+
+    def save(ops):
+        now = int(time.time())
+        for _ in range(ops):
+            user_id = rng.choice(user_ids)
+            start_time = now - rng.randint(600, 72000)
+            selbot.save_daily_session(user_id, f"User_{user_id}", start_time, start_time + rng.randint(60, 600))
+
+    def stats(ops):
+        found = 0
+        for _ in range(ops):
+            result = selbot.get_daily_stats(rng.choice(user_ids), rng.choice(dates))
+            found += bool(result and result['sessions'])
+        if not found:
+            raise RuntimeError("get_daily_stats found no sessions; the range index isn't built on the benchmark data")
+
+    def analyze(ops):
+        for _ in range(ops):
+            if not dataanalyst.analyze_data():
+                raise RuntimeError("analyze_data failed (see the log file in the work directory)")
+
+    def stats_image(ops):
+        for _ in range(ops):
+            selbot.create_stats_image()
+
+    return {
+        'save_daily_session': (save, 200),
+        'get_daily_stats': (stats, 1000),
+        'analyze_data': (analyze, 1),
+        'create_stats_image': (stats_image, 20)
+    }
+
+
+def measure(run, ops, memory_ops):
+    """
+    Time ops calls, then measure peak traced memory over memory_ops calls
+
+    Memory is measured in a separate pass because tracemalloc slows Python
+    code down several times. Allocations in the chart worker process are
+    not included.
+    """
+    start = time.perf_counter()
+    run(ops)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        run(memory_ops)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'ops': ops, 'seconds': elapsed, 'seconds_per_op': elapsed / ops, 'peak_memory_bytes': peak}
+
+
+def scaling_exponent(points):
+    """
+    Least-squares slope of log(seconds_per_op) against log(sessions)
+
+    0 means the per-call cost doesn't depend on the data size, 1 means it
+    grows linearly with it.
+    """
+    if len(points) < 2:
+        return None
+    xs = [math.log(p['sessions']) for p in points]
+    ys = [math.log(max(p['seconds_per_op'], 1e-12)) for p in points]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+
+def run_benchmarks(sizes, backend, seed, only=None):
+    """Run every benchmark at every size and return the results document"""
+    commit, dirty = git_commit()
+    document = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': backend,
+        'seed': seed,
+        'sizes': list(sizes),
+        'results': {},
+        'scaling': {}
+    }
+
+    workdir = tempfile.mkdtemp(prefix='selbot-bench-')
+    config, selbot, dataanalyst = prepare_workdir(workdir, backend)
+    dataanalyst.chart_renderer.warm_up().result()
+
+    for size in sizes:
+        start = time.perf_counter()
+        user_ids, days = load_data(config, selbot, dataanalyst, size, seed)
+        print(f"{size} sessions ({len(user_ids)} users x {days} days) loaded in {time.perf_counter() - start:.1f}s")
+
+        benchmarks = make_benchmarks(selbot, dataanalyst, user_ids, days, seed)
+        for name, (run, ops) in benchmarks.items():
+            if only and name not in only:
+                continue
+            result = measure(run, ops, max(1, ops // 10))
+            result['sessions'] = size
+            document['results'].setdefault(name, []).append(result)
+            print(f"  {name:<20} {result['seconds_per_op'] * 1000:>10.3f} ms/op "
+                  f"{result['peak_memory_bytes'] / 1024 ** 2:>9.1f} MB peak")
+
+    for name, points in document['results'].items():
+        document['scaling'][name] = scaling_exponent(points)
+
+    selbot.store.close()
+    dataanalyst.chart_renderer.shutdown()
+    return document
+
+
+def print_report(document, baseline=None):
+    """Print the per-size curves, and the change against a baseline run"""
+    print(f"\nCommit {document['commit']}{' (dirty)' if document['dirty'] else ''}, backend {document['backend']}")
+    for name, points in document['results'].items():
+        exponent = document['scaling'].get(name)
+        scaling = f"scaling exponent {exponent:.2f}" if exponent is not None else "scaling n/a"
+        print(f"\n{name} ({scaling})")
+        previous = {}
+        if baseline:
+            previous = {p['sessions']: p for p in baseline['results'].get(name, [])}
+        for point in points:
+            line = (f"  {point['sessions']:>10} {point['seconds_per_op'] * 1000:>10.3f} ms/op "
+                    f"{point['peak_memory_bytes'] / 1024 ** 2:>9.1f} MB")
+            old = previous.get(point['sessions'])
+            if old:
+                line += f"   x{point['seconds_per_op'] / old['seconds_per_op']:.2f} time vs {baseline['commit']}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark session storage, stats, analysis and the stats image")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma separated session counts, e.g. 1e3,1e5,1e7")
+    parser.add_argument('--backend', choices=test_data.BACKENDS, default='journal')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help="Comma separated benchmark names")
+    parser.add_argument('--output', help="Results file (default benchmarks/<commit>-<time>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(float(size)) for size in args.sizes.split(',')]
+    only = set(args.only.split(',')) if args.only else None
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    # Resolved now; the run changes into a scratch directory
+    output = os.path.abspath(args.output) if args.output else None
+
+    document = run_benchmarks(sizes, args.backend, args.seed, only)
+
+    if output is None:
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(REPO_DIR, 'benchmarks', f"{document['commit']}-{stamp}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=4)
+
+    print_report(document, baseline)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
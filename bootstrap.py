@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; the startup report then omits RSS
+    resource = None
+
+CONFIG_PATH = 'config.json'
+
+# Keys both entry points need; each adds its own token and webhook
+REQUIRED_KEYS = ('webhooks.logs', 'paths.session_data', 'paths.logs', 'command_prefix')
+
+_config = None
+
+
+def _lookup(config, dotted):
+    value = config
+    for key in dotted.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _ensure_directories(paths):
+    for path in paths.values():
+        if isinstance(path, str) and not path.endswith('.json') and not path.endswith('.txt'):
+            os.makedirs(path, exist_ok=True)
+        elif isinstance(path, dict):
+            # Handle nested paths like fonts
+            for nested_path in path.values():
+                os.makedirs(os.path.dirname(nested_path), exist_ok=True)
+
+
+def load_config(required=()):
+    """
+    Read, validate and cache config.json
+
+    Called by each entry point before it imports anything heavy, so a bad
+    config fails in milliseconds. Later calls in the same process return the
+    cached dict instead of parsing the file again.
+
+    Args:
+        required: Dotted keys (e.g. 'tokens.selfbot') needed besides REQUIRED_KEYS
+
+    Returns:
+        dict: The parsed config
+    """
+    global _config
+    if _config is not None:
+        return _config
+
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        print(f"Error: {CONFIG_PATH} not found!")
+        sys.exit(1)
+    except json.JSONDecodeError as e:
+        print(f"Error: {CONFIG_PATH} is not valid JSON: {e}")
+        sys.exit(1)
+
+    missing = [key for key in REQUIRED_KEYS + tuple(required) if _lookup(config, key) is None]
+    if missing:
+        print(f"Error: {CONFIG_PATH} is missing {', '.join(missing)}")
+        sys.exit(1)
+
+    _ensure_directories(config['paths'])
+    _config = config
+    return config
+
+
+def _rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StartupTimer:
+    """
+    Wall time of each startup phase of an entry point
+
+    Create it with a time.perf_counter() taken at the top of the module,
+    mark() the end of each phase and call finish() once the gateway is
+    connected.
+    """
+
+    def __init__(self, started):
+        self.started = started
+        self._last = started
+        self.phases = []
+        self.finished = False
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def finish(self, phase='gateway connect'):
+        """
+        Close the last phase and return the report, or None if already finished
+
+        Returns:
+            str: e.g. "Startup 1.92s: import 210ms, config 2ms, ... (peak RSS 61MB)"
+        """
+        if self.finished:
+            return None
+        self.finished = True
+        self.mark(phase)
+        total = self._last - self.started
+        report = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases)
+        rss = _rss_mb()
+        suffix = f" (peak RSS {rss:.0f}MB)" if rss is not None else ""
+        return f"Startup {total:.2f}s: {report}{suffix}"
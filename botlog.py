@@ -0,0 +1,177 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line for the file sink"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates when the file exceeds max_bytes or every rotate_seconds"""
+
+    def __init__(self, filename, max_bytes, backup_count, rotate_seconds):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.rotate_seconds = rotate_seconds
+        self._rotate_at = time.time() + rotate_seconds
+
+    def shouldRollover(self, record):
+        if self.rotate_seconds and time.time() >= self._rotate_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._rotate_at = time.time() + self.rotate_seconds
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DebugSampler(logging.Filter):
+    """Keeps only a fraction of DEBUG records; other levels always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+
+class WebhookHandler(logging.Handler):
+    """
+    Forwards records to a send(text) callable, at most per_minute records
+    per minute; the number suppressed is reported with the next message.
+    Records from the loggers in exclude are never forwarded (the webhook
+    dispatcher's own errors would otherwise feed back into the webhook).
+    """
+
+    def __init__(self, send, level=logging.WARNING, per_minute=10, exclude=('webhook_dispatcher',)):
+        super().__init__(level)
+        self.send = send
+        self.per_minute = per_minute
+        self.exclude = exclude
+        self._window_start = time.monotonic()
+        self._sent_in_window = 0
+        self._suppressed = 0
+        self._rate_lock = threading.Lock()
+
+    def emit(self, record):
+        if record.name in self.exclude:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._sent_in_window = 0
+            if self._sent_in_window >= self.per_minute:
+                self._suppressed += 1
+                return
+            self._sent_in_window += 1
+            suppressed, self._suppressed = self._suppressed, 0
+
+        try:
+            text = self.format(record)
+            if suppressed:
+                text += f" ({suppressed} earlier log messages suppressed)"
+            self.send(text)
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(log_path, send_webhook=None, log_config=None):
+    """
+    Route the logging module through a background queue
+
+    Callers only pay for putting the record on a queue; a listener thread
+    writes JSON lines to a size/time-rotating file at log_path, prints
+    "[LEVEL] message" to the console, and forwards WARNING+ records to the
+    logs webhook (rate limited).
+
+    Args:
+        log_path: File for the rotating JSON log (PATHS['logs'])
+        send_webhook: Optional callable taking the message text
+        log_config: Optional dict with level, debug_sample_rate, max_bytes,
+            backup_count, rotate_hours, webhook_level, webhook_per_minute
+    """
+    global _listener
+    log_config = log_config or {}
+
+    log_dir = os.path.dirname(log_path)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    file_handler = SizeAndTimeRotatingFileHandler(
+        log_path,
+        max_bytes=log_config.get('max_bytes', 5 * 1024 * 1024),
+        backup_count=log_config.get('backup_count', 5),
+        rotate_seconds=log_config.get('rotate_hours', 24) * 3600
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+
+    handlers = [file_handler, console_handler]
+    if send_webhook is not None:
+        webhook_handler = WebhookHandler(
+            send_webhook,
+            level=log_config.get('webhook_level', 'WARNING'),
+            per_minute=log_config.get('webhook_per_minute', 10)
+        )
+        webhook_handler.setFormatter(logging.Formatter('[%(levelname)s] %(message)s'))
+        handlers.append(webhook_handler)
+
+    log_queue = queue.Queue(maxsize=10000)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(log_config.get('debug_sample_rate', 1.0)))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(log_config.get('level', 'INFO'))
+    # Third-party libraries stay quiet unless something goes wrong
+    for noisy in ('urllib3', 'websocket', 'matplotlib', 'PIL'):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flush queued records to every sink and stop the listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-entry expiry around a loader function
+
+    get() returns a fresh cached value or calls loader(key) on a miss.
+    Concurrent misses for the same key share one loader call. A loader
+    failure (exception or None) is cached as None for negative_ttl seconds
+    so a broken lookup isn't retried on every event.
+    """
+
+    def __init__(self, loader, max_size=512, ttl=3600, negative_ttl=60):
+        self.loader = loader
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, self.ttl if ttl is None else ttl)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get(self, key):
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = {'done': threading.Event(), 'value': None}
+
+        if not leader:
+            flight['done'].wait()
+            return flight['value']
+
+        value = None
+        try:
+            value = self.loader(key)
+        except Exception as e:
+            log.error(f"Cache load failed for {key}: {str(e)}")
+
+        with self._lock:
+            if value is None:
+                self.failures += 1
+                self._store(key, None, self.negative_ttl)
+            else:
+                self._store(key, value, self.ttl)
+            del self._inflight[key]
+        flight['value'] = value
+        flight['done'].set()
+        return value
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'failures': self.failures
+        }
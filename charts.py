@@ -0,0 +1,152 @@
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+log = logging.getLogger(__name__)
+
+# Size (inches), DPI and PNG compression presets for report charts
+PRESETS = {
+    'draft': {'size': (12, 6), 'dpi': 80, 'compress_level': 1},
+    'standard': {'size': (12, 6), 'dpi': 150, 'compress_level': 3},
+    'high': {'size': (12, 6), 'dpi': 300, 'compress_level': 6}
+}
+
+# Above this many days one tick per day becomes unreadable (and slow)
+DAILY_TICK_LIMIT = 31
+
+
+def render_activity_chart(series, preset='standard'):
+    """
+    Draw the daily online time chart and encode it as PNG
+
+    Uses a standalone Figure on an Agg canvas, so it is safe to call from
+    any thread or worker process without touching pyplot state.
+
+    Args:
+        series: List of (label, dates, hours) with dates as datetime64
+            arrays and hours as float arrays
+        preset: Key of PRESETS
+
+    Returns:
+        tuple: (png bytes, {'draw': seconds, 'encode': seconds})
+    """
+    import matplotlib.dates as mdates
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from PIL import Image
+
+    options = PRESETS[preset]
+    start = time.perf_counter()
+
+    fig = Figure(figsize=options['size'], dpi=options['dpi'])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    first_day = last_day = None
+    for label, dates, hours in series:
+        ax.plot(dates, hours, linestyle='--', alpha=0.5, label=label)
+        ax.scatter(dates, hours, marker='o', s=100)
+        if len(dates):
+            first_day = dates.min() if first_day is None else min(first_day, dates.min())
+            last_day = dates.max() if last_day is None else max(last_day, dates.max())
+
+    span_days = 0
+    if first_day is not None:
+        span_days = int((last_day - first_day).astype('timedelta64[D]').astype(int))
+    if span_days <= DAILY_TICK_LIMIT:
+        ax.xaxis.set_major_locator(mdates.DayLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+    else:
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    for tick in ax.get_xticklabels():
+        tick.set_rotation(45)
+        tick.set_horizontalalignment('right')
+
+    ax.set_title('Daily Online Time by User')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Hours Online')
+    ax.legend()
+    ax.grid(True)
+    fig.tight_layout(pad=2)
+    fig.canvas.draw()
+    drawn = time.perf_counter()
+
+    # Encode the already rendered buffer; savefig would draw everything again
+    width, height = fig.canvas.get_width_height(physical=True)
+    image = Image.frombuffer('RGBA', (width, height), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1)
+    buf = BytesIO()
+    image.convert('RGB').save(buf, format='PNG', compress_level=options['compress_level'])
+    encoded = time.perf_counter()
+
+    return buf.getvalue(), {'draw': drawn - start, 'encode': encoded - drawn}
+
+
+def _warm_up():
+    # Import matplotlib in the worker ahead of the first real render
+    import matplotlib.figure  # noqa: F401
+    return True
+
+
+class ChartRenderer:
+    """
+    Runs render_activity_chart in a worker pool
+
+    Workers are forked processes where the platform supports it, so a
+    render never holds the GIL of the bot process; elsewhere a thread pool
+    is used (the Figure/Agg API has no global state to race on).
+
+    Forking a process that already runs threads can copy a lock one of them
+    holds into the child, so create the renderer and call warm_up() before
+    the entry point starts any thread: every worker is forked by that first
+    submit. (spawn/forkserver workers would re-run the entry point's
+    module-level setup instead.) A worker that dies breaks the process pool
+    for good, and forking a replacement would no longer be safe, so
+    rendering then falls back to a thread pool.
+    """
+
+    def __init__(self, preset='standard', processes=1):
+        if preset not in PRESETS:
+            raise ValueError(f"Unknown chart preset: {preset}")
+        self.preset = preset
+        self.processes = processes
+        self._lock = threading.Lock()
+        if 'fork' in multiprocessing.get_all_start_methods():
+            self._pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('fork'))
+        else:
+            self._pool = self._thread_pool()
+
+    def _thread_pool(self):
+        return ThreadPoolExecutor(max_workers=self.processes, thread_name_prefix='chart')
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            try:
+                return self._pool.submit(fn, *args)
+            except BrokenProcessPool:
+                log.error("A chart worker process died, rendering charts in threads from now on")
+                self._pool.shutdown(wait=False)
+                self._pool = self._thread_pool()
+                return self._pool.submit(fn, *args)
+
+    def warm_up(self):
+        """Start the workers now (call before the entry point starts any thread)"""
+        return self._submit(_warm_up)
+
+    def submit(self, series, preset=None):
+        """
+        Queue a render
+
+        Returns:
+            Future resolving to (png bytes, timings); a render in progress
+            when its worker dies fails with BrokenProcessPool
+        """
+        return self._submit(render_activity_chart, series, preset or self.preset)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
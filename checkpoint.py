@@ -0,0 +1,115 @@
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+class SessionCheckpoint:
+    """
+    Crash-safe record of the open sessions kept in memory by selbot.py
+
+    Every change to a user's state (status, start_time) is appended as one
+    JSON line and flushed, so it survives the process being killed. A
+    heartbeat line is appended every heartbeat_interval seconds; after a
+    crash the last one bounds when the bot was still watching. Once
+    compact_every lines have been appended the file is rewritten with only
+    the current state.
+    """
+
+    def __init__(self, path, compact_every=500, heartbeat_interval=30):
+        self.path = path
+        self.compact_every = compact_every
+        self.heartbeat_interval = heartbeat_interval
+        self._lock = threading.Lock()
+        self._states = {}
+        self._records = 0
+        self._file = None
+        self._heartbeat = None
+        self._stopped = threading.Event()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def load(self):
+        """
+        Replay the checkpoint file
+
+        Returns:
+            tuple: ({user_id: {'status', 'start_time'}}, time the previous
+            run was last known alive, or None without a checkpoint)
+        """
+        states = {}
+        last_alive = None
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line from a crash mid-write
+                        log.error(f"Skipping corrupt checkpoint record in {self.path}")
+                        continue
+                    last_alive = max(last_alive or 0, record.get('ts', 0))
+                    if 'user_id' in record:
+                        states[record['user_id']] = {
+                            'status': record['status'],
+                            'start_time': record['start_time']
+                        }
+
+        with self._lock:
+            self._states = {user_id: dict(state) for user_id, state in states.items()}
+            self._rewrite()
+        return states, last_alive
+
+    def record(self, user_id, status, start_time):
+        """Append the current state of one user"""
+        with self._lock:
+            self._states[user_id] = {'status': status, 'start_time': start_time}
+            self._append({'user_id': user_id, 'status': status, 'start_time': start_time, 'ts': int(time.time())})
+
+    def start_heartbeat(self):
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._run_heartbeat, name='checkpoint-heartbeat', daemon=True)
+            self._heartbeat.start()
+
+    def _run_heartbeat(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                with self._lock:
+                    self._append({'ts': int(time.time())})
+            except Exception as e:
+                log.error(f"Failed to write checkpoint heartbeat: {str(e)}")
+
+    def _append(self, record):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._file.flush()
+        self._records += 1
+        if self._records >= self.compact_every:
+            self._rewrite()
+
+    def _rewrite(self):
+        # Current state only; small (one line per monitored user)
+        now = int(time.time())
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for user_id, state in self._states.items():
+                f.write(json.dumps(dict(state, user_id=user_id, ts=now), separators=(',', ':')) + '\n')
+            f.write(json.dumps({'ts': now}) + '\n')
+        if self._file is not None:
+            self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._records = 0
+
+    def close(self):
+        self._stopped.set()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+COMMAND_SECONDS = metrics.REGISTRY.histogram('command_seconds', 'Command run time', ('command',))
+COMMANDS = metrics.REGISTRY.counter(
+    'commands_total', 'Commands by outcome (ok, invalid, failed, busy)', ('command', 'outcome'))
+
+
+class CommandContext:
+    """What a handler gets: the raw message, its channel, author and arguments"""
+
+    def __init__(self, message, name, args):
+        self.message = message
+        self.name = name
+        self.args = args
+        self.channel_id = message['channel_id']
+        self.author = message['author']['username']
+
+
+class Command:
+    def __init__(self, name, handler, usage='', max_concurrent=1, timeout=60, ack=None):
+        self.name = name
+        self.handler = handler
+        self.usage = usage
+        self.timeout = timeout
+        self.ack = ack
+        self.max_concurrent = max_concurrent
+        self.running = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a concurrency slot; False if all are in use"""
+        with self._lock:
+            if self.running >= self.max_concurrent:
+                return False
+            self.running += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.running -= 1
+
+
+class CommandRouter:
+    """
+    Shared command dispatch for selbot.py and dataanalyst.py
+
+    dispatch() is called on the gateway thread and only looks the command
+    up, takes one of its concurrency slots and hands it to a worker pool,
+    so a slow command never holds up event intake. A command whose slots
+    are all taken is turned down straight away. Replies (the optional
+    acknowledgement, then the handler's result or error) go out in order
+    on a reply thread.
+
+    Handlers take a CommandContext and return the text to reply with (or
+    None if they replied themselves). A ValueError is answered with the
+    command's usage. A command still running after timeout seconds gets a
+    notice; Python threads can't be stopped, so it keeps its slot until it
+    really finishes.
+    """
+
+    def __init__(self, prefix, send, max_workers=4):
+        self.prefix = prefix
+        self.send = send
+        self._commands = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='command')
+        self._replies = ThreadPoolExecutor(max_workers=1, thread_name_prefix='command-reply')
+        metrics.REGISTRY.gauge(
+            'commands_running', 'Commands currently running',
+            lambda: {(name,): command.running for name, command in self._commands.items()}, ('command',))
+
+    def register(self, name, handler, usage='', max_concurrent=1, timeout=60, ack=None):
+        """
+        Add a command
+
+        Args:
+            name: Command word without the prefix
+            handler: Callable taking a CommandContext
+            usage: Argument synopsis shown on a ValueError
+            max_concurrent: Runs allowed at the same time
+            timeout: Seconds before the caller is told the command is slow
+            ack: Reply sent as soon as the command is accepted, a string or
+                a callable taking the CommandContext
+        """
+        self._commands[name] = Command(name, handler, usage, max_concurrent, timeout, ack)
+
+    def command(self, name, **options):
+        """Decorator form of register()"""
+        def decorator(handler):
+            self.register(name, handler, **options)
+            return handler
+        return decorator
+
+    def reply(self, channel_id, text):
+        self._replies.submit(self._send, channel_id, text)
+
+    def _send(self, channel_id, text):
+        try:
+            self.send(channel_id, text)
+        except Exception as e:
+            log.error(f"Failed to send command reply: {str(e)}")
+
+    def dispatch(self, message):
+        """
+        Route a message if it is a registered command
+
+        Returns:
+            bool: True if the command was accepted
+        """
+        content = message['content']
+        if not content.startswith(self.prefix):
+            return False
+        words = content[len(self.prefix):].split()
+        if not words:
+            return False
+        command = self._commands.get(words[0].lower())
+        if command is None:
+            return False
+
+        context = CommandContext(message, command.name, words[1:])
+        if not command.acquire():
+            COMMANDS.inc(command=command.name, outcome='busy')
+            self.reply(context.channel_id, f"⏳ {self.prefix}{command.name} is already running, try again when it's done")
+            return False
+
+        try:
+            if command.ack is not None:
+                ack = command.ack(context) if callable(command.ack) else command.ack
+                self.reply(context.channel_id, ack)
+            future = self._pool.submit(self._run, command, context)
+        except Exception:
+            # _run never started, so its finally won't give the slot back
+            command.release()
+            raise
+        if command.timeout:
+            timer = threading.Timer(command.timeout, self._warn_slow, (future, command, context))
+            timer.daemon = True
+            timer.start()
+            future.add_done_callback(lambda _: timer.cancel())
+        return True
+
+    def _warn_slow(self, future, command, context):
+        if not future.done():
+            log.warning(f"{self.prefix}{command.name} has been running for more than {command.timeout}s")
+            self.reply(context.channel_id, f"⌛ {self.prefix}{command.name} is taking longer than {command.timeout}s, "
+                                           "the result will follow when it's done")
+
+    def _run(self, command, context):
+        start = time.perf_counter()
+        outcome = 'ok'
+        try:
+            result = command.handler(context)
+            if result:
+                self.reply(context.channel_id, result)
+        except ValueError as e:
+            outcome = 'invalid'
+            usage = f"\nUsage: {self.prefix}{command.name} {command.usage}".rstrip()
+            self.reply(context.channel_id, f"❌ {str(e)}{usage}")
+        except Exception as e:
+            outcome = 'failed'
+            log.error(f"{self.prefix}{command.name} failed: {str(e)}")
+            self.reply(context.channel_id, f"❌ {self.prefix}{command.name} failed: {str(e)}")
+        finally:
+            COMMAND_SECONDS.observe(time.perf_counter() - start, command=command.name)
+            COMMANDS.inc(command=command.name, outcome=outcome)
+            command.release()
+
+    def stats(self):
+        """Return {command: running count} for the registered commands"""
+        return {name: command.running for name, command in self._commands.items()}
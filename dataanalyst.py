@@ -1,307 +1,342 @@
-# Add these lines at the very top of the file, before other imports
-import matplotlib
-matplotlib.use('Agg')  # Set backend to non-interactive 'Agg'
-
-
-# Rest of the imports
-import matplotlib.pyplot as plt
-import pandas as pd
-import json
-import os
-import requests
-import threading
-import time
-import discum
-from datetime import datetime
-from datetime import timedelta
-from io import BytesIO
-import matplotlib.dates
-# Load configuration
-def load_config():
-    try:
-        with open('config.json', 'r') as f:
-            config = json.load(f)
-            
-        # Ensure directories exist
-        for path_type, path in config['paths'].items():
-            if isinstance(path, str) and not path.endswith('.json') and not path.endswith('.txt'):
-                os.makedirs(path, exist_ok=True)
-            elif isinstance(path, dict):
-                # Handle nested paths like fonts
-                for _, nested_path in path.items():
-                    os.makedirs(os.path.dirname(nested_path), exist_ok=True)
-                    
-        return config
-    except FileNotFoundError:
-        print("Error: config.json not found!")
-        exit(1)
-
-# Get config
-config = load_config()
-TOKEN = config['tokens']['data_analyst']
-WEBHOOK_CONFIG = {
-    'DATA_ANALYST': config['webhooks']['data_analyst'],
-    'LOGS': config['webhooks']['logs']
-}
-COMMAND_PREFIX = config['command_prefix']
-PATHS = config['paths']
-
-# Initialize Discord bot
-bot = discum.Client(token=TOKEN, log=False)
-
-def send_webhook(content, webhook_type='LOGS', username=None):
-    """
-    Send a message through Discord webhook
-    
-    Args:
-        content: Message to send
-        webhook_type: Type of webhook (LOGS or DATA_ANALYST)
-        username: Optional custom username for the webhook
-    """
-    if username is None:
-        username = "Data Analyst" if webhook_type == 'DATA_ANALYST' else "System Log"
-    
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    formatted_content = f"[{timestamp}] {content}"
-    
-    payload = {
-        "username": username,
-        "avatar_url": WEBHOOK_CONFIG[webhook_type]['avatar'],
-        "content": formatted_content if "```" in formatted_content else f"```\n{formatted_content}\n```"
-    }
-    
-    try:
-        response = requests.post(WEBHOOK_CONFIG[webhook_type]['url'], json=payload)
-        if response.status_code != 204:
-            print(f"[ERROR] Webhook error: {response.status_code}")
-    except Exception as e:
-        print(f"[ERROR] Webhook error: {str(e)}")
-
-def analyze_data():
-    """
-    Analyze session data and generate statistics/graphs
-    
-    Returns:
-        bool: True if analysis was successful, False otherwise
-    """
-    session_data_path = PATHS['session_data']
-    if not os.path.exists(session_data_path):
-        send_webhook("No session data found", 'LOGS')
-        return False
-        
-    try:
-        with open(session_data_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        if not data:
-            send_webhook("Session data is empty", 'LOGS')
-            return False
-            
-        # Create DataFrame and convert date column to datetime
-        df = pd.DataFrame(data)
-        df['date'] = pd.to_datetime(df['date'])
-        df['duration_hours'] = df['duration'] / 3600
-        
-        # Sort DataFrame by date first
-        df = df.sort_values('date')
-        
-        # Log filtered data for debugging
-        send_webhook(f"Processing data:\n{df[['username', 'date', 'duration_hours']].to_string()}", 'LOGS')
-        
-        # Prepare statistics
-        stats = {
-            'users': [],
-            'total_sessions': len(df)
-        }
-        
-        graphs = []
-        
-        plt.figure(figsize=(12, 6))
-        plt.clf()
-        
-        # Process data for each user
-        for user in df['username'].unique():
-            user_data = df[df['username'] == user]
-            
-            # Group by date and ensure dates are sorted
-            daily_time = user_data.groupby('date')['duration_hours'].sum()
-            daily_time.index = pd.to_datetime(daily_time.index)
-            daily_time = daily_time.sort_index()
-            
-            # Plot points and lines separately
-            plt.plot(daily_time.index, daily_time.values, 
-                    linestyle='--',  # Make lines dashed
-                    alpha=0.5,       # Make lines semi-transparent
-                    label=user)
-            plt.scatter(daily_time.index, daily_time.values,
-                       marker='o',
-                       s=100)       # Increase point size
-            
-            # Calculate user statistics
-            total_hours = user_data['duration_hours'].sum()
-            avg_hours = total_hours / len(user_data['date'].unique())
-            
-            stats['users'].append({
-                'username': user,
-                'total_hours': round(total_hours, 1),
-                'daily_avg': round(avg_hours, 1),
-                'sessions': len(user_data)
-            })
-        
-        # Format axes with only the actual dates
-        plt.gcf().autofmt_xdate()
-        plt.xticks(df['date'].unique(), rotation=45)  # Use only the actual dates in the data
-        plt.gca().xaxis.set_major_locator(matplotlib.dates.DayLocator())  # Show only daily ticks
-        
-        # Configure graph appearance
-        plt.title('Daily Online Time by User')
-        plt.xlabel('Date')
-        plt.ylabel('Hours Online')
-        plt.legend()
-        plt.grid(True)
-        plt.tight_layout(pad=2)  # Add padding to prevent label cutoff
-        
-        # Save graph to memory
-        buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=300, bbox_inches='tight')
-        plt.close('all')
-        buf.seek(0)
-        graphs.append(buf.getvalue())
-        
-        # Send results
-        send_analysis_webhook(stats, graphs)
-        return True
-        
-    except Exception as e:
-        send_webhook(f"Analysis failed: {str(e)}", 'LOGS')
-        return False
-
-def send_analysis_webhook(data, graphs):
-    """
-    Send analysis results via webhook with embedded formatting
-    
-    Args:
-        data: Dictionary containing analysis results
-        graphs: List of graph images as bytes
-    """
-    embed = {
-        "title": ":bar_chart: Activity Analysis",
-        "color": 0x3498db,
-        "fields": [
-            {
-                "name": "Overview",
-                "value": f"```\nTotal Users: {len(data['users'])}\nTotal Sessions: {data['total_sessions']}\n```",
-                "inline": False
-            }
-        ],
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    # Add individual user statistics
-    for user in data['users']:
-        embed["fields"].append({
-            "name": f":bust_in_silhouette: {user['username']}",
-            "value": (
-                f"```\n"
-                f"Total Time: {user['total_hours']:.1f}h\n"
-                f"Daily Average: {user['daily_avg']:.1f}h\n"
-                f"Sessions: {user['sessions']}\n"
-                f"```"
-            ),
-            "inline": True
-        })
-
-    # Prepare webhook payload
-    payload = {
-        "username": "Data Analyst",
-        "avatar_url": WEBHOOK_CONFIG['DATA_ANALYST']['avatar'],
-        "embeds": [embed]
-    }
-
-    try:
-        # Send statistics embed
-        requests.post(WEBHOOK_CONFIG['DATA_ANALYST']['url'], json=payload)
-        
-        # Send graphs as attachments
-        files = [('graph', ('activity.png', graph, 'image/png')) for graph in graphs]
-        requests.post(
-            WEBHOOK_CONFIG['DATA_ANALYST']['url'],
-            files=files,
-            data={"username": "Data Analyst", "avatar_url": WEBHOOK_CONFIG['DATA_ANALYST']['avatar']}
-        )
-    except Exception as e:
-        print(f"[ERROR] Failed to send analysis: {e}")
-
-@bot.gateway.command
-def on_ready(resp):
-    """Handle bot ready event"""
-    if resp.event.ready_supplemental:
-        print("Bot connected!")
-        send_webhook("Data Analyst bot connected and ready!", 'LOGS')
-
-@bot.gateway.command
-def on_message(resp):
-    """
-    Handle incoming messages
-    
-    Processes commands starting with the configured prefix
-    """
-    if resp.event.message:
-        m = resp.parsed.auto()
-        
-        # Ignore self messages
-        if m['author']['id'] == bot.gateway.session.user['id']:
-            return
-            
-        # Process commands
-        if m['content'].startswith(COMMAND_PREFIX):
-            command = m['content'][1:].lower().strip()
-            channel_id = m['channel_id']
-            
-            if command == "analyze":
-                bot.sendMessage(channel_id, ":arrows_counterclockwise: Running analysis...")
-                if analyze_data():
-                    bot.sendMessage(channel_id, ":white_check_mark: Analysis complete!")
-                else:
-                    bot.sendMessage(channel_id, ":x: Analysis failed")
-
-def main():
-    """Main bot execution"""
-    print("Starting Data Analyst bot...")
-    send_webhook("Data Analyst bot starting...", 'LOGS')
-    
-    # Ensure data file exists
-    if not os.path.exists('session_data.json'):
-        with open('session_data.json', 'w') as f:
-            json.dump([], f)
-    
-    # Setup automatic daily analysis
-    def auto_analyze():
-        while True:
-            # Calculate time until next midnight
-            now = datetime.now()
-            next_run = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            if now >= next_run:
-                next_run = next_run + timedelta(days=1)
-            
-            sleep_seconds = (next_run - now).total_seconds()
-            time.sleep(sleep_seconds)
-            
-            try:
-                analyze_data()
-            except Exception as e:
-                send_webhook(f"Automatic analysis failed: {str(e)}", 'LOGS')
-    
-    # Start automatic analysis thread
-    analyze_thread = threading.Thread(target=auto_analyze, daemon=True)
-    analyze_thread.start()
-    
-    # Start bot
-    try:
-        bot.gateway.run()
-    except Exception as e:
-        print(f"Bot error: {str(e)}")
-        send_webhook(f"Critical bot error: {str(e)}", 'LOGS')
-
-if __name__ == "__main__":
-    main()
+import time
+
+# Taken before any other import so the startup report covers them
+STARTED = time.perf_counter()
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from datetime import timedelta
+import bootstrap
+import botlog
+import metrics
+import charts
+import session_feed
+import session_store
+import session_snapshot
+from webhook_dispatcher import WebhookDispatcher
+from commands import CommandRouter
+
+startup = bootstrap.StartupTimer(STARTED)
+startup.mark('import')
+
+# Get config (validated before the Discord client is even imported)
+config = bootstrap.load_config(required=('tokens.data_analyst', 'webhooks.data_analyst'))
+startup.mark('config')
+
+# Chart rendering runs in a worker process so the gateway never waits on
+# matplotlib. The workers are forked here, before any thread is running
+# and before discum is loaded into this process.
+CHARTS_CONFIG = config.get('charts', {})
+chart_renderer = charts.ChartRenderer(
+    preset=CHARTS_CONFIG.get('preset', 'standard'),
+    processes=CHARTS_CONFIG.get('processes', 1)
+)
+chart_renderer.warm_up()
+startup.mark('chart workers')
+
+# discum is by far the heaviest import, so it waits until the config is
+# usable; pandas and analysis are imported by the first analysis
+import discum
+startup.mark('discum import')
+
+TOKEN = config['tokens']['data_analyst']
+WEBHOOK_CONFIG = {
+    'DATA_ANALYST': config['webhooks']['data_analyst'],
+    'LOGS': config['webhooks']['logs']
+}
+COMMAND_PREFIX = config['command_prefix']
+PATHS = config['paths']
+ANALYSIS_DAYS = config.get('analysis', {}).get('days')
+
+# Background webhook sender shared by every send_webhook call. It exists
+# before logging is set up, since the logging webhook sink goes through it.
+webhooks = WebhookDispatcher()
+
+def send_webhook(content, webhook_type='LOGS', username=None):
+    """
+    Send a message through Discord webhook
+    
+    Args:
+        content: Message to send
+        webhook_type: Type of webhook (LOGS or DATA_ANALYST)
+        username: Optional custom username for the webhook
+    """
+    if username is None:
+        username = "Data Analyst" if webhook_type == 'DATA_ANALYST' else "System Log"
+    
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    formatted_content = f"[{timestamp}] {content}"
+    
+    # Queued; the dispatcher thread does the HTTP request
+    webhooks.send_text(
+        WEBHOOK_CONFIG[webhook_type]['url'],
+        formatted_content,
+        username,
+        WEBHOOK_CONFIG[webhook_type]['avatar']
+    )
+
+# Structured logging to its own file next to selbot's, WARNING+ to the logs webhook
+log_root, log_ext = os.path.splitext(PATHS['logs'])
+botlog.setup_logging(log_root + '_analyst' + log_ext, lambda text: send_webhook(text, 'LOGS'), config.get('logging'))
+log = logging.getLogger('dataanalyst')
+
+# Read-only view of the session history written by selbot.py
+store = session_store.open_store(PATHS['session_data'], config.get('storage'), readonly=True)
+SNAPSHOT_DIR = config.get('storage', {}).get(
+    'snapshot_dir', session_snapshot.snapshot_dir_for(PATHS['session_data']))
+
+# Live daily totals streamed by selbot.py; the store is only read while
+# the feed is down
+FEED_CONFIG = config.get('feed', {})
+live_totals = session_feed.LiveTotals()
+feed = None
+if FEED_CONFIG.get('enabled', True):
+    feed = session_feed.FeedClient(
+        session_feed.feed_address(FEED_CONFIG, os.path.dirname(PATHS['session_data'])),
+        live_totals,
+        retry_interval=FEED_CONFIG.get('retry_interval', 5)
+    )
+
+# Initialize Discord bot
+bot = discum.Client(token=TOKEN, log=False)
+startup.mark('client')
+
+# Analysis metrics, served on metrics.analyst_port when metrics.enabled is set
+METRICS_CONFIG = config.get('metrics', {})
+ANALYSIS_SECONDS = metrics.REGISTRY.histogram('dataanalyst_analysis_seconds', 'Total time of one analysis run')
+STAGE_SECONDS = metrics.REGISTRY.histogram(
+    'dataanalyst_stage_seconds', 'Time per analysis stage (aggregate, chart draw, chart encode)', ('stage',))
+ANALYSES = metrics.REGISTRY.counter('dataanalyst_analyses_total', 'Analysis runs by outcome', ('outcome',))
+metrics.REGISTRY.gauge(
+    'dataanalyst_feed_connected', 'Whether the live session feed from selbot.py is up',
+    lambda: int(feed is not None and feed.connected))
+metrics.REGISTRY.gauge(
+    'dataanalyst_feed_lag_seconds', 'Delay of the last feed record', lambda: feed.last_lag() if feed else None)
+metrics.REGISTRY.gauge('dataanalyst_pending_webhooks', 'Webhook messages waiting to be sent', lambda: webhooks.pending())
+
+def analyze_data():
+    """
+    Analyze session data and generate statistics/graphs
+    
+    Returns:
+        bool: True if analysis was successful, False otherwise
+    """
+    try:
+        started = time.perf_counter()
+        import pandas as pd
+        import analysis
+
+        since = None
+        if ANALYSIS_DAYS:
+            since = (datetime.now() - timedelta(days=ANALYSIS_DAYS - 1)).strftime('%Y-%m-%d')
+        # One row per (user, day) from the feed's live copy, or the raw
+        # sessions memory-mapped from the columnar snapshot while selbot.py
+        # isn't reachable
+        if feed is not None and feed.connected:
+            df = pd.DataFrame(live_totals.rows(since=since)).rename(columns={'total_duration': 'duration'})
+        else:
+            df = session_snapshot.load_history(store, SNAPSHOT_DIR, since=since)
+            
+        if df.empty:
+            log.warning("Session data is empty")
+            return False
+            
+        # Convert date column to datetime (already datetime64 from the snapshot)
+        df['date'] = pd.to_datetime(df['date'])
+        df['duration_hours'] = df['duration'] / 3600
+        
+        # Sort DataFrame by date first
+        df = df.sort_values('date')
+        
+        log.debug(f"Processing {len(df)} rows for {df['user_id'].nunique()} users")
+        
+        # Every user's daily series and summary in one grouped pass
+        daily, user_stats = analysis.daily_usage(df)
+        
+        # Prepare statistics
+        stats = {
+            'users': user_stats,
+            'total_sessions': sum(user['sessions'] for user in user_stats)
+        }
+        
+        # Hand the daily series to the chart workers; only plain arrays cross over
+        series = []
+        for user in user_stats:
+            daily_time = daily[user['user_id']].dropna()
+            series.append((user['username'], daily_time.index.values, daily_time.values))
+        timings = {'aggregate': time.perf_counter() - started}
+        
+        graph, render_timings = chart_renderer.submit(series).result(timeout=300)
+        timings.update(render_timings)
+        graphs = [graph]
+        for stage, seconds in timings.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        ANALYSIS_SECONDS.observe(time.perf_counter() - started)
+        
+        timing_report = ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in timings.items())
+        if feed is not None:
+            timing_report += f", {feed.lag_report()}"
+        log.info(f"Analysis timings: {timing_report}")
+        send_webhook(f"Analysis timings: {timing_report}", 'LOGS')
+        
+        # Send results
+        send_analysis_webhook(stats, graphs)
+        ANALYSES.inc(outcome='ok')
+        return True
+        
+    except Exception as e:
+        ANALYSES.inc(outcome='failed')
+        log.error(f"Analysis failed: {str(e)}")
+        return False
+
+def send_analysis_webhook(data, graphs):
+    """
+    Send analysis results via webhook with embedded formatting
+    
+    Args:
+        data: Dictionary containing analysis results
+        graphs: List of graph images as bytes
+    """
+    embed = {
+        "title": ":bar_chart: Activity Analysis",
+        "color": 0x3498db,
+        "fields": [
+            {
+                "name": "Overview",
+                "value": f"```\nTotal Users: {len(data['users'])}\nTotal Sessions: {data['total_sessions']}\n```",
+                "inline": False
+            }
+        ],
+        "timestamp": datetime.now().isoformat()
+    }
+    
+    # Add individual user statistics
+    for user in data['users']:
+        embed["fields"].append({
+            "name": f":bust_in_silhouette: {user['username']}",
+            "value": (
+                f"```\n"
+                f"Total Time: {user['total_hours']:.1f}h\n"
+                f"Daily Average: {user['daily_avg']:.1f}h\n"
+                f"Sessions: {user['sessions']}\n"
+                f"```"
+            ),
+            "inline": True
+        })
+
+    # Prepare webhook payload
+    payload = {
+        "username": "Data Analyst",
+        "avatar_url": WEBHOOK_CONFIG['DATA_ANALYST']['avatar'],
+        "embeds": [embed]
+    }
+
+    # Send statistics embed, then graphs as attachments (delivered in order)
+    webhooks.send_payload(WEBHOOK_CONFIG['DATA_ANALYST']['url'], json=payload)
+    
+    files = [('graph', ('activity.png', graph, 'image/png')) for graph in graphs]
+    webhooks.send_payload(
+        WEBHOOK_CONFIG['DATA_ANALYST']['url'],
+        files=files,
+        data={"username": "Data Analyst", "avatar_url": WEBHOOK_CONFIG['DATA_ANALYST']['avatar']}
+    )
+
+# Commands run on the router's worker pool; /analyze is acknowledged at
+# once and a second one is turned down while the first is running
+command_router = CommandRouter(COMMAND_PREFIX, lambda channel_id, text: bot.sendMessage(channel_id, text))
+
+@command_router.command('analyze', timeout=300, ack=":arrows_counterclockwise: Running analysis...")
+def analyze_command(ctx):
+    """/analyze: rebuild the charts and report the outcome"""
+    if not analyze_data():
+        raise RuntimeError("analysis failed, see the logs")
+    return ":white_check_mark: Analysis complete!"
+
+@bot.gateway.command
+def on_ready(resp):
+    """Handle bot ready event"""
+    if resp.event.ready:
+        report = startup.finish()
+        if report:
+            log.info(report)
+
+    if resp.event.ready_supplemental:
+        log.info("Bot connected!")
+        send_webhook("Data Analyst bot connected and ready!", 'LOGS')
+
+@bot.gateway.command
+def on_message(resp):
+    """
+    Handle incoming messages
+    
+    Processes commands starting with the configured prefix
+    """
+    if resp.event.message:
+        m = resp.parsed.auto()
+        
+        # Ignore self messages
+        if m['author']['id'] == bot.gateway.session.user['id']:
+            return
+            
+        # Process commands
+        command_router.dispatch(m)
+
+def main():
+    """Main bot execution"""
+    log.info("Starting Data Analyst bot...")
+    send_webhook("Data Analyst bot starting...", 'LOGS')
+    if feed is not None:
+        feed.start()
+    if METRICS_CONFIG.get('enabled', False):
+        try:
+            metrics.serve(METRICS_CONFIG.get('analyst_port', 9465), METRICS_CONFIG.get('host', '127.0.0.1'))
+        except OSError as e:
+            log.error(f"Failed to start metrics endpoint: {str(e)}")
+    
+    # Ensure data file exists
+    if not os.path.exists('session_data.json'):
+        with open('session_data.json', 'w') as f:
+            json.dump([], f)
+    
+    # Setup automatic daily analysis
+    def auto_analyze():
+        while True:
+            # Calculate time until next midnight
+            now = datetime.now()
+            next_run = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            if now >= next_run:
+                next_run = next_run + timedelta(days=1)
+            
+            sleep_seconds = (next_run - now).total_seconds()
+            time.sleep(sleep_seconds)
+            
+            try:
+                analyze_data()
+            except Exception as e:
+                log.error(f"Automatic analysis failed: {str(e)}")
+            
+            # Keep the columnar snapshot warm so history loads stay incremental
+            try:
+                session_snapshot.update_snapshot(store, SNAPSHOT_DIR)
+            except Exception as e:
+                log.error(f"Snapshot update failed: {str(e)}")
+    
+    # Start automatic analysis thread
+    analyze_thread = threading.Thread(target=auto_analyze, daemon=True)
+    analyze_thread.start()
+    
+    # Start bot
+    startup.mark('main')
+    try:
+        bot.gateway.run()
+    except Exception as e:
+        log.critical(f"Critical bot error: {str(e)}")
+    finally:
+        botlog.shutdown_logging()
+        webhooks.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+SEND_SECONDS = metrics.REGISTRY.histogram(
+    'dm_send_seconds', 'DM delivery time including channel lookup and retry', ('outcome',))
+
+
+class DMNotifier:
+    """
+    Sends direct messages with cached DM channels
+
+    The channel id for each recipient is resolved with createDM once and
+    kept in a JSON file across restarts. A failed send drops the cached
+    channel and retries once with a fresh one. broadcast() fans a message
+    out to several recipients concurrently on a small thread pool.
+    """
+
+    def __init__(self, bot, cache_path, max_workers=4):
+        self.bot = bot
+        self.cache_path = cache_path
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._channels = self._load_channels()
+        self._stats = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dm')
+
+    def _load_channels(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_channels(self):
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._channels, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _channel_for(self, user_id):
+        with self._lock:
+            channel_id = self._channels.get(user_id)
+        if channel_id is not None:
+            return channel_id, True
+
+        channel_id = self.bot.createDM([user_id]).json()['id']
+        log.debug(f"Opening DM channel: {channel_id}")
+        with self._lock:
+            self._channels[user_id] = channel_id
+            self._save_channels()
+        return channel_id, False
+
+    def _invalidate(self, user_id):
+        with self._lock:
+            if self._channels.pop(user_id, None) is not None:
+                self._save_channels()
+
+    def _record(self, user_id, ok, latency):
+        SEND_SECONDS.observe(latency, outcome='sent' if ok else 'failed')
+        with self._lock:
+            stats = self._stats.setdefault(user_id, {'sent': 0, 'failed': 0, 'total_latency': 0.0, 'last_latency': 0.0})
+            stats['sent' if ok else 'failed'] += 1
+            stats['total_latency'] += latency
+            stats['last_latency'] = latency
+
+    def send(self, user_id, content):
+        """
+        Send one DM
+
+        Returns:
+            bool: True if Discord accepted the message
+        """
+        start = time.perf_counter()
+        ok = False
+        for _ in range(2):
+            cached = False
+            try:
+                channel_id, cached = self._channel_for(user_id)
+                response = self.bot.sendMessage(channel_id, content)
+                log.debug(f"Message sent: {response.status_code}")
+                if response.status_code == 200:
+                    ok = True
+                    break
+                log.error(f"Failed to send message: {response.text}")
+            except Exception as e:
+                log.error(f"Failed to send DM: {str(e)}")
+
+            # The channel may be stale; only retry if it came from the cache
+            self._invalidate(user_id)
+            if not cached:
+                break
+
+        self._record(user_id, ok, time.perf_counter() - start)
+        return ok
+
+    def broadcast(self, recipients, content, timeout=30):
+        """
+        Send the same DM to every recipient concurrently
+
+        Returns:
+            int: Number of recipients the message was delivered to
+        """
+        futures = [self._pool.submit(self.send, user_id, content) for user_id in recipients]
+        done, _ = wait(futures, timeout=timeout)
+        return sum(1 for f in done if f.result())
+
+    def stats(self):
+        """Return per-recipient counters with average latency in seconds"""
+        with self._lock:
+            return {
+                user_id: {
+                    'sent': s['sent'],
+                    'failed': s['failed'],
+                    'avg_latency': s['total_latency'] / max(1, s['sent'] + s['failed']),
+                    'last_latency': s['last_latency']
+                }
+                for user_id, s in self._stats.items()
+            }
@@ -0,0 +1,164 @@
+import os
+import selectors
+import socket
+import ssl
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Innermost Python frames of a thread blocked waiting for work: Condition
+# and Event waits (queue.get and Future.result end up there too),
+# Thread.join, selector loops and socket reads. Samples stopped in one of
+# these are counted as idle and left out of the function tables.
+IDLE_FRAMES = {
+    (threading.__file__, 'wait'),
+    (threading.__file__, '_wait_for_tstate_lock'),
+    (selectors.__file__, 'select'),
+    (socket.__file__, 'accept'),
+    (socket.__file__, 'readinto'),
+    (ssl.__file__, 'read'),
+    (ssl.__file__, 'recv'),
+    (ssl.__file__, 'recv_into'),
+}
+
+
+def _frame_key(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for every thread of the running process
+
+    Every interval seconds the stacks of all other threads are read with
+    sys._current_frames(), which needs no instrumentation of the profiled
+    code: the overhead is one stack walk per thread per sample, on the
+    profiler's own thread. A function's cumulative share is the fraction
+    of samples with it anywhere on the stack, its self share the fraction
+    with it on top. Samples are wall-clock, so an idle worker would show up
+    under the wait it is blocked in; samples whose innermost frame is in
+    IDLE_FRAMES are only counted per thread unless include_idle is set.
+    A thread in time.sleep() can't be told apart from its caller and
+    still counts as busy.
+
+    Only one capture runs at a time.
+    """
+
+    _running = threading.Lock()
+
+    def __init__(self, interval=0.005, top=25, include_idle=False):
+        self.interval = interval
+        self.top = top
+        self.include_idle = include_idle
+
+    def run(self, seconds, trace_memory=False):
+        """
+        Sample for the given number of seconds
+
+        Args:
+            seconds: Length of the capture window
+            trace_memory: Also diff tracemalloc snapshots over the window
+
+        Returns:
+            str: The text report
+
+        Raises:
+            RuntimeError: If another capture is already running
+        """
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("A profile is already being captured")
+        try:
+            return self._run(seconds, trace_memory)
+        finally:
+            self._running.release()
+
+    def _run(self, seconds, trace_memory):
+        started_tracing = False
+        before = None
+        if trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            before = tracemalloc.take_snapshot()
+
+        own_ident = threading.get_ident()
+        cumulative = Counter()
+        own = Counter()
+        thread_samples = Counter()
+        idle_samples = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        walk_time = 0.0
+
+        while time.perf_counter() < deadline:
+            walk_start = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (code.co_filename, code.co_name) in IDLE_FRAMES:
+                    idle_samples[ident] += 1
+                    continue
+                thread_samples[ident] += 1
+                top = True
+                seen = set()
+                while frame is not None:
+                    # Code objects are hashable; names are formatted once, in the report
+                    key = frame.f_code
+                    if top:
+                        own[key] += 1
+                        top = False
+                    if key not in seen:
+                        # Recursion counts a function once per sample
+                        seen.add(key)
+                        cumulative[key] += 1
+                    frame = frame.f_back
+            samples += 1
+            walk_time += time.perf_counter() - walk_start
+            time.sleep(self.interval)
+
+        allocations = None
+        if trace_memory:
+            # Leave out the profiler's own bookkeeping
+            ignore = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            allocations = after.compare_to(before.filter_traces(ignore), 'lineno')
+            if started_tracing:
+                tracemalloc.stop()
+
+        return self._report(seconds, samples, walk_time, thread_samples, idle_samples, cumulative, own, allocations)
+
+    def _report(self, seconds, samples, walk_time, thread_samples, idle_samples, cumulative, own, allocations):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        total = sum(thread_samples.values()) or 1
+        threads = set(thread_samples) | set(idle_samples)
+        lines = [
+            f"Sampled {len(threads)} threads for {seconds}s: {samples} samples every "
+            f"{self.interval * 1000:.0f}ms ({walk_time / max(samples, 1) * 1000:.2f}ms per stack walk)",
+            "",
+            "Threads (busy / idle samples):"
+        ]
+        for ident in sorted(threads, key=lambda ident: (-thread_samples[ident], -idle_samples[ident])):
+            lines.append(f"  {names.get(ident, ident)}: {thread_samples[ident]} / {idle_samples[ident]}")
+
+        scope = "all" if self.include_idle else "busy"
+        lines += ["", f"Top {self.top} functions by cumulative time (% of {scope} thread samples):",
+                  f"  {'cum%':>6} {'self%':>6}  function"]
+        for key, count in cumulative.most_common(self.top):
+            lines.append(f"  {count / total * 100:6.1f} {own[key] / total * 100:6.1f}  {_frame_key(key)}")
+
+        lines += ["", f"Top {self.top} functions by self time:", f"  {'self%':>6}  function"]
+        for key, count in own.most_common(self.top):
+            lines.append(f"  {count / total * 100:6.1f}  {_frame_key(key)}")
+
+        if allocations is not None:
+            lines += ["", f"Top {self.top} allocation sites (growth over the window):"]
+            for stat in allocations[:self.top]:
+                frame = stat.traceback[0]
+                lines.append(
+                    f"  {stat.size_diff / 1024:+10.1f} KB {stat.count_diff:+8d} blocks  "
+                    f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                )
+        return "\n".join(lines) + "\n"
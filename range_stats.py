@@ -0,0 +1,141 @@
+import threading
+from datetime import date as Date
+
+import numpy as np
+
+
+def _ordinal(day):
+    return Date.fromisoformat(day).toordinal()
+
+
+class _UserSeries:
+    """
+    Prefix sums for one user over consecutive days from first_day
+
+    cum_duration[i] is the total duration of the days before first_day + i
+    (cum_duration[0] == 0), likewise cum_sessions and cum_active_days. The
+    arrays grow by doubling, so appending today's totals is amortized O(1).
+    """
+
+    def __init__(self, first_day, capacity=64):
+        self.first_day = first_day
+        self.length = 0
+        self.daily_sessions = np.zeros(capacity, dtype=np.int64)
+        self.cum_duration = np.zeros(capacity + 1, dtype=np.int64)
+        self.cum_sessions = np.zeros(capacity + 1, dtype=np.int64)
+        self.cum_active_days = np.zeros(capacity + 1, dtype=np.int64)
+
+    def _grow(self, length):
+        capacity = len(self.daily_sessions)
+        if length > capacity:
+            new_capacity = max(length, capacity * 2)
+            self.daily_sessions = np.resize(self.daily_sessions, new_capacity)
+            self.daily_sessions[capacity:] = 0
+            for name in ('cum_duration', 'cum_sessions', 'cum_active_days'):
+                array = getattr(self, name)
+                grown = np.empty(new_capacity + 1, dtype=np.int64)
+                grown[:capacity + 1] = array
+                setattr(self, name, grown)
+        # Days between the old end and the new one carry the running totals
+        for array in (self.cum_duration, self.cum_sessions, self.cum_active_days):
+            array[self.length + 1:length + 1] = array[self.length]
+        self.length = length
+
+    def _prepend(self, first_day):
+        # Rare: a save for a day before the first known one
+        shift = self.first_day - first_day
+        old = self.length
+        daily_sessions = self.daily_sessions[:old].copy()
+        cums = [a[:old + 1].copy() for a in (self.cum_duration, self.cum_sessions, self.cum_active_days)]
+        self.__init__(first_day, capacity=max(64, 2 * (old + shift)))
+        self._grow(old + shift)
+        self.daily_sessions[shift:shift + old] = daily_sessions
+        for array, cum in zip((self.cum_duration, self.cum_sessions, self.cum_active_days), cums):
+            array[shift:shift + old + 1] = cum
+
+    def add(self, day, duration_delta, sessions_delta):
+        if day < self.first_day:
+            self._prepend(day)
+        i = day - self.first_day
+        if i >= self.length:
+            self._grow(i + 1)
+
+        was_active = self.daily_sessions[i] > 0
+        self.daily_sessions[i] += sessions_delta
+        active_delta = int(self.daily_sessions[i] > 0) - int(was_active)
+
+        # Only the days after i shift; saves are almost always for today,
+        # which is the last element
+        self.cum_duration[i + 1:self.length + 1] += duration_delta
+        self.cum_sessions[i + 1:self.length + 1] += sessions_delta
+        if active_delta:
+            self.cum_active_days[i + 1:self.length + 1] += active_delta
+
+    def totals(self, first, last):
+        """Return (duration, sessions, active_days) for days first..last"""
+        a = max(first - self.first_day, 0)
+        b = min(last - self.first_day, self.length - 1)
+        if a > b:
+            return 0, 0, 0
+        return (
+            int(self.cum_duration[b + 1] - self.cum_duration[a]),
+            int(self.cum_sessions[b + 1] - self.cum_sessions[a]),
+            int(self.cum_active_days[b + 1] - self.cum_active_days[a])
+        )
+
+
+class RangeIndex:
+    """
+    Per-user prefix sums of daily duration and session counts
+
+    Totals, averages and session counts for any date range are two array
+    lookups per value. Built from the store's daily rollups and kept up to
+    date with SessionStore.subscribe(index.on_save).
+    """
+
+    def __init__(self):
+        self._users = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, store):
+        index = cls()
+        for row in store.daily_totals():
+            index.add(row['user_id'], row['date'], row['total_duration'], row['sessions'])
+        return index
+
+    def add(self, user_id, date, duration_delta, sessions_delta):
+        """Apply a change to one user's totals for one day (YYYY-MM-DD)"""
+        day = _ordinal(date)
+        with self._lock:
+            series = self._users.get(user_id)
+            if series is None:
+                series = self._users[user_id] = _UserSeries(day)
+            series.add(day, duration_delta, sessions_delta)
+
+    def on_save(self, session, duration_delta, sessions_delta):
+        """SessionStore subscriber"""
+        self.add(session['user_id'], session['date'], duration_delta, sessions_delta)
+
+    def query(self, user_id, since, until):
+        """
+        Return the stats for an inclusive date range
+
+        Returns:
+            dict: sessions, total_duration, average_session, active_days,
+            daily_average (per active day) and days (calendar days in range)
+        """
+        first = _ordinal(since)
+        last = _ordinal(until)
+        with self._lock:
+            series = self._users.get(user_id)
+            duration, sessions, active_days = series.totals(first, last) if series else (0, 0, 0)
+
+        return {
+            'sessions': sessions,
+            'total_duration': duration,
+            'average_session': duration / sessions if sessions else 0,
+            'active_days': active_days,
+            'daily_average': duration / active_days if active_days else 0,
+            'days': max(last - first + 1, 0)
+        }
@@ -1,519 +1,794 @@
-import discum
-import requests
-import threading
-import time
-import json
-import os
-from datetime import datetime, timedelta
-import signal
-import sys
-import subprocess
-import psutil
-import platform
-from PIL import Image, ImageDraw, ImageFont
-import io
-
-# Load configuration
-def load_config():
-    try:
-        with open('config.json', 'r') as f:
-            config = json.load(f)
-            
-        # Ensure directories exist
-        for path_type, path in config['paths'].items():
-            if isinstance(path, str) and not path.endswith('.json') and not path.endswith('.txt'):
-                os.makedirs(path, exist_ok=True)
-            elif isinstance(path, dict):
-                # Handle nested paths like fonts
-                for _, nested_path in path.items():
-                    os.makedirs(os.path.dirname(nested_path), exist_ok=True)
-                    
-        return config
-    except FileNotFoundError:
-        print("Error: config.json not found!")
-        exit(1)
-
-# Get config
-config = load_config()
-TOKEN = config['tokens']['selfbot']
-WEBHOOK_CONFIG = {
-    'SELFBOT': config['webhooks']['selfbot'],
-    'LOGS': config['webhooks']['logs']
-}
-USERS_TO_MONITOR = config['users_to_monitor']
-ALERT_RECIPIENTS = config['alert_recipients']
-ADMIN_USER_ID = config['admin_user_id']
-COMMAND_PREFIX = config['command_prefix']
-PATHS = config['paths']
-
-# Initialize Discord client
-bot = discum.Client(token=TOKEN, log={"console":False, "file":False})
-
-# Global session tracking
-sessions = {}
-
-def send_webhook(content, webhook_type='LOGS', username=None):
-    if username is None:
-        username = "Session Monitor" if webhook_type == 'SELFBOT' else "System Log"
-    
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    formatted_content = f"[{timestamp}] {content}"
-    
-    payload = {
-        "username": username,
-        "avatar_url": WEBHOOK_CONFIG[webhook_type]['avatar'],
-        "content": formatted_content if "```" in formatted_content else f"```\n{formatted_content}\n```"
-    }
-    
-    try:
-        requests.post(WEBHOOK_CONFIG[webhook_type]['url'], json=payload)
-    except Exception as e:
-        print(f"[ERROR] Webhook error: {str(e)}")
-
-def save_session_data(user_id, username, start_time, end_time):
-    try:
-        current_time = int(time.time())
-        print(f"[DEBUG] Saving session: user={username}, start={start_time}, end={end_time}, current={current_time}")
-        
-        if start_time > current_time or end_time > current_time:
-            print(f"[ERROR] Invalid timestamps detected")
-            return
-        
-        start_dt = datetime.fromtimestamp(start_time)
-        end_dt = datetime.fromtimestamp(end_time)
-        
-        print(f"[DEBUG] Session dates: start={start_dt}, end={end_dt}")
-        
-        if start_dt.date() != end_dt.date():
-            print(f"[INFO] Session spans multiple days for {username}")
-            save_daily_session(user_id, username, start_time, end_time)
-        else:
-            save_daily_session(user_id, username, start_time, end_time)
-            
-    except Exception as e:
-        print(f"[ERROR] Failed to save session: {str(e)}")
-        send_webhook(f"[ERROR] Failed to save session: {str(e)}", 'LOGS')
-
-def save_daily_session(user_id, username, start_time, end_time):
-    try:
-        current_time = int(time.time())
-        print(f"[DEBUG] Saving session: {username} from {start_time} to {end_time}")
-        
-        if start_time > current_time or end_time > current_time:
-            print(f"[ERROR] Invalid timestamps detected")
-            return
-            
-        duration = end_time - start_time
-        if duration <= 0:
-            print(f"[ERROR] Invalid duration: {duration}s")
-            return
-            
-        date = datetime.fromtimestamp(start_time).strftime('%Y-%m-%d')
-        
-        new_session = {
-            'user_id': user_id,
-            'username': username,
-            'start_time': start_time,
-            'end_time': end_time,
-            'duration': duration,
-            'date': date
-        }
-
-        try:
-            if os.path.exists(PATHS['session_data']):
-                with open(PATHS['session_data'], 'r', encoding='utf-8') as f:
-                    all_sessions = json.load(f)
-            else:
-                all_sessions = []
-                
-            print(f"[DEBUG] Loaded {len(all_sessions)} existing sessions")
-            
-            SESSION_MERGE_THRESHOLD = 60
-            merged = False
-            
-            for i in range(len(all_sessions) - 1, -1, -1):
-                session = all_sessions[i]
-                if (session['user_id'] == user_id and 
-                    session['date'] == date and 
-                    abs(start_time - session['end_time']) <= SESSION_MERGE_THRESHOLD):
-                    
-                    all_sessions[i]['end_time'] = end_time
-                    all_sessions[i]['duration'] = end_time - session['start_time']
-                    merged = True
-                    print(f"[INFO] Merged session for {username} (Duration: {all_sessions[i]['duration']}s)")
-                    break
-            
-            if not merged:
-                all_sessions.append(new_session)
-                print(f"[INFO] Added new session for {username} (Duration: {duration}s)")
-            
-            with open(PATHS['session_data'], 'w', encoding='utf-8') as f:
-                json.dump(all_sessions, f, indent=4)
-                print(f"[INFO] Successfully saved to {PATHS['session_data']}")
-            
-        except Exception as e:
-            print(f"[ERROR] Failed to handle file operations: {str(e)}")
-            
-    except Exception as e:
-        print(f"[ERROR] Failed to save session: {str(e)}")
-def get_daily_stats(user_id, date):
-    try:
-        with open(PATHS['session_data'], 'r', encoding='utf-8') as f:
-            sessions = json.load(f)
-        
-        daily_sessions = [s for s in sessions if s['user_id'] == user_id and s['date'] == date]
-        total_duration = sum(s['duration'] for s in daily_sessions)
-        
-        return {
-            'sessions': len(daily_sessions),
-            'total_duration': total_duration,
-            'average_session': total_duration / len(daily_sessions) if daily_sessions else 0
-        }
-    except Exception:
-        return None
-
-def format_stats(stats, username, date):
-    if not stats:
-        return f"No data for {username} on {date}"
-    
-    return (
-        f":bar_chart: Stats for {username} on {date}\n"
-        f"Sessions: {stats['sessions']}\n"
-        f"Total time: {format_duration(stats['total_duration'])}\n"
-        f"Average/session: {format_duration(stats['average_session'])}"
-    )
-
-def format_duration(seconds):
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    seconds = seconds % 60
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
-def get_user_info(user_id):
-    try:
-        user_info = bot.getProfile(user_id)
-        return user_info.json()['user']['username']
-    except:
-        return 'Unknown'
-
-def send_dm(user_id, content):
-    try:
-        dm_channel = bot.createDM([user_id]).json()
-        channel_id = dm_channel['id']
-        print(f"[DEBUG] Opening DM channel: {channel_id}")
-        
-        response = bot.sendMessage(channel_id, content)
-        print(f"[DEBUG] Message sent: {response.status_code}")
-        
-        if response.status_code != 200:
-            print(f"[ERROR] Failed to send message: {response.text}")
-            
-    except Exception as e:
-        print(f"[ERROR] Failed to send DM: {str(e)}")
-
-def refresh_sessions():
-    current_time = int(time.time())
-    
-    try:
-        for user_id, session_data in sessions.copy().items():
-            if 'start_time' in session_data and session_data['start_time'] is not None:
-                try:
-                    username = get_user_info(user_id)
-                    start_time = session_data['start_time']
-                    
-                    if start_time <= current_time:
-                        print(f"[INFO] Saving session for {username} during refresh")
-                        save_daily_session(user_id, username, start_time, current_time)
-                except Exception as e:
-                    print(f"[ERROR] Failed to save session during refresh for {user_id}: {str(e)}")
-        
-        sessions.clear()
-        return "✅ Successfully saved all current sessions!"
-    except Exception as e:
-        error_msg = f"❌ Failed to save sessions: {str(e)}"
-        print(f"[ERROR] {error_msg}")
-        return error_msg
-
-def get_system_info():
-    try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_count = psutil.cpu_count()
-        
-        memory = psutil.virtual_memory()
-        memory_total = memory.total / (1024 ** 3)
-        memory_used = memory.used / (1024 ** 3)
-        memory_percent = memory.percent
-        
-        disk = psutil.disk_usage('/')
-        disk_total = disk.total / (1024 ** 3)
-        disk_used = disk.used / (1024 ** 3)
-        disk_percent = disk.percent
-        
-        boot_time = datetime.fromtimestamp(psutil.boot_time())
-        uptime = datetime.now() - boot_time
-        
-        fields = [
-            {
-                "name": "🖥️ CPU",
-                "value": f"```Usage: {cpu_percent}%\nCores: {cpu_count}```",
-                "inline": True
-            },
-            {
-                "name": "💾 Memory",
-                "value": f"```Total: {memory_total:.1f}GB\nUsed: {memory_used:.1f}GB\nUsage: {memory_percent}%```",
-                "inline": True
-            },
-            {
-                "name": "💿 Disk",
-                "value": f"```Total: {disk_total:.1f}GB\nUsed: {disk_used:.1f}GB\nUsage: {disk_percent}%```",
-                "inline": True
-            },
-            {
-                "name": "⚙️ System",
-                "value": f"```OS: {platform.system()} {platform.release()}\nUptime: {str(uptime).split('.')[0]}```",
-                "inline": False
-            }
-        ]
-        
-        return fields
-    except Exception as e:
-        print(f"[ERROR] Failed to get system info: {str(e)}")
-        send_webhook(f"Failed to get system info: {str(e)}", 'LOGS')
-        return None
-
-def create_stats_image():
-    try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_count = psutil.cpu_count()
-        
-        memory = psutil.virtual_memory()
-        memory_total = memory.total / (1024 ** 3)
-        memory_used = memory.used / (1024 ** 3)
-        memory_percent = memory.percent
-        
-        disk = psutil.disk_usage('/')
-        disk_total = disk.total / (1024 ** 3)
-        disk_used = disk.used / (1024 ** 3)
-        disk_percent = disk.percent
-        
-        boot_time = datetime.fromtimestamp(psutil.boot_time())
-        uptime = datetime.now() - boot_time
-
-        width = 800
-        height = 400
-        background_color = (44, 47, 51)
-        text_color = (255, 255, 255)
-        
-        image = Image.new('RGB', (width, height), background_color)
-        draw = ImageDraw.Draw(image)
-        
-        try:
-            title_font = ImageFont.truetype(PATHS['fonts']['arial'], 36)
-            main_font = ImageFont.truetype(PATHS['fonts']['arial'], 24)
-        except:
-            title_font = ImageFont.load_default()
-            main_font = ImageFont.load_default()
-
-        title = "System Usage Statistics"
-        draw.text((width/2, 30), title, font=title_font, fill=text_color, anchor="mm")
-
-        y_position = 100
-        padding = 20
-        
-        stats_text = [
-            f"CPU Usage: {cpu_percent}% | Cores: {cpu_count}",
-            f"Memory: {memory_used:.1f}GB / {memory_total:.1f}GB ({memory_percent}%)",
-            f"Disk: {disk_used:.1f}GB / {disk_total:.1f}GB ({disk_percent}%)",
-            f"OS: {platform.system()} {platform.release()}",
-            f"Uptime: {str(uptime).split('.')[0]}"
-        ]
-
-        for text in stats_text:
-            draw.text((padding, y_position), text, font=main_font, fill=text_color)
-            y_position += 50
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        draw.text((width-padding, height-padding), timestamp, font=main_font, fill=text_color, anchor="rb")
-
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        
-        return img_byte_arr.getvalue()
-        
-    except Exception as e:
-        print(f"[ERROR] Failed to create stats image: {str(e)}")
-        return None
-
-def send_usage_stats(channel_id, username):
-    try:
-        cpu_percent = psutil.cpu_percent(interval=1)
-        cpu_count = psutil.cpu_count()
-        
-        memory = psutil.virtual_memory()
-        memory_total = memory.total / (1024 ** 3)
-        memory_used = memory.used / (1024 ** 3)
-        memory_percent = memory.percent
-        
-        disk = psutil.disk_usage('/')
-        disk_total = disk.total / (1024 ** 3)
-        disk_used = disk.used / (1024 ** 3)
-        disk_percent = disk.percent
-        
-        boot_time = datetime.fromtimestamp(psutil.boot_time())
-        uptime = datetime.now() - boot_time
-
-        message = (
-            "📊 **System Usage Statistics**\n\n"
-            "🖥️ **CPU**\n"
-            f"```Usage: {cpu_percent}%\nCores: {cpu_count}```\n"
-            "💾 **Memory**\n"
-            f"```Total: {memory_total:.1f}GB\nUsed: {memory_used:.1f}GB\nUsage: {memory_percent}%```\n"
-            "💿 **Disk**\n"
-            f"```Total: {disk_total:.1f}GB\nUsed: {disk_used:.1f}GB\nUsage: {disk_percent}%```\n"
-            "⚙️ **System**\n"
-            f"```OS: {platform.system()} {platform.release()}\nUptime: {str(uptime).split('.')[0]}```\n\n"
-            f"*Requested by {username} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*"
-        )
-        
-        bot.sendMessage(channel_id, message)
-        send_webhook("System usage stats sent", 'LOGS')
-        
-    except Exception as e:
-        error_msg = f"Failed to send usage stats: {str(e)}"
-        bot.sendMessage(channel_id, f"❌ {error_msg}")
-        send_webhook(f"Error sending usage stats: {error_msg}", 'LOGS')
-
-@bot.gateway.command
-def handle_events(resp):
-    if resp.event.message:
-        try:
-            m = resp.parsed.auto()
-            if m['author']['id'] == ADMIN_USER_ID:
-                channel_id = m['channel_id']
-                
-                if m['content'].startswith(f'{COMMAND_PREFIX}usage'):
-                    send_usage_stats(channel_id, m['author']['username'])
-                
-                elif m['content'].startswith(f'{COMMAND_PREFIX}give'):
-                    try:
-                        with open(PATHS['session_data'], 'rb') as f:
-                            bot.sendFile(channel_id, "session_data.json", f)
-                            send_webhook(f"Session data file sent to {m['author']['username']}", 'LOGS')
-                    except Exception as e:
-                        error_msg = f"Failed to send file: {str(e)}"
-                        bot.sendMessage(channel_id, f"❌ {error_msg}")
-                        send_webhook(f"Error sending file: {error_msg}", 'LOGS')
-                
-                elif m['content'].startswith(f'{COMMAND_PREFIX}refresh'):
-                    result = refresh_sessions()
-                    bot.sendMessage(channel_id, result)
-                    send_webhook(f"Refresh command executed by {m['author']['username']}", 'LOGS')
-                    
-        except Exception as e:
-            print(f"[ERROR] Failed to process command: {str(e)}")
-            send_webhook(f"Error processing command: {str(e)}", 'LOGS')
-            
-    if resp.event.presence_updated:
-        try:
-            data = resp.parsed.auto()
-            user_id = data['user']['id']
-            
-            if user_id not in USERS_TO_MONITOR:
-                return
-            
-            print(f"[DEBUG] Processing status update for user {user_id}")
-            
-            try:
-                user_info = bot.getProfile(user_id)
-                username = user_info.json()['user']['username']
-                if username == 'Unknown':
-                    return
-            except:
-                return
-            
-            current_status = data.get('status', 'offline')
-            current_time = int(time.time())
-            
-            previous_status = sessions.get(user_id, {}).get('status', 'offline')
-            
-            if current_status != previous_status:
-                if user_id not in sessions:
-                    sessions[user_id] = {}
-                
-                sessions[user_id]['status'] = current_status
-                
-                timestamp = int(time.time())
-                discord_timestamp = f"<t:{timestamp}:f>"
-                
-                status_emoji = {
-                    'online': ":green_circle:",
-                    'idle': ":yellow_circle:",
-                    'dnd': ":red_circle:",
-                    'offline': ":black_circle:"
-                }.get(current_status, ":black_circle:")
-                
-                status_msg = (
-                    f"**Status Update for {username}**\n\n"
-                    f"{status_emoji} New Status: {current_status.capitalize()}\n"
-                    f":arrow_right: Previous Status: {previous_status.capitalize()}\n"
-                    f":clock3: {discord_timestamp}"
-                )
-                
-                for recipient_id in ALERT_RECIPIENTS:
-                    send_dm(recipient_id, status_msg)
-                
-                if current_status != 'offline' and previous_status == 'offline':
-                    sessions[user_id]['start_time'] = current_time
-                    print(f"[INFO] Session started for {username} with status {current_status}")
-                elif previous_status != 'offline' and current_status == 'offline':
-                    start_time = sessions[user_id].get('start_time')
-                    if start_time and start_time <= current_time:
-                        print(f"[INFO] Saving session for {username}")
-                        save_daily_session(user_id, username, start_time, current_time)
-                        sessions[user_id]['start_time'] = None
-                        
-        except Exception as e:
-            print(f"[ERROR] Failed to process presence: {str(e)}")
-
-def signal_handler(sig, frame):
-    print("\nSaving sessions before exit...")
-    current_time = int(time.time())
-    
-    for user_id, session_data in sessions.copy().items():
-        if 'start_time' in session_data and session_data['start_time'] is not None:
-            try:
-                username = get_user_info(user_id)
-                start_time = session_data['start_time']
-                
-                if start_time <= current_time:
-                    print(f"[INFO] Saving final session for {username}")
-                    save_daily_session(user_id, username, start_time, current_time)
-            except Exception as e:
-                print(f"[ERROR] Failed to save final session for {user_id}: {str(e)}")
-    
-    print("Sessions saved. Exiting...")
-    sys.exit(0)
-
-def main():
-    print("Starting bot...")
-    send_webhook("Bot starting...", 'LOGS')
-    
-    signal.signal(signal.SIGINT, signal_handler)
-    
-    if not os.path.exists(PATHS['session_data']):
-        with open(PATHS['session_data'], 'w') as f:
-            json.dump([], f)
-    
-    try:
-        if len(sys.argv) == 1:
-            subprocess.Popen([sys.executable, "dataanalyst.py"])
-        
-        bot.gateway.run(auto_reconnect=True)
-    except Exception as e:
-        error_msg = f"Bot crashed: {str(e)}"
-        print(error_msg)
-        send_webhook(error_msg, 'LOGS')
-
-if __name__ == "__main__":
+import time
+
+# Taken before any other import so the startup report covers them
+STARTED = time.perf_counter()
+
+import logging
+import threading
+import json
+import os
+from datetime import datetime, timedelta
+import signal
+import sys
+import subprocess
+import bootstrap
+import botlog
+import metrics
+import profiler
+from checkpoint import SessionCheckpoint
+import range_stats
+import session_export
+import session_feed
+import session_split
+import session_store
+from webhook_dispatcher import WebhookDispatcher
+from workers import Stage
+from cache import TTLCache
+from commands import CommandRouter
+from notifier import DMNotifier
+from sysmetrics import SystemSampler
+from session_compaction import HistoryCompactor, format_report
+from stats_image import StatsImageRenderer
+from session_store import SESSION_MERGE_THRESHOLD
+
+startup = bootstrap.StartupTimer(STARTED)
+startup.mark('import')
+
+# Get config (validated before the Discord client is even imported)
+config = bootstrap.load_config(required=(
+    'tokens.selfbot', 'webhooks.selfbot', 'users_to_monitor', 'alert_recipients', 'admin_user_id'
+))
+startup.mark('config')
+
+# discum is by far the heaviest import, so it waits until the config is usable
+import discum
+startup.mark('discum import')
+
+TOKEN = config['tokens']['selfbot']
+WEBHOOK_CONFIG = {
+    'SELFBOT': config['webhooks']['selfbot'],
+    'LOGS': config['webhooks']['logs']
+}
+USERS_TO_MONITOR = config['users_to_monitor']
+ALERT_RECIPIENTS = config['alert_recipients']
+ADMIN_USER_ID = config['admin_user_id']
+COMMAND_PREFIX = config['command_prefix']
+PATHS = config['paths']
+
+# Background webhook sender shared by every send_webhook call. It exists
+# before logging is set up, since the logging webhook sink goes through it.
+webhooks = WebhookDispatcher()
+
+def send_webhook(content, webhook_type='LOGS', username=None):
+    if username is None:
+        username = "Session Monitor" if webhook_type == 'SELFBOT' else "System Log"
+    
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    formatted_content = f"[{timestamp}] {content}"
+    
+    # Queued; the dispatcher thread does the HTTP request
+    webhooks.send_text(
+        WEBHOOK_CONFIG[webhook_type]['url'],
+        formatted_content,
+        username,
+        WEBHOOK_CONFIG[webhook_type]['avatar']
+    )
+
+# Structured logging: JSON lines under PATHS['logs'], console, WARNING+ to the logs webhook
+botlog.setup_logging(PATHS['logs'], lambda text: send_webhook(text, 'LOGS'), config.get('logging'))
+log = logging.getLogger('selbot')
+
+# Open session storage (replays any pending journal records)
+store = session_store.open_store(PATHS['session_data'], config.get('storage'))
+
+# Per-user prefix sums by day for /stats range queries, updated on every save
+ranges = range_stats.RangeIndex.from_store(store)
+store.subscribe(ranges.on_save)
+
+# Every save is streamed to dataanalyst.py over a local socket, so the
+# analyst keeps its daily totals in memory instead of re-reading the store
+FEED_CONFIG = config.get('feed', {})
+feed = None
+if FEED_CONFIG.get('enabled', True):
+    feed = session_feed.FeedServer(
+        session_feed.feed_address(FEED_CONFIG, os.path.dirname(PATHS['session_data'])),
+        store.daily_totals()
+    )
+    store.subscribe(feed.on_save)
+startup.mark('store')
+
+# Initialize Discord client
+bot = discum.Client(token=TOKEN, log={"console":False, "file":False})
+startup.mark('client')
+
+# DM sender with DM channel ids cached across restarts
+notifier = DMNotifier(bot, os.path.join(os.path.dirname(PATHS['session_data']), 'dm_channels.json'))
+
+# Background system metrics; /usage and the stats image read the latest sample
+SYSTEM_METRICS_CONFIG = config.get('system_metrics', {})
+sampler = SystemSampler(
+    interval=SYSTEM_METRICS_CONFIG.get('interval', 5),
+    history=SYSTEM_METRICS_CONFIG.get('history', 720)
+)
+
+# Stats card renderer: fonts and static layer are prepared once
+STATS_IMAGE_CONFIG = config.get('stats_image', {})
+stats_renderer = StatsImageRenderer(
+    PATHS['fonts']['arial'],
+    image_format=STATS_IMAGE_CONFIG.get('format', 'PNG'),
+    compress_level=STATS_IMAGE_CONFIG.get('compress_level', 1),
+    webp_quality=STATS_IMAGE_CONFIG.get('webp_quality', 80),
+    max_age=STATS_IMAGE_CONFIG.get('max_age', 5)
+)
+
+# /give exports: parts are kept under Discord's attachment limit
+EXPORT_CONFIG = config.get('export', {})
+
+# Global session tracking
+sessions = {}
+
+# Open sessions survive crashes through an append-only checkpoint; restored
+# sessions are reconciled with the first presence seen after a restart
+CHECKPOINT_CONFIG = config.get('checkpoint', {})
+checkpoint = SessionCheckpoint(
+    os.path.join(os.path.dirname(PATHS['session_data']), 'open_sessions.checkpoint'),
+    compact_every=CHECKPOINT_CONFIG.get('compact_every', 500),
+    heartbeat_interval=CHECKPOINT_CONFIG.get('heartbeat_interval', 30)
+)
+RECOVERY_GRACE = CHECKPOINT_CONFIG.get('recovery_grace', 300)
+restored = {}
+
+# Background compaction of old history: merges fragments and, past
+# aggregate_after_days, rolls days into one record per user
+RETENTION_CONFIG = config.get('retention', {})
+compactor = HistoryCompactor(
+    store,
+    interval_hours=RETENTION_CONFIG.get('interval_hours', 24),
+    merge_gap=RETENTION_CONFIG.get('merge_gap', 300),
+    aggregate_after_days=RETENTION_CONFIG.get('aggregate_after_days', 90),
+    hot_days=RETENTION_CONFIG.get('hot_days', 2),
+    on_report=lambda report: send_webhook(format_report(report), 'LOGS')
+)
+
+def save_session_data(user_id, username, start_time, end_time):
+    try:
+        current_time = int(time.time())
+        log.debug(f"Saving session: user={username}, start={start_time}, end={end_time}, current={current_time}")
+        
+        if start_time > current_time or end_time > current_time:
+            log.error("Invalid timestamps detected")
+            return
+        
+        start_dt = datetime.fromtimestamp(start_time)
+        end_dt = datetime.fromtimestamp(end_time)
+        
+        log.debug(f"Session dates: start={start_dt}, end={end_dt}")
+        
+        if start_dt.date() != end_dt.date():
+            log.info(f"Session spans multiple days for {username}")
+            # Credit each day with the part of the session that fell on it
+            pieces = session_split.split_session({'start_time': start_time, 'end_time': end_time})
+            for piece in pieces:
+                save_daily_session(user_id, username, piece['start_time'], piece['end_time'])
+        else:
+            save_daily_session(user_id, username, start_time, end_time)
+            
+    except Exception as e:
+        log.error(f"Failed to save session: {str(e)}")
+
+def save_daily_session(user_id, username, start_time, end_time):
+    try:
+        current_time = int(time.time())
+        log.debug(f"Saving session: {username} from {start_time} to {end_time}")
+        
+        if start_time > current_time or end_time > current_time:
+            log.error("Invalid timestamps detected")
+            return
+            
+        duration = end_time - start_time
+        if duration <= 0:
+            log.error(f"Invalid duration: {duration}s")
+            return
+            
+        date = datetime.fromtimestamp(start_time).strftime('%Y-%m-%d')
+        
+        new_session = {
+            'user_id': user_id,
+            'username': username,
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration': duration,
+            'date': date
+        }
+
+        try:
+            with SAVE_SECONDS.time():
+                record, merged = store.save_session(new_session, SESSION_MERGE_THRESHOLD)
+            
+            if merged:
+                log.info(f"Merged session for {username} (Duration: {record['duration']}s)")
+            else:
+                log.info(f"Added new session for {username} (Duration: {duration}s)")
+            
+        except Exception as e:
+            log.error(f"Failed to handle file operations: {str(e)}")
+            
+    except Exception as e:
+        log.error(f"Failed to save session: {str(e)}")
+def get_daily_stats(user_id, date):
+    return get_range_stats(user_id, date, date)
+
+def get_range_stats(user_id, since, until):
+    try:
+        return ranges.query(user_id, since, until)
+    except Exception:
+        return None
+
+def format_stats(stats, username, date, until=None):
+    period = f"on {date}" if until is None or until == date else f"from {date} to {until}"
+    if not stats or not stats['sessions']:
+        return f"No data for {username} {period}"
+    
+    message = (
+        f":bar_chart: Stats for {username} {period}\n"
+        f"Sessions: {stats['sessions']}\n"
+        f"Total time: {format_duration(stats['total_duration'])}\n"
+        f"Average/session: {format_duration(stats['average_session'])}"
+    )
+    if until is not None and until != date:
+        message += (
+            f"\nActive days: {stats['active_days']}/{stats['days']}\n"
+            f"Average/active day: {format_duration(stats['daily_average'])}"
+        )
+    return message
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    seconds = seconds % 60
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def fetch_username(user_id):
+    user_info = bot.getProfile(user_id)
+    return user_info.json()['user']['username']
+
+# Username lookups, cached so presence updates rarely hit the REST API
+PROFILE_CACHE_CONFIG = config.get('profile_cache', {})
+profiles = TTLCache(
+    fetch_username,
+    max_size=PROFILE_CACHE_CONFIG.get('max_size', 512),
+    ttl=PROFILE_CACHE_CONFIG.get('ttl', 21600),
+    negative_ttl=PROFILE_CACHE_CONFIG.get('negative_ttl', 60)
+)
+
+# Last username seen per user; a failed (and negatively cached) lookup
+# falls back to it instead of stalling session tracking
+known_usernames = {}
+
+def get_user_info(user_id):
+    username = profiles.get(user_id)
+    if username:
+        known_usernames[user_id] = username
+        return username
+    return known_usernames.get(user_id, user_id)
+
+def seed_profile_cache():
+    # Usernames already in the store avoid a REST call per user at startup
+    seeded = 0
+    for user_id, username in store.latest_usernames().items():
+        # A session saved while lookups failed carries the id instead
+        if user_id in USERS_TO_MONITOR and username != user_id:
+            profiles.put(user_id, username)
+            known_usernames[user_id] = username
+            seeded += 1
+    log.info(f"Seeded profile cache with {seeded} usernames")
+
+def send_dm(user_id, content):
+    return notifier.send(user_id, content)
+
+# Stands in for the status of a presence event to flush that user's open
+# session; see refresh_sessions
+REFRESH = 'refresh'
+
+def flush_session(user_id, current_time):
+    """Store a user's open session up to current_time and keep it open"""
+    if user_id in restored:
+        # Not reconciled with a presence yet; the bot may have been down
+        return
+    session_data = sessions.get(user_id, {})
+    start_time = session_data.get('start_time')
+    if start_time is None or start_time >= current_time:
+        return
+    
+    username = get_user_info(user_id)
+    log.info(f"Saving session for {username} during refresh")
+    save_session_data(user_id, username, start_time, current_time)
+    # The session stays open; only the part up to now is stored
+    session_data['start_time'] = current_time
+    checkpoint.record(user_id, session_data['status'], current_time)
+
+def refresh_sessions():
+    current_time = int(time.time())
+    
+    # Each flush is queued on the user's presence shard, so it runs in order
+    # with their status changes instead of racing them
+    for user_id in list(sessions):
+        if not presence_stage.submit((user_id, REFRESH, current_time), key=user_id):
+            error_msg = "❌ Failed to save sessions: presence queue is full"
+            log.error(error_msg)
+            return error_msg
+    
+    if not presence_stage.drain(timeout=60):
+        error_msg = "❌ Failed to save sessions: timed out waiting for the presence workers"
+        log.error(error_msg)
+        return error_msg
+    return "✅ Successfully saved all current sessions!"
+
+def get_system_info():
+    try:
+        sample = sampler.latest()
+        
+        fields = [
+            {
+                "name": "🖥️ CPU",
+                "value": f"```Usage: {sample['cpu_percent']}%\nCores: {sample['cpu_count']}```",
+                "inline": True
+            },
+            {
+                "name": "💾 Memory",
+                "value": f"```Total: {sample['memory_total']:.1f}GB\nUsed: {sample['memory_used']:.1f}GB\nUsage: {sample['memory_percent']}%```",
+                "inline": True
+            },
+            {
+                "name": "💿 Disk",
+                "value": f"```Total: {sample['disk_total']:.1f}GB\nUsed: {sample['disk_used']:.1f}GB\nUsage: {sample['disk_percent']}%```",
+                "inline": True
+            },
+            {
+                "name": "⚙️ System",
+                "value": f"```OS: {sample['os']}\nUptime: {sample['uptime']}```",
+                "inline": False
+            }
+        ]
+        
+        return fields
+    except Exception as e:
+        log.error(f"Failed to get system info: {str(e)}")
+        return None
+
+def create_stats_image():
+    try:
+        return stats_renderer.render(sampler.latest())
+    except Exception as e:
+        log.error(f"Failed to create stats image: {str(e)}")
+        return None
+
+def usage_command(ctx):
+    """/usage [minutes]: current system usage, averages and peaks over the window"""
+    minutes = int(ctx.args[0]) if ctx.args and ctx.args[0].isdigit() else 15
+    sample = sampler.latest()
+
+    message = (
+        "📊 **System Usage Statistics**\n\n"
+        "🖥️ **CPU**\n"
+        f"```Usage: {sample['cpu_percent']}%\nCores: {sample['cpu_count']}```\n"
+        "💾 **Memory**\n"
+        f"```Total: {sample['memory_total']:.1f}GB\nUsed: {sample['memory_used']:.1f}GB\nUsage: {sample['memory_percent']}%```\n"
+        "💿 **Disk**\n"
+        f"```Total: {sample['disk_total']:.1f}GB\nUsed: {sample['disk_used']:.1f}GB\nUsage: {sample['disk_percent']}%```\n"
+        "⚙️ **System**\n"
+        f"```OS: {sample['os']}\nUptime: {sample['uptime']}```\n"
+    )
+    
+    summary = sampler.summary(minutes)
+    if summary:
+        message += (
+            f"📈 **Last {minutes} min** ({summary['samples']} samples)\n"
+            f"```CPU: avg {summary['cpu_percent_avg']:.1f}% / peak {summary['cpu_percent_peak']:.1f}%\n"
+            f"Memory: avg {summary['memory_percent_avg']:.1f}% / peak {summary['memory_percent_peak']:.1f}%\n"
+            f"Disk: avg {summary['disk_percent_avg']:.1f}% / peak {summary['disk_percent_peak']:.1f}%```\n"
+        )
+    
+    pipeline_lines = "\n".join(
+        f"{s['name']}: depth {s['depth']} (max {s['max_depth']}), "
+        f"done {s['processed']}, errors {s['errors']}, blocked {s['blocked']}, dropped {s['dropped']}"
+        for s in (stage.stats() for stage in PIPELINE)
+    )
+    running = ", ".join(f"{name} {count}" for name, count in command_router.stats().items() if count)
+    pipeline_lines += f"\ncommands running: {running or 'none'}"
+    message += f"\n🧵 **Pipeline**\n```{pipeline_lines}```"
+    
+    dm_stats = notifier.stats()
+    if dm_stats:
+        dm_lines = "\n".join(
+            f"{user_id}: sent {s['sent']}, failed {s['failed']}, avg {s['avg_latency'] * 1000:.0f}ms"
+            for user_id, s in dm_stats.items()
+        )
+        message += f"\n📨 **DMs**\n```{dm_lines}```"
+    
+    message += f"\n\n*Requested by {ctx.author} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*"
+    send_webhook("System usage stats sent", 'LOGS')
+    return message
+
+def parse_export_args(args):
+    """
+    Parse /give [from] [to] [user] [ndjson|csv]
+
+    Dates are YYYY-MM-DD (one date means from that day on); the user is an
+    id or a stored username.
+
+    Returns:
+        tuple: (since, until, user_id, fmt)
+    """
+    dates = []
+    user = None
+    fmt = EXPORT_CONFIG.get('format', 'ndjson')
+    for arg in args:
+        if arg.lower() in session_export.FORMATS:
+            fmt = arg.lower()
+            continue
+        try:
+            dates.append(datetime.strptime(arg, '%Y-%m-%d').strftime('%Y-%m-%d'))
+            continue
+        except ValueError:
+            pass
+        if user is not None:
+            raise ValueError(f"Unexpected argument: {arg}")
+        user = arg
+
+    if len(dates) > 2:
+        raise ValueError("Give at most two dates")
+    since = dates[0] if dates else None
+    until = dates[1] if len(dates) > 1 else None
+    if since and until and since > until:
+        since, until = until, since
+
+    user_id = resolve_user(user) if user is not None else None
+    return since, until, user_id, fmt
+
+def resolve_user(user):
+    """Return the user id for an id or a stored username"""
+    if user.isdigit():
+        return user
+    matches = [uid for uid, name in store.latest_usernames().items() if name.lower() == user.lower()]
+    if not matches:
+        raise ValueError(f"Unknown user: {user}")
+    return matches[0]
+
+def stats_command(ctx):
+    """/stats <user> <from> [to], answered from the range index"""
+    args = ctx.args
+    if len(args) not in (2, 3):
+        raise ValueError("Expected a user and one or two dates")
+    user_id = resolve_user(args[0])
+    try:
+        dates = [datetime.strptime(arg, '%Y-%m-%d').strftime('%Y-%m-%d') for arg in args[1:]]
+    except ValueError:
+        raise ValueError("Dates must be YYYY-MM-DD")
+    since, until = min(dates), max(dates)
+
+    stats = get_range_stats(user_id, since, until)
+    username = get_user_info(user_id) if args[0].isdigit() else args[0]
+    return format_stats(stats, username, since, until)
+
+def give_command(ctx):
+    """/give [from] [to] [user] [ndjson|csv]: stream the matching sessions into compressed files and upload them"""
+    since, until, user_id, fmt = parse_export_args(ctx.args)
+    basename = f"sessions_{since or 'start'}_{until or 'now'}" + (f"_{user_id}" if user_id else "")
+
+    paths, count = session_export.export_sessions(
+        store.iter_sessions(user_id=user_id, since=since, until=until),
+        PATHS['temp'],
+        basename,
+        fmt,
+        EXPORT_CONFIG.get('max_upload_bytes', 8 * 1024 * 1024)
+    )
+    try:
+        if not count:
+            return "No sessions match that range"
+        for part, path in enumerate(paths, 1):
+            caption = f"{count} sessions" if len(paths) == 1 else f"{count} sessions, part {part}/{len(paths)}"
+            bot.sendFile(ctx.channel_id, path, message=caption)
+    finally:
+        session_export.remove_files(paths)
+    send_webhook(f"Exported {count} sessions for {ctx.author}", 'LOGS')
+
+# /profile: sampling captures of every thread; one at a time
+MAX_PROFILE_SECONDS = 300
+sampling_profiler = profiler.SamplingProfiler()
+
+def profile_command(ctx):
+    """/profile <seconds> [mem]: capture a profile and upload the report"""
+    args = ctx.args
+    if not args or not args[0].isdigit() or not 1 <= int(args[0]) <= MAX_PROFILE_SECONDS:
+        raise ValueError(f"Give a capture window of 1-{MAX_PROFILE_SECONDS} seconds")
+    seconds = int(args[0])
+    trace_memory = len(args) > 1 and args[1].lower() == 'mem'
+
+    command_router.reply(ctx.channel_id, f"⏱️ Profiling for {seconds}s{' with allocation tracing' if trace_memory else ''}...")
+    report = sampling_profiler.run(seconds, trace_memory=trace_memory)
+
+    path = os.path.join(PATHS['temp'], f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(report)
+    try:
+        bot.sendFile(ctx.channel_id, path, message=f"Profile of the last {seconds}s")
+    finally:
+        os.remove(path)
+    send_webhook(f"Profile captured for {ctx.author}", 'LOGS')
+
+def refresh_command(ctx):
+    """/refresh: store the open sessions up to now"""
+    result = refresh_sessions()
+    send_webhook(f"Refresh command executed by {ctx.author}", 'LOGS')
+    return result
+
+# Admin commands run on the router's worker pool; the gateway thread only
+# dispatches them. Slow commands are acknowledged at once and limited to
+# one run at a time.
+command_router = CommandRouter(COMMAND_PREFIX, lambda channel_id, text: bot.sendMessage(channel_id, text))
+command_router.register('usage', usage_command, '[minutes]', max_concurrent=2, timeout=30)
+command_router.register('stats', stats_command, '<user> <from YYYY-MM-DD> [to YYYY-MM-DD]', max_concurrent=4, timeout=30)
+command_router.register(
+    'give', give_command, '[from YYYY-MM-DD] [to YYYY-MM-DD] [user] [ndjson|csv]',
+    timeout=300, ack="📦 Preparing the export..."
+)
+command_router.register('profile', profile_command, '<seconds> [mem]', timeout=MAX_PROFILE_SECONDS + 60)
+command_router.register('refresh', refresh_command, timeout=120, ack="🔄 Saving open sessions...")
+
+def handle_notification(status_msg):
+    notifier.broadcast(ALERT_RECIPIENTS, status_msg)
+
+def restore_open_sessions():
+    states, last_alive = checkpoint.load()
+    for user_id, state in states.items():
+        if user_id in USERS_TO_MONITOR and state['start_time'] is not None:
+            sessions[user_id] = dict(state)
+            restored[user_id] = last_alive
+    if restored:
+        log.info(f"Restored {len(restored)} open sessions from checkpoint (last alive {datetime.fromtimestamp(last_alive)})")
+
+def reconcile_restored(user_id, username, current_status, current_time):
+    """
+    First presence for a user whose session was restored from the checkpoint
+
+    The session goes on if the user is still online and the bot was only
+    down briefly; otherwise it is closed at the time the bot was last alive.
+    """
+    last_alive = restored.pop(user_id)
+    state = sessions[user_id]
+    start_time = state.get('start_time')
+    if start_time is None:
+        return
+    if current_status != 'offline' and current_time - last_alive <= RECOVERY_GRACE:
+        log.info(f"Resumed session for {username} after restart")
+        return
+    
+    if last_alive > start_time:
+        log.info(f"Saving session for {username} interrupted by restart")
+        save_session_data(user_id, username, start_time, last_alive)
+    state['status'] = 'offline'
+    state['start_time'] = None
+    checkpoint.record(user_id, 'offline', None)
+
+def resync_presences(ready_data):
+    """Queue the presence reported at (re)connect for every monitored user"""
+    statuses = {}
+    presences = ready_data.get('merged_presences', {})
+    for presence in presences.get('friends', []):
+        statuses[presence['user_id']] = presence.get('status', 'offline')
+    for guild_presences in presences.get('guilds', []):
+        for presence in guild_presences:
+            statuses.setdefault(presence['user_id'], presence.get('status', 'offline'))
+    
+    current_time = int(time.time())
+    for user_id in USERS_TO_MONITOR:
+        status = statuses.get(user_id)
+        if status is None:
+            # Missing from the payload says nothing about a user we already
+            # track (e.g. after a plain reconnect); only a session restored
+            # from the checkpoint needs settling, so it is taken as offline
+            if user_id not in restored:
+                continue
+            status = 'offline'
+        presence_stage.submit((user_id, status, current_time), key=user_id)
+
+def handle_presence(event):
+    user_id, current_status, current_time = event
+    if current_status == REFRESH:
+        flush_session(user_id, current_time)
+        return
+    log.debug(f"Processing status update for user {user_id}")
+    
+    # Never None: a failed lookup falls back to the last known name or the id
+    username = get_user_info(user_id)
+    
+    if user_id in restored:
+        reconcile_restored(user_id, username, current_status, current_time)
+    
+    previous_status = sessions.get(user_id, {}).get('status', 'offline')
+    
+    if current_status != previous_status:
+        if user_id not in sessions:
+            sessions[user_id] = {}
+        
+        sessions[user_id]['status'] = current_status
+        
+        discord_timestamp = f"<t:{current_time}:f>"
+        
+        status_emoji = {
+            'online': ":green_circle:",
+            'idle': ":yellow_circle:",
+            'dnd': ":red_circle:",
+            'offline': ":black_circle:"
+        }.get(current_status, ":black_circle:")
+        
+        status_msg = (
+            f"**Status Update for {username}**\n\n"
+            f"{status_emoji} New Status: {current_status.capitalize()}\n"
+            f":arrow_right: Previous Status: {previous_status.capitalize()}\n"
+            f":clock3: {discord_timestamp}"
+        )
+        
+        notification_stage.submit(status_msg)
+        
+        if current_status != 'offline' and previous_status == 'offline':
+            sessions[user_id]['start_time'] = current_time
+            log.info(f"Session started for {username} with status {current_status}")
+        elif previous_status != 'offline' and current_status == 'offline':
+            start_time = sessions[user_id].get('start_time')
+            if start_time and start_time <= current_time:
+                log.info(f"Saving session for {username}")
+                save_session_data(user_id, username, start_time, current_time)
+                sessions[user_id]['start_time'] = None
+        
+        checkpoint.record(user_id, current_status, sessions[user_id].get('start_time'))
+
+# Worker pipeline: the gateway callback only parses and enqueues.
+# Presence updates are sharded by user so each user's events stay ordered.
+presence_stage = Stage('presence', handle_presence, shards=4)
+notification_stage = Stage('notifications', handle_notification)
+PIPELINE = (presence_stage, notification_stage)
+
+# Hot-path metrics; served on a local port when metrics.enabled is set
+METRICS_CONFIG = config.get('metrics', {})
+EVENT_SECONDS = metrics.REGISTRY.histogram(
+    'selbot_event_handle_seconds', 'Time spent in the gateway callback per event', ('event',))
+EVENTS_SEEN = metrics.REGISTRY.counter('selbot_events_seen_total', 'Gateway events received', ('event',))
+EVENTS_FILTERED = metrics.REGISTRY.counter(
+    'selbot_events_filtered_total', 'Gateway events ignored (other users, non-commands, other types)', ('event',))
+EVENTS_PROCESSED = metrics.REGISTRY.counter(
+    'selbot_events_processed_total', 'Gateway events handled or queued for a worker stage', ('event',))
+SAVE_SECONDS = metrics.REGISTRY.histogram('selbot_session_save_seconds', 'Time to store one session')
+metrics.REGISTRY.gauge(
+    'selbot_open_sessions', 'Monitored users with an open session',
+    lambda: sum(1 for s in list(sessions.values()) if s.get('start_time') is not None))
+metrics.REGISTRY.gauge('selbot_store_bytes', 'Size of the session history on disk', lambda: store.storage_bytes())
+metrics.REGISTRY.gauge(
+    'selbot_pending_outbound', 'Messages waiting to be sent', lambda: {
+        ('webhooks',): webhooks.pending(),
+        ('notifications',): notification_stage.depth()
+    }, ('queue',))
+metrics.REGISTRY.gauge(
+    'selbot_stage_depth', 'Items queued per worker stage',
+    lambda: {(stage.name,): stage.depth() for stage in PIPELINE}, ('stage',))
+
+@bot.gateway.command
+def handle_events(resp):
+    event_type = resp.raw.get('t') or 'none'
+    EVENTS_SEEN.inc(event=event_type)
+    with EVENT_SECONDS.time(event=event_type):
+        handled = dispatch_event(resp)
+    (EVENTS_PROCESSED if handled else EVENTS_FILTERED).inc(event=event_type)
+
+def dispatch_event(resp):
+    """
+    Route one gateway event; the gateway thread only parses and enqueues
+
+    Returns:
+        bool: False if the event was ignored
+    """
+    if resp.event.message:
+        try:
+            m = resp.parsed.auto()
+            if m['author']['id'] == ADMIN_USER_ID and m['content'].startswith(COMMAND_PREFIX):
+                return command_router.dispatch(m)
+        except Exception as e:
+            log.error(f"Failed to queue command: {str(e)}")
+        return False
+            
+    if resp.event.ready:
+        report = startup.finish()
+        if report:
+            log.info(report)
+        return True
+
+    if resp.event.ready_supplemental:
+        try:
+            resync_presences(resp.raw['d'])
+        except Exception as e:
+            log.error(f"Failed to resync presences: {str(e)}")
+        return True
+            
+    if resp.event.presence_updated:
+        try:
+            data = resp.parsed.auto()
+            user_id = data['user']['id']
+            
+            if user_id not in USERS_TO_MONITOR:
+                return False
+            
+            # Stamp the event now so queueing delay doesn't shift session times
+            event = (user_id, data.get('status', 'offline'), int(time.time()))
+            return presence_stage.submit(event, key=user_id)
+                        
+        except Exception as e:
+            log.error(f"Failed to queue presence: {str(e)}")
+
+    return False
+
+def signal_handler(sig, frame):
+    log.info("Saving sessions before exit...")
+    presence_stage.drain(timeout=5)
+    current_time = int(time.time())
+    
+    for user_id, session_data in sessions.copy().items():
+        if 'start_time' in session_data and session_data['start_time'] is not None:
+            try:
+                username = get_user_info(user_id)
+                start_time = session_data['start_time']
+                
+                if start_time <= current_time:
+                    log.info(f"Saving final session for {username}")
+                    save_session_data(user_id, username, start_time, current_time)
+                # Saved; a restart starts from the presence seen then
+                checkpoint.record(user_id, 'offline', None)
+            except Exception as e:
+                log.error(f"Failed to save final session for {user_id}: {str(e)}")
+    
+    checkpoint.close()
+    store.close()
+    if feed is not None:
+        feed.close()
+    log.info("Sessions saved. Exiting...")
+    botlog.shutdown_logging()
+    webhooks.flush()
+    sys.exit(0)
+
+def main():
+    log.info("Starting bot...")
+    send_webhook("Bot starting...", 'LOGS')
+    
+    signal.signal(signal.SIGINT, signal_handler)
+    seed_profile_cache()
+    restore_open_sessions()
+    checkpoint.start_heartbeat()
+    sampler.start()
+    compactor.start()
+    if METRICS_CONFIG.get('enabled', False):
+        try:
+            metrics.serve(METRICS_CONFIG.get('port', 9464), METRICS_CONFIG.get('host', '127.0.0.1'))
+        except OSError as e:
+            log.error(f"Failed to start metrics endpoint: {str(e)}")
+    
+    if not os.path.exists(PATHS['session_data']):
+        with open(PATHS['session_data'], 'w') as f:
+            json.dump([], f)
+    
+    try:
+        if feed is not None:
+            feed.start()
+        if len(sys.argv) == 1:
+            subprocess.Popen([sys.executable, "dataanalyst.py"])
+        startup.mark('main')
+        
+        bot.gateway.run(auto_reconnect=True)
+    except Exception as e:
+        error_msg = f"Bot crashed: {str(e)}"
+        log.error(error_msg)
+        botlog.shutdown_logging()
+        webhooks.flush()
+
+if __name__ == "__main__":
     main()
\ No newline at end of file
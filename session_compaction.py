@@ -0,0 +1,171 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+log = logging.getLogger(__name__)
+
+
+def _merge(records):
+    """Combine records of one user and day into one record"""
+    merged = dict(records[0])
+    merged['start_time'] = min(r['start_time'] for r in records)
+    merged['end_time'] = max(r['end_time'] for r in records)
+    merged['duration'] = sum(r['duration'] for r in records)
+    merged['username'] = max(records, key=lambda r: r['start_time'])['username']
+    count = sum(r.get('sessions', 1) for r in records)
+    merged.pop('sessions', None)
+    if count > 1:
+        merged['sessions'] = count
+    return merged
+
+
+def compact_sessions(sessions, merge_gap=300, aggregate_before=None):
+    """
+    Merge fragmented sessions and roll old days into daily aggregates
+
+    Within one user and day, sessions that start at most merge_gap seconds
+    after the previous one ended (the pieces left by restarts and /refresh)
+    become one record. Days before aggregate_before (YYYY-MM-DD) become a
+    single record per user. Durations are summed and the merged record's
+    "sessions" field counts what it replaced, so every (user, day) keeps its
+    total duration and session count.
+
+    Returns:
+        list: Compacted sessions ordered by (date, start_time)
+    """
+    groups = {}
+    for session in sessions:
+        groups.setdefault((session['user_id'], session['date']), []).append(session)
+
+    result = []
+    for (user_id, date), records in groups.items():
+        if aggregate_before is not None and date < aggregate_before:
+            result.append(_merge(records) if len(records) > 1 else records[0])
+            continue
+
+        records.sort(key=lambda r: r['start_time'])
+        run = [records[0]]
+        run_end = records[0]['end_time']
+        for record in records[1:]:
+            if record['start_time'] - run_end <= merge_gap:
+                run.append(record)
+                run_end = max(run_end, record['end_time'])
+            else:
+                result.append(_merge(run) if len(run) > 1 else run[0])
+                run = [record]
+                run_end = record['end_time']
+        result.append(_merge(run) if len(run) > 1 else run[0])
+
+    result.sort(key=lambda r: (r['date'], r['start_time']))
+    return result
+
+
+def run_compaction(store, merge_gap=300, aggregate_after_days=90, hot_days=2):
+    """
+    Compact the history of a SessionStore older than hot_days
+
+    Today and yesterday (with the default hot_days) are left alone because
+    open sessions are still saved into them. Safe to run next to selbot's
+    writers: the store only blocks them for the final swap, and gives up if
+    a save touched the affected days meanwhile.
+
+    Returns:
+        dict: records_before, records_after, bytes_reclaimed and seconds, or
+        None if the pass was abandoned
+    """
+    started = time.perf_counter()
+    today = datetime.now().date()
+    before = (today - timedelta(days=max(hot_days, 1) - 1)).strftime('%Y-%m-%d')
+    aggregate_before = None
+    if aggregate_after_days:
+        aggregate_before = (today - timedelta(days=aggregate_after_days)).strftime('%Y-%m-%d')
+
+    size_before = store.storage_bytes()
+    counts = store.compact_history(
+        before, lambda sessions: compact_sessions(sessions, merge_gap, aggregate_before)
+    )
+    if counts is None:
+        return None
+
+    return {
+        'records_before': counts[0],
+        'records_after': counts[1],
+        'bytes_reclaimed': size_before - store.storage_bytes(),
+        'seconds': time.perf_counter() - started
+    }
+
+
+class HistoryCompactor:
+    """
+    Background compaction of the session history
+
+    A daemon thread runs run_compaction every interval_hours and hands the
+    report to on_report, e.g. to post it to the logs webhook.
+    """
+
+    def __init__(self, store, interval_hours=24, merge_gap=300, aggregate_after_days=90, hot_days=2,
+                 on_report=None):
+        self.store = store
+        self.interval = interval_hours * 3600
+        self.merge_gap = merge_gap
+        self.aggregate_after_days = aggregate_after_days
+        self.hot_days = hot_days
+        self.on_report = on_report
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='history-compactor', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                log.error(f"Session history compaction failed: {str(e)}")
+
+    def run_once(self):
+        report = run_compaction(self.store, self.merge_gap, self.aggregate_after_days, self.hot_days)
+        if report is None:
+            log.info("Session history compaction skipped: sessions were saved into the affected days")
+            return None
+        log.info(format_report(report))
+        if self.on_report is not None and report['records_after'] != report['records_before']:
+            self.on_report(report)
+        return report
+
+
+def format_report(report):
+    return (
+        f"Compacted session history: {report['records_before']} -> {report['records_after']} records, "
+        f"{report['bytes_reclaimed'] / 1024:.1f} KB reclaimed in {report['seconds']:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    import session_store
+
+    parser = argparse.ArgumentParser(description="Compact the stored session history")
+    parser.add_argument('--config', default='config.json')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    retention = config.get('retention', {})
+
+    store = session_store.open_store(config['paths']['session_data'], config.get('storage'))
+    try:
+        report = run_compaction(
+            store,
+            merge_gap=retention.get('merge_gap', 300),
+            aggregate_after_days=retention.get('aggregate_after_days', 90),
+            hot_days=retention.get('hot_days', 2)
+        )
+    finally:
+        store.close()
+    print(format_report(report) if report else "Compaction skipped: the history changed during the pass")
@@ -0,0 +1,136 @@
+import csv
+import gzip
+import io
+import json
+import os
+import zlib
+
+FORMATS = ('ndjson', 'csv')
+EXPORT_COLUMNS = ('user_id', 'username', 'start_time', 'end_time', 'duration', 'date', 'sessions')
+
+# Uncompressed bytes written between sync flushes. After a flush the file
+# size is exact, so a part can be closed just below the upload limit.
+FLUSH_EVERY = 64 * 1024
+# gzip trailer plus deflate's worst-case growth on incompressible input
+GZIP_OVERHEAD = 1024
+
+
+class _GzipParts:
+    """Gzip files of at most max_bytes each, opened as rows arrive"""
+
+    def __init__(self, directory, basename, suffix, max_bytes, header=b''):
+        self.directory = directory
+        self.basename = basename
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.header = header
+        # Small limits get more frequent flushes so parts still fill up
+        self.flush_every = min(FLUSH_EVERY, max(1024, max_bytes // 8))
+        self.paths = []
+        self._raw = None
+        self._gz = None
+        self._pending = 0
+        self._rows = 0
+
+    def _open(self):
+        path = os.path.join(self.directory, f"{self.basename}.part{len(self.paths) + 1}{self.suffix}")
+        self.paths.append(path)
+        self._raw = open(path, 'wb')
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode='wb', compresslevel=6)
+        self._pending = 0
+        self._rows = 0
+        if self.header:
+            self._write(self.header)
+
+    def _write(self, data):
+        self._gz.write(data)
+        self._pending += len(data)
+        if self._pending >= self.flush_every:
+            self._gz.flush(zlib.Z_SYNC_FLUSH)
+            self._pending = 0
+
+    def write(self, data):
+        if self._gz is not None:
+            # Unflushed bytes can't compress to more than their own size
+            # plus a little, so this never lets a part exceed max_bytes
+            projected = self._raw.tell() + self._pending + len(data) + GZIP_OVERHEAD
+            if projected > self.max_bytes and self._rows:
+                self._close_part()
+        if self._gz is None:
+            self._open()
+        self._write(data)
+        self._rows += 1
+
+    def _close_part(self):
+        self._gz.close()
+        self._raw.close()
+        self._gz = self._raw = None
+
+    def close(self):
+        if self._gz is not None:
+            self._close_part()
+        if len(self.paths) == 1:
+            # A single part doesn't need the part number
+            single = os.path.join(self.directory, self.basename + self.suffix)
+            os.replace(self.paths[0], single)
+            self.paths = [single]
+        return self.paths
+
+
+def export_sessions(sessions, directory, basename, fmt='ndjson', max_part_bytes=8 * 1024 * 1024):
+    """
+    Write sessions as gzip-compressed NDJSON or CSV, split to fit uploads
+
+    Sessions are consumed one at a time (pass SessionStore.iter_sessions()),
+    so memory use does not grow with the size of the export. Every part is a
+    complete gzip file; CSV parts each start with the header row.
+
+    Args:
+        sessions: Iterable of session dicts
+        directory: Where to write the files
+        basename: File name without extension, e.g. "sessions_2024-01-01_2024-01-31"
+        fmt: 'ndjson' or 'csv'
+        max_part_bytes: Upper bound for each compressed file
+
+    Returns:
+        tuple: (list of file paths, number of sessions exported)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    os.makedirs(directory, exist_ok=True)
+
+    header = b''
+    if fmt == 'csv':
+        line = io.StringIO()
+        writer = csv.writer(line, lineterminator='\n')
+        writer.writerow(EXPORT_COLUMNS)
+        header = line.getvalue().encode('utf-8')
+
+    parts = _GzipParts(directory, basename, f".{fmt}.gz", max_part_bytes, header)
+    count = 0
+    try:
+        for session in sessions:
+            if fmt == 'csv':
+                line.seek(0)
+                line.truncate()
+                # Compacted records stand for several sessions
+                writer.writerow([session.get(column, 1 if column == 'sessions' else None) for column in EXPORT_COLUMNS])
+                data = line.getvalue()
+            else:
+                data = json.dumps(session, ensure_ascii=False) + '\n'
+            parts.write(data.encode('utf-8'))
+            count += 1
+    except BaseException:
+        parts.close()
+        remove_files(parts.paths)
+        raise
+    return parts.close(), count
+
+
+def remove_files(paths):
+    """Delete exported files once they have been uploaded"""
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+SEND_TIMEOUT = 5
+
+
+def feed_address(feed_config, data_dir):
+    """
+    Return where the feed listens: a Unix socket path, or (host, port) on
+    platforms without Unix domain sockets
+    """
+    if hasattr(socket, 'AF_UNIX'):
+        return feed_config.get('socket', os.path.join(data_dir, 'session_feed.sock'))
+    return ('127.0.0.1', feed_config.get('port', DEFAULT_PORT))
+
+
+def _socket_for(address):
+    family = socket.AF_INET if isinstance(address, tuple) else socket.AF_UNIX
+    return socket.socket(family, socket.SOCK_STREAM)
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+class FeedServer:
+    """
+    Streams every save from selbot.py's store to local subscribers
+
+    Subscribe on_save to the SessionStore. A new connection first gets a
+    snapshot line with every daily rollup, then one NDJSON line per save
+    carrying the stored session and that day's new totals. Totals are
+    absolute, so applying them is idempotent and a subscriber never has to
+    reconcile the snapshot with the records that follow it. Sockets are
+    written by one sender thread; a subscriber that doesn't read for
+    SEND_TIMEOUT seconds is dropped and gets a fresh snapshot when it
+    reconnects.
+    """
+
+    def __init__(self, address, daily_totals):
+        self.address = address
+        self._totals = {(row['user_id'], row['date']): dict(row) for row in daily_totals}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._clients = []
+        self._listener = None
+
+    def on_save(self, session, duration_delta, sessions_delta):
+        """SessionStore subscriber; runs under the store lock, so only queues"""
+        key = (session['user_id'], session['date'])
+        with self._lock:
+            row = self._totals.get(key)
+            if row is None:
+                row = self._totals[key] = {
+                    'user_id': session['user_id'],
+                    'date': session['date'],
+                    'total_duration': 0,
+                    'sessions': 0
+                }
+            row['username'] = session['username']
+            row['total_duration'] += duration_delta
+            row['sessions'] += sessions_delta
+            self._queue.put(('send', {
+                'type': 'session',
+                'session': dict(session),
+                'totals': dict(row),
+                'sent': time.time()
+            }))
+
+    def start(self):
+        if self._listener is not None:
+            return
+        if not isinstance(self.address, tuple) and os.path.exists(self.address):
+            # Left behind by a previous run that didn't shut down cleanly
+            os.remove(self.address)
+        self._listener = _socket_for(self.address)
+        if isinstance(self.address, tuple):
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(self.address)
+        self._listener.listen()
+        threading.Thread(target=self._accept, name='feed-accept', daemon=True).start()
+        threading.Thread(target=self._send, name='feed-sender', daemon=True).start()
+        log.info(f"Session feed listening on {self.address}")
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                # Listener closed
+                return
+            conn.settimeout(SEND_TIMEOUT)
+            # The snapshot is taken where the connection enters the queue,
+            # so it covers exactly the saves queued before it
+            with self._lock:
+                rows = [dict(row) for row in self._totals.values()]
+                self._queue.put(('connect', conn, {'type': 'snapshot', 'rows': rows, 'sent': time.time()}))
+
+    def _send(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if item[0] == 'connect':
+                _, conn, snapshot = item
+                if self._write(conn, _encode(snapshot)):
+                    self._clients.append(conn)
+                    log.info(f"Session feed subscriber connected ({len(self._clients)} connected)")
+                continue
+
+            data = _encode(item[1])
+            self._clients = [conn for conn in self._clients if self._write(conn, data)]
+
+    @staticmethod
+    def _write(conn, data):
+        try:
+            conn.sendall(data)
+            return True
+        except OSError as e:
+            log.warning(f"Dropping session feed subscriber: {str(e)}")
+            conn.close()
+            return False
+
+    def close(self):
+        if self._listener is None:
+            return
+        self._listener.close()
+        self._queue.put(None)
+        for conn in self._clients:
+            conn.close()
+        if not isinstance(self.address, tuple) and os.path.exists(self.address):
+            os.remove(self.address)
+
+
+class LiveTotals:
+    """
+    In-memory daily rollups kept current by a FeedClient
+
+    rows() returns the same shape as SessionStore.daily_totals, so readers
+    can switch between the live copy and the store.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def load(self, rows):
+        with self._lock:
+            self._rows = {(row['user_id'], row['date']): row for row in rows}
+
+    def apply(self, record):
+        totals = record['totals']
+        with self._lock:
+            self._rows[(totals['user_id'], totals['date'])] = totals
+
+    def rows(self, since=None, until=None):
+        with self._lock:
+            rows = [
+                dict(row) for row in self._rows.values()
+                if (since is None or row['date'] >= since) and (until is None or row['date'] <= until)
+            ]
+        rows.sort(key=lambda r: r['date'])
+        return rows
+
+
+class FeedClient:
+    """
+    Subscriber side of FeedServer, run by dataanalyst.py
+
+    A daemon thread connects (retrying every retry_interval seconds),
+    reloads totals from the snapshot sent on every (re)connect and applies
+    each record after it. Feed lag is the time between the save and the
+    record being applied here.
+    """
+
+    def __init__(self, address, totals, retry_interval=5):
+        self.address = address
+        self.totals = totals
+        self.retry_interval = retry_interval
+        self.connected = False
+        self._lock = threading.Lock()
+        self._records = 0
+        self._last_lag = None
+        self._max_lag = 0.0
+        self._last_record = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='feed-client', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with _socket_for(self.address) as conn:
+                    conn.connect(self.address)
+                    self._read(conn)
+                reason = "closed by selbot.py"
+            except (OSError, ValueError) as e:
+                reason = str(e)
+            if self.connected:
+                log.warning(f"Session feed disconnected: {reason}")
+                self.connected = False
+            time.sleep(self.retry_interval)
+
+    def _read(self, conn):
+        with conn.makefile('r', encoding='utf-8') as lines:
+            for line in lines:
+                message = json.loads(line)
+                if message['type'] == 'snapshot':
+                    self.totals.load(message['rows'])
+                    self.connected = True
+                    log.info(f"Session feed connected, loaded {len(message['rows'])} daily rows")
+                    continue
+
+                self.totals.apply(message)
+                now = time.time()
+                lag = now - message['sent']
+                with self._lock:
+                    self._records += 1
+                    self._last_lag = lag
+                    self._max_lag = max(self._max_lag, lag)
+                    self._last_record = now
+
+    def last_lag(self):
+        """Seconds between the last save and its record arriving, or None"""
+        with self._lock:
+            return self._last_lag
+
+    def lag_report(self):
+        """
+        Return feed health as text and reset the max lag window
+
+        Returns:
+            str: e.g. "feed lag 2ms (max 15ms over 40 records, last 12s ago)"
+        """
+        if not self.connected:
+            return "feed offline, read from disk"
+        with self._lock:
+            records, last_lag, max_lag, last_record = self._records, self._last_lag, self._max_lag, self._last_record
+            self._records = 0
+            self._max_lag = 0.0
+        if last_lag is None:
+            return "feed connected, no records yet"
+        return (
+            f"feed lag {last_lag * 1000:.0f}ms (max {max_lag * 1000:.0f}ms over {records} records, "
+            f"last {time.time() - last_record:.0f}s ago)"
+        )
@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import shutil
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+TIME_COLUMNS = ('start_time', 'end_time', 'duration')
+# Sessions each row stands for (more than 1 for compacted history)
+COUNT_COLUMN = 'sessions'
+
+
+def snapshot_dir_for(path):
+    """Return the snapshot directory that accompanies a session data file"""
+    return os.path.splitext(path)[0] + '_snapshot'
+
+
+class Snapshot:
+    """
+    Columnar, memory-mapped copy of the session history
+
+    Rows are ordered by (date, start_time). start_time, end_time,
+    duration and sessions are int64 columns, user_index is an int32 column pointing into
+    users, and day_offsets[i]:day_offsets[i + 1] is the row range of days[i].
+    """
+
+    def __init__(self, directory, meta, columns):
+        self.directory = directory
+        self.meta = meta
+        self.users = meta['users']
+        self.usernames = meta['usernames']
+        self.days = meta['days']
+        self.start_time = columns['start_time']
+        self.end_time = columns['end_time']
+        self.duration = columns['duration']
+        self.sessions = columns['sessions']
+        self.user_index = columns['user_index']
+        self.day_offsets = columns['day_offsets']
+
+    def __len__(self):
+        return len(self.start_time)
+
+    def row_range(self, since=None, until=None):
+        """Return the (start, stop) rows covering the inclusive date range"""
+        first = bisect_left(self.days, since) if since is not None else 0
+        last = bisect_right(self.days, until) if until is not None else len(self.days)
+        if first >= last:
+            return 0, 0
+        return int(self.day_offsets[first]), int(self.day_offsets[last])
+
+    def day_index(self, since=None, until=None):
+        """Return the position in days of every row in the range"""
+        first = bisect_left(self.days, since) if since is not None else 0
+        last = bisect_right(self.days, until) if until is not None else len(self.days)
+        counts = np.diff(self.day_offsets[first:last + 1])
+        return np.repeat(np.arange(first, max(first, last), dtype=np.int32), counts)
+
+    def arrays(self, since=None, until=None):
+        """
+        Return the columns for a date range as NumPy views (no copies)
+
+        Returns:
+            dict: Column name -> array
+        """
+        start, stop = self.row_range(since, until)
+        return {
+            'start_time': self.start_time[start:stop],
+            'end_time': self.end_time[start:stop],
+            'duration': self.duration[start:stop],
+            'sessions': self.sessions[start:stop],
+            'user_index': self.user_index[start:stop]
+        }
+
+    def to_dataframe(self, since=None, until=None):
+        """
+        Build a DataFrame in the session schema for a date range
+
+        The timestamp columns wrap the memory-mapped arrays without copying;
+        user_id, username and date are decoded from the dictionaries.
+        """
+        import pandas as pd
+
+        columns = self.arrays(since, until)
+        codes = columns.pop('user_index')
+        df = pd.DataFrame(columns, copy=False)
+        df['user_id'] = pd.Categorical.from_codes(codes, categories=self.users)
+        df['username'] = np.asarray(self.usernames, dtype=object)[codes]
+        days = np.asarray(self.days, dtype='datetime64[D]')
+        df['date'] = days[self.day_index(since, until)]
+        return df
+
+
+def load_snapshot(directory, mmap=True):
+    """
+    Open a snapshot written by update_snapshot
+
+    Returns:
+        Snapshot or None if there is no usable snapshot
+    """
+    meta_path = os.path.join(directory, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != FORMAT_VERSION:
+        return None
+
+    mmap_mode = 'r' if mmap else None
+    columns = {}
+    for name in TIME_COLUMNS + (COUNT_COLUMN, 'user_index', 'day_offsets'):
+        columns[name] = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+    return Snapshot(directory, meta, columns)
+
+
+def _prefix_matches(store, snapshot, last_day, keep):
+    # The rows before the last snapshot day are reused as-is, so check the
+    # store's rollups still agree with them (late or merged sessions for an
+    # older day force a full rebuild)
+    totals = [r for r in store.daily_totals(until=last_day) if r['date'] < last_day]
+    sessions = sum(r['sessions'] for r in totals)
+    duration = sum(r['total_duration'] for r in totals)
+    return (sessions == int(snapshot.sessions[:keep].sum())
+            and duration == int(snapshot.duration[:keep].sum()))
+
+
+def update_snapshot(store, directory):
+    """
+    Bring the snapshot up to date with the primary store
+
+    Only the last snapshot day and anything newer is re-read from the store;
+    older rows are carried over from the existing snapshot.
+
+    Returns:
+        Snapshot: The freshly written snapshot
+    """
+    snapshot = load_snapshot(directory)
+    if snapshot is not None and snapshot.days:
+        last_day = snapshot.days[-1]
+        keep = int(snapshot.day_offsets[-2])
+        if _prefix_matches(store, snapshot, last_day, keep):
+            return _write_snapshot(directory, snapshot, keep, store.query_sessions(since=last_day))
+        log.info(f"Snapshot at {directory} is out of date, rebuilding")
+
+    return _write_snapshot(directory, None, 0, store.query_sessions())
+
+
+def load_history(store, directory, since=None, until=None):
+    """
+    Load raw sessions for a date range through the snapshot
+
+    The snapshot is first brought up to date from the store (only the
+    newest day is re-read), then memory-mapped into a DataFrame.
+
+    Args:
+        store: SessionStore the snapshot is built from
+        directory: Snapshot directory
+        since: Optional first date ('YYYY-MM-DD'), inclusive
+        until: Optional last date ('YYYY-MM-DD'), inclusive
+
+    Returns:
+        DataFrame: One row per stored session with user_id, username, date,
+        start_time, end_time, duration and sessions columns
+    """
+    return update_snapshot(store, directory).to_dataframe(since, until)
+
+
+def _write_snapshot(directory, previous, keep, tail):
+    tail.sort(key=lambda s: (s['date'], s['start_time']))
+
+    if previous is not None:
+        users = list(previous.users)
+        usernames = list(previous.usernames)
+        days = list(previous.days[:-1])
+        offsets = [int(o) for o in previous.day_offsets[:-2]]
+    else:
+        users, usernames, days, offsets = [], [], [], []
+
+    positions = {user_id: i for i, user_id in enumerate(users)}
+    tail_users = np.empty(len(tail), dtype=np.int32)
+    for i, session in enumerate(tail):
+        position = positions.get(session['user_id'])
+        if position is None:
+            position = positions[session['user_id']] = len(users)
+            users.append(session['user_id'])
+            usernames.append(session['username'])
+        else:
+            usernames[position] = session['username']
+        tail_users[i] = position
+
+        if not days or days[-1] != session['date']:
+            days.append(session['date'])
+            offsets.append(keep + i)
+    offsets.append(keep + len(tail))
+
+    columns = {'user_index': tail_users}
+    for name in TIME_COLUMNS:
+        columns[name] = np.fromiter((s[name] for s in tail), dtype=np.int64, count=len(tail))
+    columns[COUNT_COLUMN] = np.fromiter((s.get('sessions', 1) for s in tail), dtype=np.int64, count=len(tail))
+    if previous is not None:
+        for name in columns:
+            columns[name] = np.concatenate([getattr(previous, name)[:keep], columns[name]])
+    columns['day_offsets'] = np.asarray(offsets, dtype=np.int64)
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'rows': int(len(columns['start_time'])),
+        'users': users,
+        'usernames': usernames,
+        'days': days
+    }
+
+    tmp_dir = f"{directory}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), values)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+    # Swap directories; readers that still map the old files keep them open
+    old_dir = f"{directory}.old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, old_dir)
+    os.rename(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+    return load_snapshot(directory)
@@ -0,0 +1,173 @@
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+def _local_midnights(first_time, last_time):
+    """
+    Return (midnights, dates) for every local day from first_time to last_time
+
+    midnights[i] is the unix time at which dates[i] starts, computed with
+    the local timezone (so DST days are 23 or 25 hours long). One extra
+    boundary is appended after the last day.
+    """
+    day = datetime.fromtimestamp(first_time).date()
+    last_day = datetime.fromtimestamp(last_time).date()
+    midnights = []
+    dates = []
+    while day <= last_day + timedelta(days=1):
+        midnights.append(int(datetime(day.year, day.month, day.day).timestamp()))
+        dates.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    return np.array(midnights, dtype=np.int64), np.array(dates)
+
+
+def split_intervals(start_times, end_times):
+    """
+    Split [start, end) intervals at local midnight
+
+    Vectorized over the whole input: the number of pieces per interval comes
+    from a binary search of both ends against the day boundaries, and the
+    pieces are laid out with repeat/cumsum, so there is no Python loop over
+    intervals.
+
+    Args:
+        start_times: Array of unix start times
+        end_times: Array of unix end times (>= start_times)
+
+    Returns:
+        tuple: (rows, starts, ends, dates) with one entry per piece; rows is
+        the index of the interval each piece came from, in input order
+    """
+    start_times = np.asarray(start_times, dtype=np.int64)
+    end_times = np.asarray(end_times, dtype=np.int64)
+    if not len(start_times):
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty, np.array([], dtype=str)
+
+    midnights, dates = _local_midnights(int(start_times.min()), int(end_times.max()))
+
+    # Day d is [midnights[d], midnights[d + 1]); a piece ends at every
+    # boundary strictly inside (start, end)
+    first_day = np.searchsorted(midnights, start_times, side='right') - 1
+    last_day = np.searchsorted(midnights, end_times, side='left') - 1
+    pieces = np.maximum(last_day - first_day, 0) + 1
+
+    rows = np.repeat(np.arange(len(start_times)), pieces)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+    days = first_day[rows] + offsets
+
+    starts = np.where(offsets == 0, start_times[rows], midnights[days])
+    ends = np.where(offsets == pieces[rows] - 1, end_times[rows], midnights[days + 1])
+    return rows, starts, ends, dates[days]
+
+
+def _is_aggregate(session):
+    # A compacted record stands for several sessions: its duration is their
+    # sum and its span includes the gaps between them, so there is no way to
+    # tell how much of it fell on each day. It stays on the day it was
+    # credited to.
+    return session.get('sessions', 1) > 1
+
+
+def split_session(session):
+    """
+    Split one session dict into one dict per local day it covers
+
+    Returns:
+        list: The session itself if it stays within its start day or is a
+        compacted record
+    """
+    if _is_aggregate(session):
+        return [session]
+    rows, starts, ends, dates = split_intervals([session['start_time']], [session['end_time']])
+    if len(rows) <= 1:
+        return [session]
+    return [
+        dict(session, start_time=int(start), end_time=int(end), duration=int(end - start), date=str(date))
+        for start, end, date in zip(starts, ends, dates)
+    ]
+
+
+def split_sessions(sessions):
+    """
+    Bulk pass: split every session in a list at local midnight
+
+    Sessions that stay within one day (and compacted records, which can't
+    be split) are returned as they are; the others are replaced in place by
+    their per-day pieces.
+
+    Returns:
+        tuple: (new list of sessions, number of sessions that were split)
+    """
+    count = len(sessions)
+    start_times = np.fromiter((s['start_time'] for s in sessions), dtype=np.int64, count=count)
+    end_times = np.fromiter((s['end_time'] for s in sessions), dtype=np.int64, count=count)
+    rows, starts, ends, dates = split_intervals(start_times, end_times)
+    if len(rows) == count:
+        return list(sessions), 0
+
+    # Only the rows that produced several pieces need new dicts
+    piece_counts = np.bincount(rows, minlength=count)
+    split_rows = [row for row in np.flatnonzero(piece_counts > 1).tolist() if not _is_aggregate(sessions[row])]
+    if not split_rows:
+        return list(sessions), 0
+    first_piece = np.cumsum(piece_counts) - piece_counts
+    starts = starts.tolist()
+    ends = ends.tolist()
+    dates = dates.tolist()
+
+    result = []
+    previous = 0
+    for row in split_rows:
+        result.extend(sessions[previous:row])
+        session = sessions[row]
+        for piece in range(first_piece[row], first_piece[row] + piece_counts[row]):
+            result.append(dict(
+                session,
+                start_time=starts[piece],
+                end_time=ends[piece],
+                duration=ends[piece] - starts[piece],
+                date=dates[piece]
+            ))
+        previous = row + 1
+    result.extend(sessions[previous:])
+    return result, len(split_rows)
+
+
+def split_store(store):
+    """
+    Split the stored history of a SessionStore at local midnight
+
+    Rewrites the store (and its daily rollups) only if something changed.
+    Run it while selbot.py is stopped: the store must be the only writer.
+
+    Returns:
+        tuple: (number of sessions split, total sessions after the pass)
+    """
+    sessions, split = split_sessions(store.sessions())
+    if split:
+        store.replace_sessions(sessions)
+    return split, len(sessions)
+
+
+if __name__ == "__main__":
+    import session_store
+
+    parser = argparse.ArgumentParser(description="Split stored sessions at local midnight")
+    parser.add_argument('--config', default='config.json')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    started = time.perf_counter()
+    store = session_store.open_store(config['paths']['session_data'], config.get('storage'))
+    try:
+        split, total = split_store(store)
+    finally:
+        store.close()
+    print(f"Split {split} sessions spanning midnight, {total} sessions stored ({time.perf_counter() - started:.2f}s)")
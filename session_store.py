@@ -0,0 +1,1100 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+SESSION_MERGE_THRESHOLD = 60
+# Times compact_history writes the new file outside the store lock before
+# it stops chasing saves and does the last write under it
+COMPACT_WRITE_ATTEMPTS = 3
+
+
+def journal_path_for(path):
+    """Return the journal file that accompanies a session data file"""
+    return os.path.splitext(path)[0] + '.journal'
+
+
+def _live_journal(path):
+    """
+    Return the journal that goes with the JSON file at path, or None
+
+    JournalSessionStore rewrites the JSON file by writing "<path>.tmp",
+    renaming the journal aside to "<journal>.retired", moving the new file
+    into place and then starting an empty journal. The retired journal
+    belongs to the JSON file until the new file has replaced it, i.e. for
+    as long as "<path>.tmp" still exists; after that it must never be
+    replayed, since its positions refer to the old file.
+    """
+    journal_path = journal_path_for(path)
+    retired_path = f"{journal_path}.retired"
+    if os.path.exists(retired_path):
+        return retired_path if os.path.exists(f"{path}.tmp") else None
+    return journal_path
+
+
+def _recover_rewrite(path):
+    """Settle a JSON rewrite that a crash interrupted (see _live_journal)"""
+    journal_path = journal_path_for(path)
+    retired_path = f"{journal_path}.retired"
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(retired_path):
+        if os.path.exists(tmp_path):
+            log.warning(f"Rewrite of {path} was interrupted, keeping the previous file and its journal")
+            os.replace(retired_path, journal_path)
+        else:
+            os.remove(retired_path)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def _read_json_list(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return json.loads(content) if content.strip() else []
+
+
+def _replay_journal(sessions, journal_path):
+    """
+    Apply journal records on top of a loaded session list
+
+    Each record is {"seq": index, "session": {...}} and upserts the session
+    at that position, so replaying a record twice is harmless.
+
+    Returns:
+        int: Number of records applied
+    """
+    if not os.path.exists(journal_path):
+        return 0
+
+    applied = 0
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn last line from a crash mid-append
+                log.error(f"Skipping corrupt journal record in {journal_path}")
+                continue
+
+            seq = record['seq']
+            if seq < len(sessions):
+                sessions[seq] = record['session']
+            else:
+                sessions.append(record['session'])
+            applied += 1
+    return applied
+
+
+def _parse_journal(data):
+    """
+    Parse journal bytes read from some offset
+
+    Returns:
+        tuple: (records, bytes consumed); a trailing line without its newline
+        (still being appended) is left for the next read
+    """
+    end = data.rfind(b'\n') + 1
+    records = []
+    for line in data[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            log.error("Skipping corrupt journal record")
+    return records, end
+
+
+def _repair_journal(journal_path):
+    """
+    Cut a torn last record (a crash mid-append) off the end of a journal
+
+    Without this the next record would be appended onto the torn line, and
+    replay would throw away both.
+    """
+    try:
+        f = open(journal_path, 'r+b')
+    except FileNotFoundError:
+        return
+    with f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline != -1:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            log.warning(f"Dropping a torn {size - end} byte record at the end of {journal_path}")
+            f.truncate(end)
+
+
+def _write_json(path, sessions):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(sessions, f, indent=4)
+
+
+def _index_sessions(sessions):
+    """
+    Build the merge index and the daily rollups of a session list
+
+    Returns:
+        tuple: ({(user_id, date): positions in storage order},
+        {(user_id, date): rollup row})
+    """
+    merge_index, rollups = {}, {}
+    for i, session in enumerate(sessions):
+        merge_index.setdefault((session['user_id'], session['date']), []).append(i)
+        _update_rollup(rollups, session, session['duration'], session.get('sessions', 1))
+    return merge_index, rollups
+
+
+def _update_rollup(rollups, session, duration_delta, sessions_delta):
+    key = (session['user_id'], session['date'])
+    rollup = rollups.get(key)
+    if rollup is None:
+        rollup = rollups[key] = {
+            'user_id': session['user_id'],
+            'username': session['username'],
+            'date': session['date'],
+            'total_duration': 0,
+            'sessions': 0
+        }
+    rollup['username'] = session['username']
+    rollup['total_duration'] += duration_delta
+    rollup['sessions'] += sessions_delta
+
+
+def _reindex(merge_index, rollups, position, previous, session):
+    """Update indexes built by _index_sessions after a save at position"""
+    if previous is None:
+        merge_index.setdefault((session['user_id'], session['date']), []).append(position)
+        _update_rollup(rollups, session, session['duration'], session.get('sessions', 1))
+    else:
+        # Saves only merge into a record, so its user and day stay the same
+        _update_rollup(rollups, session, session['duration'] - previous['duration'],
+                       session.get('sessions', 1) - previous.get('sessions', 1))
+
+
+def _file_signature(path):
+    """Return (inode, size, mtime) of a file, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def load_sessions(path):
+    """
+    Load the full session history, including records still in the journal
+
+    Safe to call from another process while the owning store compacts:
+    the read is retried if the base file is replaced underneath us.
+
+    Args:
+        path: Path to the session data JSON file
+
+    Returns:
+        list: Session dictionaries
+    """
+    for _ in range(5):
+        before = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        sessions = _read_json_list(path)
+        journal_path = _live_journal(path)
+        if journal_path is not None:
+            _replay_journal(sessions, journal_path)
+        after = os.stat(path).st_mtime_ns if os.path.exists(path) else None
+        if before == after:
+            return sessions
+        time.sleep(0.05)
+    return sessions
+
+
+def _merged_duration(record, session):
+    """Duration of a stored record after session is merged into it"""
+    if record.get('sessions', 1) > 1:
+        # A compacted record's duration is the sum of its pieces, not its
+        # span, so the gaps between them must not be counted
+        return record['duration'] + session['duration']
+    return session['end_time'] - record['start_time']
+
+
+def _matches(session, user_id=None, date=None, since=None, until=None):
+    if user_id is not None and session['user_id'] != user_id:
+        return False
+    if date is not None and session['date'] != date:
+        return False
+    if since is not None and session['date'] < since:
+        return False
+    if until is not None and session['date'] > until:
+        return False
+    return True
+
+
+class SessionStore:
+    """
+    Interface shared by the storage backends
+
+    Writers (selbot.py) call save_session; readers (dataanalyst.py, stats
+    commands) open the store with readonly=True and use query_sessions.
+    Dates are 'YYYY-MM-DD' strings and since/until bounds are inclusive.
+    """
+
+    readonly = False
+    _subscribers = ()
+
+    def subscribe(self, callback):
+        """
+        Call callback(session, duration_delta, sessions_delta) after every
+        save, with the stored (possibly merged) session and the change the
+        save made to that day's rollup. Callbacks run under the store lock,
+        in save order, so they must be quick.
+        """
+        self._subscribers = self._subscribers + (callback,)
+
+    def _notify(self, session, duration_delta, sessions_delta):
+        for callback in self._subscribers:
+            callback(session, duration_delta, sessions_delta)
+
+    def save_session(self, session, merge_threshold=SESSION_MERGE_THRESHOLD):
+        raise NotImplementedError
+
+    def query_sessions(self, user_id=None, date=None, since=None, until=None):
+        raise NotImplementedError
+
+    def daily_totals(self, user_id=None, since=None, until=None):
+        """
+        Return the per-day rollups, ordered by date
+
+        Each row is {'user_id', 'username', 'date', 'total_duration',
+        'sessions'}; rollups are updated on every save so readers never
+        have to aggregate raw sessions.
+        """
+        raise NotImplementedError
+
+    def iter_sessions(self, user_id=None, since=None, until=None, batch_size=1000):
+        """
+        Yield copies of the matching sessions in storage order
+
+        Sessions are fetched batch_size at a time, so exporting the whole
+        history never builds a full copy of it; saves can proceed between
+        batches.
+        """
+        yield from self.query_sessions(user_id=user_id, since=since, until=until)
+
+    def sessions(self):
+        """Return a copy of every stored session"""
+        return self.query_sessions()
+
+    def compact_history(self, before, transform):
+        """
+        Replace the sessions dated before `before` with transform(sessions)
+
+        transform gets and returns lists of session dicts and must keep
+        each (user, day)'s total duration and session count (a record may
+        stand for several sessions via a "sessions" field), so the rollups
+        stay valid. Writers keep saving while the transform runs and the
+        new history is written; they are only blocked for the final swap.
+
+        Returns:
+            tuple: (records before, records after), or None if a save
+            touched the affected sessions meanwhile (try again later)
+        """
+        raise NotImplementedError
+
+    def storage_bytes(self):
+        """Return the bytes the history occupies on disk"""
+        raise NotImplementedError
+
+    def replace_sessions(self, sessions):
+        """
+        Replace the whole history and rebuild the rollups
+
+        For offline maintenance passes (e.g. splitting sessions at midnight);
+        the caller must be the only writer. Subscribers are not notified.
+        """
+        raise NotImplementedError
+
+    def latest_usernames(self):
+        """Return {user_id: most recently stored username}"""
+        return {r['user_id']: r['username'] for r in self.daily_totals()}
+
+    def close(self):
+        pass
+
+
+class JsonSessionStore(SessionStore):
+    """
+    Legacy storage mode: the whole history is one JSON array that is
+    rewritten on every save
+    """
+
+    # Whether saves that land while compact_history writes the new file can
+    # be persisted after it instead of making it write the file again
+    APPENDS_SAVES = False
+
+    def __init__(self, path, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.RLock()
+        self._generation = 0
+        self._touched = None
+        self._signature = None
+        self._sessions = [] if readonly else self._load()
+        self._build_indexes()
+        if not readonly:
+            log.debug(f"Loaded {len(self._sessions)} existing sessions")
+
+    def _load(self):
+        return _read_json_list(self.path)
+
+    def _refresh(self):
+        # Another process owns the file; readers reload it only when it has
+        # changed on disk
+        if not self.readonly:
+            return
+        with self._lock:
+            signature = _file_signature(self.path)
+            if signature != self._signature:
+                self._reload(signature)
+
+    def _reload(self, signature):
+        self._sessions = _read_json_list(self.path)
+        # Taken before the read, so a write racing it causes another reload
+        self._signature = signature
+        self._generation += 1
+        self._build_indexes()
+
+    def query_sessions(self, user_id=None, date=None, since=None, until=None):
+        self._refresh()
+        with self._lock:
+            if user_id is not None and date is not None:
+                candidates = (self._sessions[i] for i in self._merge_index.get((user_id, date), ()))
+            else:
+                candidates = self._sessions
+            return [dict(s) for s in candidates if _matches(s, user_id, date, since, until)]
+
+    def iter_sessions(self, user_id=None, since=None, until=None, batch_size=1000):
+        self._refresh()
+        position = 0
+        generation = self._generation
+        while True:
+            # Saves only append or update in place, so a position stays
+            # valid between batches unless the history was compacted
+            with self._lock:
+                if self._generation != generation:
+                    raise RuntimeError("Session history was compacted during the export, try again")
+                batch = self._sessions[position:position + batch_size]
+            if not batch:
+                return
+            position += len(batch)
+            for session in batch:
+                if _matches(session, user_id, None, since, until):
+                    yield dict(session)
+
+    def _build_indexes(self):
+        # (user_id, date) -> positions of that user's sessions on that day,
+        # in storage order, so the newest candidate is last
+        self._merge_index, self._rollups = _index_sessions(self._sessions)
+
+    def _add_to_rollup(self, session, duration_delta, sessions_delta):
+        _update_rollup(self._rollups, session, duration_delta, sessions_delta)
+
+    def daily_totals(self, user_id=None, since=None, until=None):
+        self._refresh()
+        with self._lock:
+            rows = [dict(r) for r in self._rollups.values() if _matches(r, user_id, None, since, until)]
+        rows.sort(key=lambda r: r['date'])
+        return rows
+
+    def _find_merge_target(self, session, merge_threshold):
+        # Same candidates and order as a reverse scan of the whole history,
+        # restricted to the one (user, day) bucket that can match
+        for i in reversed(self._merge_index.get((session['user_id'], session['date']), ())):
+            if abs(session['start_time'] - self._sessions[i]['end_time']) <= merge_threshold:
+                return i
+        return None
+
+    def save_session(self, session, merge_threshold=SESSION_MERGE_THRESHOLD):
+        """
+        Store a finished session, merging it into a previous session of the
+        same user and day when the gap is within merge_threshold seconds
+
+        Returns:
+            tuple: (stored session dict, True if it was merged)
+        """
+        if self.readonly:
+            raise RuntimeError("Session store is opened read-only")
+
+        with self._lock:
+            index = self._find_merge_target(session, merge_threshold)
+            if index is not None:
+                record = self._sessions[index]
+                previous_duration = record['duration']
+                record['duration'] = _merged_duration(record, session)
+                record['end_time'] = session['end_time']
+                duration_delta, sessions_delta = record['duration'] - previous_duration, 0
+                merged = True
+            else:
+                record = dict(session)
+                self._sessions.append(record)
+                index = len(self._sessions) - 1
+                self._merge_index.setdefault((record['user_id'], record['date']), []).append(index)
+                duration_delta, sessions_delta = record['duration'], 1
+                merged = False
+
+            self._add_to_rollup(record, duration_delta, sessions_delta)
+            if self._touched is not None:
+                self._touched.add(index)
+            self._persist(index)
+            self._notify(record, duration_delta, sessions_delta)
+            return dict(record), merged
+
+    def replace_sessions(self, sessions):
+        if self.readonly:
+            raise RuntimeError("Session store is opened read-only")
+
+        with self._lock:
+            self._sessions = [dict(s) for s in sessions]
+            self._generation += 1
+            self._build_indexes()
+            self._write_all()
+
+    def compact_history(self, before, transform):
+        if self.readonly:
+            raise RuntimeError("Session store is opened read-only")
+
+        with self._lock:
+            seen = len(self._sessions)
+            self._touched = set()
+        # Copied outside the lock: if a save changes one of these records
+        # meanwhile, it shows up in _touched and the pass is abandoned
+        cold = [i for i in range(seen) if self._sessions[i]['date'] < before]
+        records = [dict(self._sessions[i]) for i in cold]
+
+        # The expensive parts, the transform and writing the new file, run
+        # while saves go on
+        try:
+            compacted = transform(records)
+            if not self._install_compacted(set(cold), compacted):
+                return None
+        finally:
+            with self._lock:
+                self._touched = None
+        return len(records), len(compacted)
+
+    def _install_compacted(self, cold, compacted):
+        with self._lock:
+            if not self._touched.isdisjoint(cold):
+                return False
+            seen = len(self._sessions)
+            self._touched = set()
+
+        # A record a save changes while it is copied here is in _touched,
+        # so the copy is replaced below
+        keep = [i for i in range(seen) if i not in cold]
+        sessions = compacted + [dict(self._sessions[i]) for i in keep]
+        # Old position -> position in the compacted list
+        positions = {old: new for new, old in enumerate(keep, len(compacted))}
+        merge_index, rollups = _index_sessions(sessions)
+        tmp_path = self._rewrite_path()
+        for attempt in range(COMPACT_WRITE_ATTEMPTS):
+            locked_write = attempt == COMPACT_WRITE_ATTEMPTS - 1
+            if not locked_write:
+                _write_json(tmp_path, sessions)
+
+            with self._lock:
+                touched, self._touched = self._touched, set()
+                if not touched.isdisjoint(cold):
+                    os.remove(tmp_path)
+                    return False
+
+                # Carry over the saves that landed during the write
+                changed = []
+                for i in sorted(touched.union(range(seen, len(self._sessions)))):
+                    session = dict(self._sessions[i])
+                    previous = None
+                    if i in positions:
+                        previous = sessions[positions[i]]
+                        sessions[positions[i]] = session
+                    else:
+                        positions[i] = len(sessions)
+                        sessions.append(session)
+                    _reindex(merge_index, rollups, positions[i], previous, session)
+                    changed.append(positions[i])
+                seen = len(self._sessions)
+                if changed and not self.APPENDS_SAVES and not locked_write:
+                    continue
+
+                if locked_write:
+                    log.info("Saves kept landing during compaction, finishing it under the store lock")
+                    _write_json(tmp_path, sessions)
+                    changed = []
+                self._install(tmp_path)
+                self._sessions = sessions
+                self._merge_index, self._rollups = merge_index, rollups
+                self._generation += 1
+                for position in changed:
+                    self._persist(position)
+                return True
+
+    def _rewrite_path(self):
+        # Saves write their own temporary file under the lock, so a rewrite
+        # prepared outside it needs a different one
+        return f"{self.path}.compact"
+
+    def storage_bytes(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def _persist(self, index):
+        self._write_all()
+
+    def _write_all(self):
+        tmp_path = f"{self.path}.tmp"
+        _write_json(tmp_path, self._sessions)
+        self._install(tmp_path)
+
+    def _install(self, tmp_path):
+        """Move a fully written history file into place"""
+        os.replace(tmp_path, self.path)
+
+class JournalSessionStore(JsonSessionStore):
+    """
+    Append-only storage mode
+
+    New and merged sessions are appended as single-line records to a journal
+    next to the JSON file, so a save costs the same regardless of history
+    size. The journal is replayed on load and folded back into the JSON file
+    by a background compaction once it grows past compact_every records.
+    """
+
+    APPENDS_SAVES = True
+
+    def __init__(self, path, compact_every=1000, readonly=False):
+        self.journal_path = journal_path_for(path)
+        self.compact_every = compact_every
+        self._journal_records = 0
+        # How far a read-only store has applied the journal, and which one
+        self._journal_offset = 0
+        self._journal_inode = None
+        self._compact_lock = threading.Lock()
+        self._compact_thread = None
+        self._journal = None
+        if not readonly:
+            _recover_rewrite(path)
+            _repair_journal(self.journal_path)
+        super().__init__(path, readonly=readonly)
+        if not readonly:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _load(self):
+        sessions = _read_json_list(self.path)
+        self._journal_records = _replay_journal(sessions, self.journal_path)
+        if self._journal_records:
+            log.info(f"Replayed {self._journal_records} journal records")
+        return sessions
+
+    def _refresh(self):
+        # Readers apply only the journal records appended since the last
+        # call; the whole history is read again only after the writer has
+        # rewritten the JSON file (which also starts a new journal)
+        if not self.readonly:
+            return
+        with self._lock:
+            signature = _file_signature(self.path)
+            if signature != self._signature:
+                self._reload(signature)
+                return
+
+            # During a rewrite that is the retired journal, which keeps the
+            # inode the reader has been following
+            journal_path = _live_journal(self.path)
+            if journal_path is None:
+                return
+            try:
+                with open(journal_path, 'rb') as f:
+                    stat = os.fstat(f.fileno())
+                    if stat.st_ino != self._journal_inode or stat.st_size < self._journal_offset:
+                        self._reload(signature)
+                        return
+                    if stat.st_size == self._journal_offset:
+                        return
+                    f.seek(self._journal_offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+
+            # The writer replaces the JSON file before it touches the journal,
+            # so if the file is unchanged the bytes read belong to it
+            if _file_signature(self.path) != signature:
+                self._reload(_file_signature(self.path))
+                return
+            records, consumed = _parse_journal(data)
+            self._journal_offset += consumed
+            for record in records:
+                self._apply_record(record)
+
+    def _reload(self, signature):
+        sessions = _read_json_list(self.path)
+        self._journal_offset = 0
+        self._journal_inode = None
+        records = []
+        journal_path = _live_journal(self.path)
+        try:
+            if journal_path is not None:
+                with open(journal_path, 'rb') as f:
+                    self._journal_inode = os.fstat(f.fileno()).st_ino
+                    records, self._journal_offset = _parse_journal(f.read())
+        except FileNotFoundError:
+            pass
+        for record in records:
+            if record['seq'] < len(sessions):
+                sessions[record['seq']] = record['session']
+            else:
+                sessions.append(record['session'])
+
+        self._sessions = sessions
+        # Taken before the read, so a write racing it causes another reload
+        self._signature = signature
+        self._generation += 1
+        self._build_indexes()
+
+    def _apply_record(self, record):
+        seq, session = record['seq'], record['session']
+        key = (session['user_id'], session['date'])
+        if seq < len(self._sessions):
+            previous = self._sessions[seq]
+            self._sessions[seq] = session
+            if (previous['user_id'], previous['date']) != key:
+                self._build_indexes()
+                return
+            self._add_to_rollup(
+                session, session['duration'] - previous['duration'],
+                session.get('sessions', 1) - previous.get('sessions', 1)
+            )
+        else:
+            self._sessions.append(session)
+            self._merge_index.setdefault(key, []).append(len(self._sessions) - 1)
+            self._add_to_rollup(session, session['duration'], session.get('sessions', 1))
+
+    def _persist(self, index):
+        record = {'seq': index, 'session': self._sessions[index]}
+        self._journal.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        self._journal_records += 1
+
+        if self._journal_records >= self.compact_every:
+            self.compact_in_background()
+
+    def replace_sessions(self, sessions):
+        # Same lock order as compact(), which must not run meanwhile
+        with self._compact_lock:
+            super().replace_sessions(sessions)
+
+    def compact_history(self, before, transform):
+        with self._compact_lock:
+            return super().compact_history(before, transform)
+
+    def storage_bytes(self):
+        journal = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        return super().storage_bytes() + journal
+
+    def _rewrite_path(self):
+        # The name _live_journal looks for; journal saves never write it
+        return f"{self.path}.tmp"
+
+    def _install(self, tmp_path):
+        # The rewritten JSON file holds everything, so the journal restarts.
+        # The old journal is retired before the JSON file is replaced: its
+        # positions belong to the old file, and after compact_history or
+        # replace_sessions they would land on unrelated sessions. The new
+        # journal is a new file, so readers tell it from the one they were
+        # following by its inode.
+        self._journal.close()
+        retired_path = f"{self.journal_path}.retired"
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, retired_path)
+        super()._install(tmp_path)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        if os.path.exists(retired_path):
+            os.remove(retired_path)
+        self._journal_records = 0
+
+    def compact_in_background(self):
+        """Start a compaction thread unless one is already running"""
+        if self._compact_thread is not None and self._compact_thread.is_alive():
+            return
+        self._compact_thread = threading.Thread(target=self.compact, daemon=True)
+        self._compact_thread.start()
+
+    def compact(self):
+        """
+        Fold the journal into the JSON file
+
+        The JSON file is written outside the store lock so writers keep
+        appending meanwhile; records appended during the write are carried
+        over into the fresh journal.
+        """
+        with self._compact_lock:
+            try:
+                start = time.time()
+                with self._lock:
+                    snapshot = [dict(s) for s in self._sessions]
+                    self._journal.flush()
+                    offset = self._journal.tell()
+
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                with self._lock:
+                    os.replace(tmp_path, self.path)
+
+                    self._journal.close()
+                    with open(self.journal_path, 'r', encoding='utf-8') as f:
+                        f.seek(offset)
+                        tail = f.read()
+                    journal_tmp = f"{self.journal_path}.tmp"
+                    with open(journal_tmp, 'w', encoding='utf-8') as f:
+                        f.write(tail)
+                    os.replace(journal_tmp, self.journal_path)
+
+                    self._journal = open(self.journal_path, 'a', encoding='utf-8')
+                    self._journal_records = tail.count('\n')
+
+                log.info(f"Compacted {len(snapshot)} sessions into {self.path} in {time.time() - start:.2f}s")
+            except Exception as e:
+                log.error(f"Failed to compact session journal: {str(e)}")
+
+    def close(self):
+        with self._lock:
+            if self._journal is not None and not self._journal.closed:
+                self._journal.flush()
+                self._journal.close()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    username TEXT,
+    start_time INTEGER NOT NULL,
+    end_time INTEGER NOT NULL,
+    duration INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    sessions INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_date ON sessions (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_sessions_start_time ON sessions (start_time);
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    username TEXT,
+    total_duration INTEGER NOT NULL DEFAULT 0,
+    sessions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_rollups_date ON daily_rollups (date);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+SESSION_COLUMNS = ('user_id', 'username', 'start_time', 'end_time', 'duration', 'date', 'sessions')
+INSERT_SESSION = (
+    "INSERT INTO sessions (user_id, username, start_time, end_time, duration, date, sessions) "
+    "VALUES (:user_id, :username, :start_time, :end_time, :duration, :date, :sessions)"
+)
+UPDATE_SESSION = (
+    "UPDATE sessions SET user_id = :user_id, username = :username, start_time = :start_time, "
+    "end_time = :end_time, duration = :duration, date = :date, sessions = :sessions WHERE id = :id"
+)
+
+
+def _session_row(session):
+    return dict(session, sessions=session.get('sessions', 1))
+
+
+def _row_session(row):
+    # Plain sessions keep the schema without the "sessions" field
+    session = dict(row)
+    if session.get('sessions') == 1:
+        del session['sessions']
+    return session
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    SQLite storage in WAL mode
+
+    One writer (selbot.py) and any number of readers (dataanalyst.py) can
+    use the database at the same time. On first open the writer imports the
+    existing JSON history (including its journal) once.
+    """
+
+    def __init__(self, database, json_path=None, readonly=False):
+        self.database = database
+        self.readonly = readonly
+        self._lock = threading.RLock()
+
+        db_dir = os.path.dirname(database)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(database, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = [row['name'] for row in self._conn.execute("PRAGMA table_info(sessions)")]
+        if 'sessions' not in columns:
+            # Databases created before compaction could aggregate sessions
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN sessions INTEGER NOT NULL DEFAULT 1")
+
+        if not readonly:
+            if json_path:
+                self._migrate_from_json(json_path)
+            self._build_rollups()
+
+    def _migrate_from_json(self, json_path):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+            if row is not None:
+                return
+
+            sessions = load_sessions(json_path)
+            self._conn.executemany(INSERT_SESSION, map(_session_row, sessions))
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                (json_path,)
+            )
+        if sessions:
+            log.info(f"Migrated {len(sessions)} sessions from {json_path} to {self.database}")
+
+    def _build_rollups(self):
+        # Databases created before the rollup table existed get it filled once
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'rollups_built'").fetchone()
+            if row is not None:
+                return
+            self._fill_rollups()
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('rollups_built', '1')")
+
+    def _fill_rollups(self):
+        self._conn.execute("DELETE FROM daily_rollups")
+        self._conn.execute(
+            "INSERT INTO daily_rollups (user_id, date, username, total_duration, sessions) "
+            "SELECT user_id, date, "
+            "(SELECT username FROM sessions s2 WHERE s2.user_id = s.user_id AND s2.date = s.date "
+            "ORDER BY s2.id DESC LIMIT 1), "
+            "SUM(duration), SUM(sessions) FROM sessions s GROUP BY user_id, date"
+        )
+
+    def _add_to_rollup(self, session, duration_delta, sessions_delta):
+        self._conn.execute(
+            "INSERT INTO daily_rollups (user_id, date, username, total_duration, sessions) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (user_id, date) DO UPDATE SET "
+            "username = excluded.username, "
+            "total_duration = total_duration + excluded.total_duration, "
+            "sessions = sessions + excluded.sessions",
+            (session['user_id'], session['date'], session['username'], duration_delta, sessions_delta)
+        )
+
+    def daily_totals(self, user_id=None, since=None, until=None):
+        clauses = []
+        params = []
+        for column, op, value in (('user_id', '=', user_id), ('date', '>=', since), ('date', '<=', until)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+
+        sql = "SELECT user_id, username, date, total_duration, sessions FROM daily_rollups"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY date, user_id"
+
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    @staticmethod
+    def _session_filter(user_id=None, date=None, since=None, until=None):
+        clauses = []
+        params = []
+        for column, op, value in (('user_id', '=', user_id), ('date', '=', date),
+                                  ('date', '>=', since), ('date', '<=', until)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        return clauses, params
+
+    def query_sessions(self, user_id=None, date=None, since=None, until=None):
+        clauses, params = self._session_filter(user_id, date, since, until)
+
+        sql = f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id"
+
+        with self._lock:
+            return [_row_session(row) for row in self._conn.execute(sql, params)]
+
+    def iter_sessions(self, user_id=None, since=None, until=None, batch_size=1000):
+        clauses, params = self._session_filter(user_id, None, since, until)
+        # Keyset pagination on id: each batch is a short query, so memory
+        # stays flat however large the export is
+        sql = f"SELECT id, {', '.join(SESSION_COLUMNS)} FROM sessions WHERE " + " AND ".join(["id > ?"] + clauses)
+        sql += " ORDER BY id LIMIT ?"
+
+        # A connection of its own, in one read transaction: the export sees a
+        # single snapshot (WAL keeps it while the writer goes on), so a merge
+        # or compaction running meanwhile can't make it emit a row twice or
+        # skip one, and the shared connection's lock is never held
+        conn = sqlite3.connect(self.database, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN")
+            last_id = 0
+            while True:
+                rows = conn.execute(sql, [last_id] + params + [batch_size]).fetchall()
+                if not rows:
+                    return
+                last_id = rows[-1]['id']
+                for row in rows:
+                    session = _row_session(row)
+                    del session['id']
+                    yield session
+        finally:
+            conn.close()
+
+    def save_session(self, session, merge_threshold=SESSION_MERGE_THRESHOLD):
+        if self.readonly:
+            raise RuntimeError("Session store is opened read-only")
+
+        with self._lock:
+            with self._conn:
+                candidates = self._conn.execute(
+                    "SELECT id, start_time, end_time, duration, sessions FROM sessions "
+                    "WHERE user_id = ? AND date = ? ORDER BY id DESC",
+                    (session['user_id'], session['date'])
+                )
+                for row in candidates:
+                    if abs(session['start_time'] - row['end_time']) <= merge_threshold:
+                        duration = _merged_duration(dict(row), session)
+                        self._conn.execute(
+                            "UPDATE sessions SET end_time = ?, duration = ? WHERE id = ?",
+                            (session['end_time'], duration, row['id'])
+                        )
+                        duration_delta, sessions_delta = duration - row['duration'], 0
+                        self._add_to_rollup(session, duration_delta, sessions_delta)
+                        record = _row_session(self._conn.execute(
+                            f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions WHERE id = ?",
+                            (row['id'],)
+                        ).fetchone())
+                        merged = True
+                        break
+                else:
+                    self._conn.execute(INSERT_SESSION, _session_row(session))
+                    duration_delta, sessions_delta = session['duration'], 1
+                    self._add_to_rollup(session, duration_delta, sessions_delta)
+                    record = dict(session)
+                    merged = False
+
+            # Only once the write is committed, with the stored row like the
+            # other stores pass
+            self._notify(record, duration_delta, sessions_delta)
+            return dict(record), merged
+
+    def replace_sessions(self, sessions):
+        if self.readonly:
+            raise RuntimeError("Session store is opened read-only")
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions")
+            self._conn.executemany(INSERT_SESSION, map(_session_row, sessions))
+            self._fill_rollups()
+
+    def compact_history(self, before, transform):
+        if self.readonly:
+            raise RuntimeError("Session store is opened read-only")
+
+        with self._lock:
+            dates = [row['date'] for row in self._conn.execute(
+                "SELECT DISTINCT date FROM sessions WHERE date < ? ORDER BY date", (before,))]
+
+        # One short transaction per day, so saves interleave with the job
+        records_before = records_after = 0
+        for date in dates:
+            with self._lock, self._conn:
+                rows = self._conn.execute(
+                    f"SELECT id, {', '.join(SESSION_COLUMNS)} FROM sessions WHERE date = ? ORDER BY id", (date,)
+                ).fetchall()
+                ids = [row['id'] for row in rows]
+                records = [_row_session(row) for row in rows]
+                for record in records:
+                    del record['id']
+                compacted = transform(records)
+                records_before += len(records)
+                records_after += len(compacted)
+                if len(compacted) == len(records):
+                    continue
+                # The day's first rows are rewritten in place and the rest
+                # deleted, so surviving records keep their ids and position
+                self._conn.executemany(UPDATE_SESSION, [
+                    dict(_session_row(record), id=row_id) for row_id, record in zip(ids, compacted)
+                ])
+                self._conn.executemany("DELETE FROM sessions WHERE id = ?", [(row_id,) for row_id in ids[len(compacted):]])
+                self._conn.executemany(INSERT_SESSION, map(_session_row, compacted[len(ids):]))
+        return records_before, records_after
+
+    def storage_bytes(self):
+        # Pages in use; freed pages are reused by later inserts (VACUUM
+        # would shrink the file but blocks every other connection)
+        with self._lock:
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+            pages = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            free = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_store(path, storage_config=None, readonly=False):
+    """
+    Create the session store selected in the "storage" config section
+
+    Args:
+        path: Path to the session data JSON file
+        storage_config: Optional dict with "mode" ("journal", "json" or
+            "sqlite"), "compact_every" and "database"
+        readonly: Open for a reading process such as dataanalyst.py
+    """
+    storage_config = storage_config or {}
+    mode = storage_config.get('mode', 'journal')
+
+    if mode == 'json':
+        return JsonSessionStore(path, readonly=readonly)
+    if mode == 'journal':
+        return JournalSessionStore(path, compact_every=storage_config.get('compact_every', 1000), readonly=readonly)
+    if mode == 'sqlite':
+        database = storage_config.get('database', os.path.splitext(path)[0] + '.db')
+        return SqliteSessionStore(database, json_path=path, readonly=readonly)
+    raise ValueError(f"Unknown storage mode: {mode}")
@@ -0,0 +1,108 @@
+import io
+import threading
+import time
+from datetime import datetime
+
+import metrics
+
+WIDTH = 800
+HEIGHT = 400
+PADDING = 20
+BACKGROUND_COLOR = (44, 47, 51)
+TEXT_COLOR = (255, 255, 255)
+TITLE = "System Usage Statistics"
+
+RENDER_SECONDS = metrics.REGISTRY.histogram(
+    'stats_image_render_seconds', 'Stats card draw and encode time (cache misses only)')
+
+
+class StatsImageRenderer:
+    """
+    Renders the system usage card
+
+    Fonts are loaded once and the background with the title is composed
+    once; each render copies that base layer and only draws the changing
+    text. A result is reused for max_age seconds, so repeated requests skip
+    drawing and encoding entirely. Pillow is imported and the base layer
+    built on the first render, not at startup.
+
+    Args:
+        font_path: TrueType font, falls back to Pillow's default font
+        image_format: 'PNG' or 'WEBP'
+        compress_level: PNG zlib level (1 is fast, Pillow's default is 6)
+        webp_quality: Lossy WebP quality, gives the smallest uploads
+        max_age: Seconds a rendered image is served from cache
+    """
+
+    def __init__(self, font_path, image_format='PNG', compress_level=1, webp_quality=80, max_age=5.0):
+        self.image_format = image_format.upper()
+        self.compress_level = compress_level
+        self.webp_quality = webp_quality
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._cached = None
+        self._cached_at = 0.0
+        self.font_path = font_path
+        self._base = None
+
+    def _prepare(self):
+        from PIL import Image, ImageDraw, ImageFont
+
+        try:
+            self.title_font = ImageFont.truetype(self.font_path, 36)
+            self.main_font = ImageFont.truetype(self.font_path, 24)
+        except Exception:
+            self.title_font = ImageFont.load_default()
+            self.main_font = ImageFont.load_default()
+
+        self._base = Image.new('RGB', (WIDTH, HEIGHT), BACKGROUND_COLOR)
+        ImageDraw.Draw(self._base).text((WIDTH / 2, 30), TITLE, font=self.title_font, fill=TEXT_COLOR, anchor="mm")
+
+    def render(self, sample):
+        """
+        Return the encoded image for a sysmetrics sample
+
+        Returns:
+            bytes: Encoded image in image_format
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._cached is not None and now - self._cached_at < self.max_age:
+                return self._cached
+
+            from PIL import ImageDraw
+
+            start = time.perf_counter()
+            if self._base is None:
+                self._prepare()
+            image = self._base.copy()
+            draw = ImageDraw.Draw(image)
+
+            stats_text = [
+                f"CPU Usage: {sample['cpu_percent']}% | Cores: {sample['cpu_count']}",
+                f"Memory: {sample['memory_used']:.1f}GB / {sample['memory_total']:.1f}GB ({sample['memory_percent']}%)",
+                f"Disk: {sample['disk_used']:.1f}GB / {sample['disk_total']:.1f}GB ({sample['disk_percent']}%)",
+                f"OS: {sample['os']}",
+                f"Uptime: {sample['uptime']}"
+            ]
+
+            y_position = 100
+            for text in stats_text:
+                draw.text((PADDING, y_position), text, font=self.main_font, fill=TEXT_COLOR)
+                y_position += 50
+
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            draw.text((WIDTH - PADDING, HEIGHT - PADDING), timestamp, font=self.main_font, fill=TEXT_COLOR, anchor="rb")
+
+            self._cached = self._encode(image)
+            self._cached_at = now
+            RENDER_SECONDS.observe(time.perf_counter() - start)
+            return self._cached
+
+    def _encode(self, image):
+        buf = io.BytesIO()
+        if self.image_format == 'WEBP':
+            image.save(buf, format='WEBP', quality=self.webp_quality, method=0)
+        else:
+            image.save(buf, format='PNG', compress_level=self.compress_level)
+        return buf.getvalue()
@@ -0,0 +1,100 @@
+import logging
+import platform
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+
+class SystemSampler:
+    """
+    Background sampler of CPU, memory, disk and uptime
+
+    A daemon thread takes one sample every interval seconds into a ring
+    buffer of the last history samples. CPU usage is the average since the
+    previous sample, so readers never have to block on
+    psutil.cpu_percent(interval=1).
+    """
+
+    def __init__(self, interval=5, history=720):
+        self.interval = interval
+        self._samples = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='system-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        # psutil is imported here, off the startup path; priming the CPU
+        # counter makes the first real sample cover an interval
+        import psutil
+        psutil.cpu_percent(interval=None)
+        time.sleep(self.interval)
+        while True:
+            try:
+                sample = self._sample()
+                with self._lock:
+                    self._samples.append(sample)
+            except Exception as e:
+                log.error(f"Failed to sample system metrics: {str(e)}")
+            time.sleep(self.interval)
+
+    @staticmethod
+    def _sample():
+        import psutil
+
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        boot_time = datetime.fromtimestamp(psutil.boot_time())
+        return {
+            'timestamp': time.time(),
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'cpu_count': psutil.cpu_count(),
+            'memory_total': memory.total / (1024 ** 3),
+            'memory_used': memory.used / (1024 ** 3),
+            'memory_percent': memory.percent,
+            'disk_total': disk.total / (1024 ** 3),
+            'disk_used': disk.used / (1024 ** 3),
+            'disk_percent': disk.percent,
+            'uptime': str(datetime.now() - boot_time).split('.')[0],
+            'os': f"{platform.system()} {platform.release()}"
+        }
+
+    def latest(self):
+        """Return the newest sample, sampling once if the buffer is empty"""
+        with self._lock:
+            if self._samples:
+                return self._samples[-1]
+        sample = self._sample()
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    def history(self, minutes):
+        """Return the samples taken in the last N minutes, oldest first"""
+        cutoff = time.time() - minutes * 60
+        with self._lock:
+            return [s for s in self._samples if s['timestamp'] >= cutoff]
+
+    def summary(self, minutes):
+        """
+        Return averages and peaks over the last N minutes
+
+        Returns:
+            dict or None if no samples cover the window
+        """
+        samples = self.history(minutes)
+        if not samples:
+            return None
+
+        summary = {'samples': len(samples)}
+        for key in ('cpu_percent', 'memory_percent', 'disk_percent'):
+            values = [s[key] for s in samples]
+            summary[f'{key}_avg'] = sum(values) / len(values)
+            summary[f'{key}_peak'] = max(values)
+        return summary
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import cache
+from cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def counting_loader(values, gate=None):
+    calls = []
+
+    def loader(key):
+        calls.append(key)
+        if gate is not None:
+            gate.wait(timeout=5)
+        value = values.get(key)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return loader, calls
+
+
+def test_concurrent_misses_share_one_load():
+    gate = threading.Event()
+    loader, calls = counting_loader({'1': 'alice'}, gate)
+    profiles = TTLCache(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(profiles.get('1'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    # Let every thread reach the in-flight load before it finishes
+    while profiles.misses < len(threads):
+        time.sleep(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert results == ['alice'] * 8
+    assert calls == ['1']
+    assert profiles.get('1') == 'alice'
+    assert profiles.stats() == {'size': 1, 'hits': 1, 'misses': 8, 'failures': 0}
+
+
+def test_concurrent_failures_share_one_load():
+    gate = threading.Event()
+    loader, calls = counting_loader({'1': RuntimeError('rate limited')}, gate)
+    profiles = TTLCache(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(profiles.get('1'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while profiles.misses < len(threads):
+        time.sleep(0.01)
+    gate.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert results == [None] * 4
+    assert calls == ['1']
+    assert profiles.stats()['failures'] == 1
+
+
+def test_failures_are_cached_until_negative_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    values = {'1': RuntimeError('rate limited'), '2': None}
+    loader, calls = counting_loader(values)
+    profiles = TTLCache(loader, ttl=3600, negative_ttl=60)
+
+    # An exception and a None result are both cached as a miss
+    assert profiles.get('1') is None
+    assert profiles.get('2') is None
+    clock.now += 59
+    assert profiles.get('1') is None
+    assert profiles.get('2') is None
+    assert calls == ['1', '2']
+
+    # Retried once negative_ttl has passed
+    values['1'] = 'alice'
+    clock.now += 2
+    assert profiles.get('1') == 'alice'
+    assert calls == ['1', '2', '1']
+    assert profiles.stats()['failures'] == 2
+
+
+def test_values_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    values = {'1': 'alice'}
+    loader, calls = counting_loader(values)
+    profiles = TTLCache(loader, ttl=3600)
+
+    assert profiles.get('1') == 'alice'
+    clock.now += 3599
+    values['1'] = 'alice2'
+    assert profiles.get('1') == 'alice'
+    clock.now += 2
+    assert profiles.get('1') == 'alice2'
+    assert calls == ['1', '1']
+
+
+def test_least_recently_used_entries_are_evicted():
+    loader, calls = counting_loader({'1': 'a', '2': 'b', '3': 'c'})
+    profiles = TTLCache(loader, max_size=2)
+    profiles.get('1')
+    profiles.get('2')
+    profiles.get('1')
+    profiles.get('3')
+
+    assert profiles.stats()['size'] == 2
+    assert profiles.get('1') == 'a'
+    assert profiles.get('2') == 'b'
+    assert calls == ['1', '2', '3', '2']
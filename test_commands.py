@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from commands import CommandRouter
+
+
+def message(content, channel_id='10'):
+    return {'content': content, 'channel_id': channel_id, 'author': {'username': 'alice'}}
+
+
+@pytest.fixture
+def router():
+    sent = []
+    router = CommandRouter('!', lambda channel_id, text: sent.append((channel_id, text)), max_workers=4)
+    router.sent = sent
+    yield router
+    router._pool.shutdown(wait=True)
+    router._replies.shutdown(wait=True)
+
+
+def settle(router):
+    """Wait for the running commands and then the replies they queued"""
+    router._pool.shutdown(wait=True)
+    router._replies.shutdown(wait=True)
+    return router.sent
+
+
+def test_dispatch_runs_the_handler_with_its_arguments(router):
+    seen = []
+
+    @router.command('stats', ack='working on it')
+    def stats(ctx):
+        seen.append((ctx.name, ctx.args, ctx.channel_id, ctx.author))
+        return 'done'
+
+    assert router.dispatch(message('!STATS 7d alice'))
+    assert settle(router) == [('10', 'working on it'), ('10', 'done')]
+    assert seen == [('stats', ['7d', 'alice'], '10', 'alice')]
+
+
+def test_other_messages_are_not_dispatched(router):
+    router.register('stats', lambda ctx: 'done')
+
+    assert not router.dispatch(message('!unknown'))
+    assert not router.dispatch(message('stats'))
+    assert not router.dispatch(message('!'))
+    assert settle(router) == []
+
+
+def test_busy_command_is_turned_down_until_a_slot_frees(router):
+    gate = threading.Event()
+    started = threading.Event()
+
+    def slow(ctx):
+        started.set()
+        gate.wait(timeout=5)
+        return ctx.args[0]
+
+    router.register('slow', slow, max_concurrent=1, timeout=0)
+    assert router.dispatch(message('!slow first'))
+    assert started.wait(timeout=5)
+    assert not router.dispatch(message('!slow second'))
+    assert router.stats() == {'slow': 1}
+
+    gate.set()
+    while router.stats()['slow']:
+        time.sleep(0.01)
+    assert router.dispatch(message('!slow third'))
+
+    sent = [text for _, text in settle(router)]
+    assert sent[0].startswith('⏳ !slow is already running')
+    assert sorted(sent[1:]) == ['first', 'third']
+
+
+def test_concurrent_runs_are_limited_to_max_concurrent(router):
+    gate = threading.Event()
+
+    def chart(ctx):
+        gate.wait(timeout=5)
+
+    router.register('chart', chart, max_concurrent=2, timeout=0)
+
+    accepted = [router.dispatch(message('!chart')) for _ in range(4)]
+    assert accepted == [True, True, False, False]
+    gate.set()
+    settle(router)
+    assert router.stats() == {'chart': 0}
+
+
+def test_failing_handler_releases_its_slot(router):
+    calls = []
+
+    def broken(ctx):
+        calls.append(ctx.args)
+        raise RuntimeError('database is locked')
+
+    router.register('broken', broken, max_concurrent=1, timeout=0)
+    assert router.dispatch(message('!broken'))
+    while not calls or router.stats()['broken']:
+        time.sleep(0.01)
+    assert router.dispatch(message('!broken again'))
+
+    assert settle(router) == [('10', '❌ !broken failed: database is locked')] * 2
+    assert router.stats() == {'broken': 0}
+
+
+def test_invalid_arguments_are_answered_with_usage(router):
+    def chart(ctx):
+        raise ValueError('Unknown period')
+
+    router.register('chart', chart, usage='[7d|30d]', timeout=0)
+    assert router.dispatch(message('!chart 1y'))
+    assert settle(router) == [('10', '❌ Unknown period\nUsage: !chart [7d|30d]')]
+    assert router.stats() == {'chart': 0}
+
+
+def test_failing_ack_releases_its_slot(router):
+    def ack(ctx):
+        raise KeyError('missing')
+
+    router.register('stats', lambda ctx: 'done', ack=ack, timeout=0)
+    with pytest.raises(KeyError):
+        router.dispatch(message('!stats'))
+    assert router.stats() == {'stats': 0}
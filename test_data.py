@@ -1,68 +1,176 @@
-import json
-import random
-from datetime import datetime, timedelta
-
-def generate_test_data():
-    """
-    Generate realistic test data for session tracking
-    
-    Creates 30 days of session data for test users with realistic patterns:
-    - More activity during normal waking hours
-    - Random inactive days
-    - Variable session lengths
-    """
-    users = [
-        {"id": "123456789", "name": "John_Doe"},
-        {"id": "987654321", "name": "Alice_Smith"},
-        {"id": "456789123", "name": "Bob_Wilson"}
-    ]
-    
-    data = []
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
-    
-    current_date = start_date
-    while current_date <= end_date:
-        # Generate daily sessions for each user
-        for user in users:
-            # 10% chance user is inactive that day
-            if random.random() < 0.1:
-                continue
-                
-            num_sessions = random.randint(5, 15)
-            
-            for _ in range(num_sessions):
-                # Realistic hour distribution (more activity 8AM-11PM)
-                hour = random.choices(
-                    range(24),
-                    weights=[1,1,1,1,1,1,3,5,8,10,10,8,8,10,10,8,8,10,10,8,5,3,2,1]
-                )[0]
-                minute = random.randint(0, 59)
-                
-                # Create session start time
-                start_time = current_date.replace(hour=hour, minute=minute)
-                
-                # Random session duration (15 mins to 4 hours)
-                duration = random.randint(15, 240) * 60  # in seconds
-                end_time = start_time + timedelta(seconds=duration)
-                
-                session = {
-                    "user_id": user["id"],
-                    "username": user["name"],
-                    "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "end_time": end_time.strftime("%Y-%m-%d %H:%M:%S"),
-                    "duration": duration,
-                    "date": start_time.strftime("%Y-%m-%d")
-                }
-                data.append(session)
-        
-        current_date += timedelta(days=1)
-    
-    # Save generated data
-    with open('session_data.json', 'w') as f:
-        json.dump(data, f, indent=2)
-    
-    print(f"Generated {len(data)} sessions for {len(users)} users over 30 days")
-
-if __name__ == "__main__":
-    generate_test_data()
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+import session_split
+import session_store
+
+# First users keep the names the sample data has always used
+BASE_USERS = [
+    {"id": "123456789", "name": "John_Doe"},
+    {"id": "987654321", "name": "Alice_Smith"},
+    {"id": "456789123", "name": "Bob_Wilson"}
+]
+
+# Realistic hour distribution (more activity 8AM-11PM)
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 1, 3, 5, 8, 10, 10, 8, 8, 10, 10, 8, 8, 10, 10, 8, 5, 3, 2, 1]
+BACKENDS = ('json', 'journal', 'sqlite')
+
+
+def make_users(count):
+    """Return count test users, starting with BASE_USERS"""
+    users = BASE_USERS[:count]
+    for i in range(len(users), count):
+        users.append({"id": str(100000000 + i), "name": f"Test_User_{i}"})
+    return users
+
+
+def generate_sessions(days=30, users=3, sessions_per_day=(5, 15), inactive_rate=0.1, seed=0, end_date=None):
+    """
+    Generate sessions in the schema selbot.py writes
+
+    Yields one dict per session with int start_time/end_time, duration in
+    seconds and its date, in start_time order within each day. Sessions
+    that run past midnight are split into one record per day, like
+    selbot.py saves them. The same arguments and seed always produce the
+    same data.
+
+    Args:
+        days: Number of days, ending with end_date
+        users: Number of users (see make_users)
+        sessions_per_day: (min, max) sessions per active user per day
+        inactive_rate: Chance a user has no sessions on a given day
+        seed: Random seed
+        end_date: Last day (date or datetime), defaults to yesterday so no
+            session lies in the future
+    """
+    rng = random.Random(seed)
+    user_list = make_users(users)
+    hours = range(24)
+    cum_weights = []
+    total = 0
+    for weight in HOUR_WEIGHTS:
+        total += weight
+        cum_weights.append(total)
+
+    if end_date is None:
+        end_date = datetime.now() - timedelta(days=1)
+    last_day = datetime(end_date.year, end_date.month, end_date.day)
+
+    carried = []
+    for day in range(days - 1, -1, -1):
+        current_date = last_day - timedelta(days=day)
+        date = current_date.strftime('%Y-%m-%d')
+        day_start = int(current_date.timestamp())
+
+        # Pieces of yesterday's sessions that ran past midnight
+        day_sessions, carried = carried, []
+        generated = []
+        for user in user_list:
+            if rng.random() < inactive_rate:
+                continue
+
+            for _ in range(rng.randint(*sessions_per_day)):
+                hour = rng.choices(hours, cum_weights=cum_weights)[0]
+                start_time = day_start + hour * 3600 + rng.randint(0, 59) * 60
+
+                # Random session duration (15 mins to 4 hours)
+                duration = rng.randint(15, 240) * 60
+                generated.append((user, start_time, start_time + duration))
+
+        rows, starts, ends, dates = session_split.split_intervals(
+            [start for _, start, _ in generated], [end for _, _, end in generated])
+        for row, start, end, piece_date in zip(rows.tolist(), starts.tolist(), ends.tolist(), dates.tolist()):
+            user = generated[row][0]
+            (day_sessions if piece_date == date else carried).append({
+                'user_id': user['id'],
+                'username': user['name'],
+                'start_time': start,
+                'end_time': end,
+                'duration': end - start,
+                'date': piece_date
+            })
+
+        day_sessions.sort(key=lambda s: s['start_time'])
+        yield from day_sessions
+
+    carried.sort(key=lambda s: s['start_time'])
+    yield from carried
+
+
+def write_sessions(sessions, path, backend='json', database=None):
+    """
+    Write generated sessions where the given storage backend reads them
+
+    json and journal both start from the JSON file at path (a journal store
+    treats it as its compacted base). sqlite additionally imports the file
+    into the database the way a first start in sqlite mode does.
+
+    Returns:
+        int: Number of sessions written
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    for stale in (session_store.journal_path_for(path), database or os.path.splitext(path)[0] + '.db'):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    # Streamed so large data sets never exist as one list in memory
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for session in sessions:
+            f.write(',\n' if count else '\n')
+            f.write(json.dumps(session))
+            count += 1
+        f.write('\n]')
+
+    if backend == 'sqlite':
+        storage_config = {'mode': 'sqlite'}
+        if database:
+            storage_config['database'] = database
+        session_store.open_store(path, storage_config).close()
+    return count
+
+
+def generate_test_data(path='session_data.json', backend='json', **options):
+    """
+    Generate realistic test data for session tracking
+
+    Defaults to 30 days of sessions for 3 test users with realistic patterns:
+    - More activity during normal waking hours
+    - Random inactive days
+    - Variable session lengths
+    """
+    count = write_sessions(generate_sessions(**options), path, backend)
+    print(f"Generated {count} sessions for {options.get('users', 3)} users over {options.get('days', 30)} days")
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate session test data")
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--users', type=int, default=3)
+    parser.add_argument('--min-sessions', type=int, default=5, help="Sessions per active user per day (min)")
+    parser.add_argument('--max-sessions', type=int, default=15, help="Sessions per active user per day (max)")
+    parser.add_argument('--inactive-rate', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=BACKENDS, default='json')
+    parser.add_argument('--output', default='session_data.json')
+    args = parser.parse_args()
+
+    generate_test_data(
+        args.output,
+        args.backend,
+        days=args.days,
+        users=args.users,
+        sessions_per_day=(args.min_sessions, args.max_sessions),
+        inactive_rate=args.inactive_rate,
+        seed=args.seed
+    )
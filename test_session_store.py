@@ -0,0 +1,346 @@
+import os
+import random
+import sqlite3
+import threading
+from datetime import date, datetime
+
+import pytest
+
+import range_stats
+import session_compaction
+import session_split
+import session_store
+
+BACKENDS = ('json', 'journal', 'sqlite')
+
+
+def open_backend(tmp_path, mode, readonly=False):
+    path = os.path.join(tmp_path, 'session_data.json')
+    storage = {'mode': mode, 'database': os.path.join(tmp_path, 'session_data.db')}
+    return session_store.open_store(path, storage, readonly=readonly)
+
+
+def make_session(start_time, duration, date='2024-01-10', user_id='1'):
+    return {
+        'user_id': user_id,
+        'username': 'user' + user_id,
+        'start_time': start_time,
+        'end_time': start_time + duration,
+        'duration': duration,
+        'date': date
+    }
+
+
+@pytest.mark.parametrize('mode', BACKENDS)
+def test_save_after_compaction_adds_duration(tmp_path, mode):
+    store = open_backend(tmp_path, mode)
+    base = 1704877200
+    # Three 30 minute sessions with 10 minute gaps between them
+    for offset in (0, 2400, 4800):
+        store.save_session(make_session(base + offset, 1800))
+
+    counts = store.compact_history('2024-01-11', lambda s: session_compaction.compact_sessions(s, merge_gap=600))
+    assert counts == (3, 1)
+    [aggregate] = store.sessions()
+    assert aggregate['sessions'] == 3
+    assert aggregate['duration'] == 5400
+
+    # Starts within the merge threshold of the aggregate's end
+    record, merged = store.save_session(make_session(aggregate['end_time'] + 20, 380))
+    assert merged
+    assert record['duration'] == 5780
+    assert store.daily_totals() == [{
+        'user_id': '1', 'username': 'user1', 'date': '2024-01-10', 'total_duration': 5780, 'sessions': 3
+    }]
+    store.close()
+
+
+@pytest.mark.parametrize('mode', BACKENDS)
+def test_plain_merge_spans_the_gap(tmp_path, mode):
+    store = open_backend(tmp_path, mode)
+    store.save_session(make_session(1704877200, 600))
+    record, merged = store.save_session(make_session(1704877200 + 630, 300))
+    assert merged
+    assert record['duration'] == 930
+    assert store.daily_totals()[0]['total_duration'] == 930
+    store.close()
+
+
+def test_sqlite_export_is_a_snapshot(tmp_path):
+    store = open_backend(tmp_path, 'sqlite')
+    base = 1704877200
+    for day in range(3):
+        for offset in (0, 1200, 2400):
+            store.save_session(make_session(base + day * 86400 + offset, 600, date=f'2024-01-{10 + day}'))
+
+    exported = store.iter_sessions(batch_size=2)
+    first = [next(exported), next(exported)]
+    # Compacting and saving mid-export must not show up in it
+    store.compact_history('2024-01-20', lambda s: session_compaction.compact_sessions(s, merge_gap=600))
+    store.save_session(make_session(base + 5 * 86400, 600, date='2024-01-15'))
+    sessions = first + list(exported)
+
+    assert len(sessions) == 9
+    assert sum(s['duration'] for s in sessions) == 9 * 600
+    assert [s['date'] for s in store.sessions()] == ['2024-01-10', '2024-01-11', '2024-01-12', '2024-01-15']
+    store.close()
+
+
+def test_split_leaves_compacted_records_alone():
+    midnight = int(datetime(2024, 1, 11).timestamp())
+    plain = make_session(midnight - 1800, 3600)
+    aggregate = dict(make_session(midnight - 36000, 86400), duration=3000, sessions=4)
+
+    sessions, split = session_split.split_sessions([plain, aggregate])
+    assert split == 1
+    assert [(s['date'], s['duration']) for s in sessions] == [
+        ('2024-01-10', 1800), ('2024-01-11', 1800), ('2024-01-10', 3000)
+    ]
+    assert sessions[2] is aggregate
+    assert session_split.split_session(aggregate) == [aggregate]
+
+
+@pytest.mark.parametrize('mode', ('json', 'journal'))
+def test_reader_follows_writer(tmp_path, mode):
+    writer = open_backend(tmp_path, mode)
+    reader = open_backend(tmp_path, mode, readonly=True)
+    base = 1704877200
+    writer.save_session(make_session(base, 600))
+    assert reader.daily_totals()[0]['total_duration'] == 600
+
+    # A merge rewrites a record, a new day appends one
+    writer.save_session(make_session(base + 620, 300))
+    writer.save_session(make_session(base + 86400, 100, date='2024-01-11'))
+    assert [(r['date'], r['total_duration'], r['sessions']) for r in reader.daily_totals()] == [
+        ('2024-01-10', 920, 1), ('2024-01-11', 100, 1)
+    ]
+
+    writer.compact_history('2024-01-12', lambda s: session_compaction.compact_sessions(s, aggregate_before='2024-01-12'))
+    writer.save_session(make_session(base + 2 * 86400, 50, date='2024-01-12'))
+    assert reader.query_sessions() == writer.sessions()
+    assert reader.daily_totals() == writer.daily_totals()
+    writer.close()
+
+
+def rollup_usage(store):
+    import pandas as pd
+    import analysis
+
+    df = pd.DataFrame(store.daily_totals()).rename(columns={'total_duration': 'duration'})
+    df['date'] = pd.to_datetime(df['date'])
+    return analysis.daily_usage(df)
+
+
+@pytest.mark.parametrize('mode', BACKENDS)
+def test_history_loads_through_snapshot(tmp_path, mode, monkeypatch):
+    import analysis
+    import session_snapshot
+
+    store = open_backend(tmp_path, mode)
+    snapshot_dir = os.path.join(tmp_path, 'snapshot')
+    base = 1704877200
+    for day in range(3):
+        for user_id in ('1', '2'):
+            store.save_session(make_session(base + day * 86400, 600 * int(user_id), f'2024-01-{10 + day}', user_id))
+
+    df = session_snapshot.load_history(store, snapshot_dir)
+    assert os.path.exists(os.path.join(snapshot_dir, 'meta.json'))
+    daily, users = analysis.daily_usage(df)
+    assert users == rollup_usage(store)[1]
+
+    # Later loads only re-read the last snapshot day and anything newer
+    writes = []
+    write_snapshot = session_snapshot._write_snapshot
+    monkeypatch.setattr(session_snapshot, '_write_snapshot',
+                        lambda directory, previous, keep, tail: writes.append((keep, len(tail))) or
+                        write_snapshot(directory, previous, keep, tail))
+    store.save_session(make_session(base + 2 * 86400 + 3600, 300, '2024-01-12', '1'))
+    store.save_session(make_session(base + 3 * 86400, 900, '2024-01-13', '2'))
+    df = session_snapshot.load_history(store, snapshot_dir)
+    assert writes == [(4, 4)]
+    assert analysis.daily_usage(df)[1] == rollup_usage(store)[1]
+
+    recent = session_snapshot.load_history(store, snapshot_dir, since='2024-01-12')
+    assert sorted(recent['date'].astype(str).unique()) == ['2024-01-12', '2024-01-13']
+    assert recent['duration'].sum() == 600 + 1200 + 300 + 900
+    store.close()
+
+
+@pytest.mark.parametrize('mode', BACKENDS)
+def test_subscribers_get_the_stored_session(tmp_path, mode):
+    store = open_backend(tmp_path, mode)
+    events = []
+    store.subscribe(lambda session, duration, sessions: events.append(
+        (session['start_time'], session['end_time'], session['duration'], duration, sessions)))
+    store.save_session(make_session(1000, 600))
+    store.save_session(make_session(1620, 80))
+    assert events == [(1000, 1600, 600, 600, 1), (1000, 1700, 700, 100, 0)]
+    store.close()
+
+
+class FailingCommit:
+    """Connection wrapper whose transactions roll back instead of committing"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, *exc):
+        self._conn.rollback()
+        raise sqlite3.OperationalError('database is locked')
+
+
+def test_sqlite_does_not_notify_rolled_back_saves(tmp_path):
+    store = open_backend(tmp_path, 'sqlite')
+    events = []
+    store.subscribe(lambda *args: events.append(args))
+
+    conn, store._conn = store._conn, FailingCommit(store._conn)
+    with pytest.raises(sqlite3.OperationalError):
+        store.save_session(make_session(1000, 600))
+    store._conn = conn
+    assert events == []
+    assert store.sessions() == []
+    store.close()
+
+
+def test_journal_recovers_from_a_torn_tail(tmp_path):
+    store = open_backend(tmp_path, 'journal')
+    store.save_session(make_session(1704877200, 600))
+    store.close()
+    # Crash halfway through appending the next record
+    with open(session_store.journal_path_for(os.path.join(tmp_path, 'session_data.json')), 'a') as f:
+        f.write('{"seq":1,"session":{"user_id":"3","user')
+
+    store = open_backend(tmp_path, 'journal')
+    store.save_session(make_session(1704880800, 300, user_id='2'))
+    store.close()
+
+    store = open_backend(tmp_path, 'journal')
+    assert [(s['user_id'], s['duration']) for s in store.sessions()] == [('1', 600), ('2', 300)]
+    store.close()
+
+
+@pytest.mark.parametrize('mode', ('json', 'journal'))
+def test_compaction_writes_without_blocking_saves(tmp_path, mode, monkeypatch):
+    store = open_backend(tmp_path, mode)
+    base = 1704877200
+    for offset in (0, 2400, 4800):
+        store.save_session(make_session(base + offset, 1800))
+    store.save_session(make_session(base + 86400, 600, date='2024-01-11', user_id='2'))
+
+    saved = []
+    write_json = session_store._write_json
+
+    def write_and_save(path, sessions):
+        if threading.current_thread() is threading.main_thread() and not saved:
+            # A merge and a new session from another thread mid-write
+            def save():
+                saved.append(store.save_session(make_session(base + 86400 + 620, 100, date='2024-01-11', user_id='2')))
+                saved.append(store.save_session(make_session(base + 90000, 60, date='2024-01-11', user_id='3')))
+            saver = threading.Thread(target=save)
+            saver.start()
+            saver.join(timeout=5)
+            assert len(saved) == 2, "save blocked by compaction"
+        write_json(path, sessions)
+
+    monkeypatch.setattr(session_store, '_write_json', write_and_save)
+    counts = store.compact_history('2024-01-11', lambda s: session_compaction.compact_sessions(s, merge_gap=600))
+    assert counts == (3, 1)
+    expected = [('1', '2024-01-10', 5400), ('2', '2024-01-11', 720), ('3', '2024-01-11', 60)]
+    assert [(s['user_id'], s['date'], s['duration']) for s in store.sessions()] == expected
+    totals = store.daily_totals()
+    store.close()
+
+    reopened = open_backend(tmp_path, mode)
+    assert [(s['user_id'], s['date'], s['duration']) for s in reopened.sessions()] == expected
+    assert reopened.daily_totals() == totals
+    reopened.close()
+
+
+@pytest.mark.parametrize('crash_at', range(4))
+def test_journal_rewrite_survives_a_crash(tmp_path, monkeypatch, crash_at):
+    store = open_backend(tmp_path, 'journal')
+    base = 1704877200
+    for offset in (0, 2400, 4800):
+        store.save_session(make_session(base + offset, 1800))
+    store.save_session(make_session(base + 86400, 600, date='2024-01-11', user_id='2'))
+    store.compact()
+    # Left in the journal, at positions the rewrite moves
+    store.save_session(make_session(base + 86400 + 620, 100, date='2024-01-11', user_id='2'))
+    store.save_session(make_session(base + 90000, 60, date='2024-01-11', user_id='3'))
+    old = [(s['user_id'], s['date'], s['duration'], s.get('sessions', 1)) for s in store.sessions()]
+    new = [('1', '2024-01-10', 5400, 3), ('2', '2024-01-11', 720, 1), ('3', '2024-01-11', 60, 1)]
+
+    # Fail the crash_at'th file rename/removal and everything after it
+    calls = []
+
+    def crashing(real):
+        def operation(*args):
+            calls.append(args)
+            if len(calls) > crash_at:
+                raise OSError('crash')
+            return real(*args)
+        return operation
+    monkeypatch.setattr(os, 'replace', crashing(os.replace))
+    monkeypatch.setattr(os, 'remove', crashing(os.remove))
+    try:
+        store.compact_history('2024-01-11', lambda s: session_compaction.compact_sessions(s, merge_gap=600))
+    except OSError:
+        pass
+    monkeypatch.undo()
+
+    reader = open_backend(tmp_path, 'journal', readonly=True)
+    seen_by_reader = [(s['user_id'], s['date'], s['duration'], s.get('sessions', 1)) for s in reader.sessions()]
+    restarted = open_backend(tmp_path, 'journal')
+    recovered = [(s['user_id'], s['date'], s['duration'], s.get('sessions', 1)) for s in restarted.sessions()]
+    assert recovered in (old, new)
+    assert seen_by_reader == recovered
+    restarted.close()
+
+
+def brute_force_range(sessions, user_id, since, until):
+    matching = [s for s in sessions if s['user_id'] == user_id and since <= s['date'] <= until]
+    return (sum(s['duration'] for s in matching), sum(s.get('sessions', 1) for s in matching),
+            len({s['date'] for s in matching}))
+
+
+@pytest.mark.parametrize('mode', BACKENDS)
+def test_range_index_matches_brute_force(tmp_path, mode):
+    rng = random.Random(7)
+    store = open_backend(tmp_path, mode)
+    first_day = date(2024, 3, 1).toordinal()
+
+    def save_random(days):
+        user_id = rng.choice('123')
+        day = date.fromordinal(first_day + rng.choice(days))
+        start = int(datetime(day.year, day.month, day.day, rng.randrange(20)).timestamp())
+        record, _ = store.save_session(make_session(start, rng.randrange(60, 3600), day.isoformat(), user_id))
+        if rng.random() < 0.3:
+            # Continues the session just saved, so it merges into it
+            store.save_session(make_session(record['end_time'] + 30, rng.randrange(60, 600), day.isoformat(), user_id))
+
+    for _ in range(150):
+        save_random(range(60, 120))
+    index = range_stats.RangeIndex.from_store(store)
+    store.subscribe(index.on_save)
+    # Out of order: days inside the range, days before the first one (the
+    # series is prepended) and far past its end (it grows)
+    for _ in range(300):
+        save_random(range(0, 300))
+
+    sessions = store.sessions()
+    for _ in range(200):
+        a, b = sorted(rng.randrange(-10, 310) for _ in range(2))
+        since, until = date.fromordinal(first_day + a).isoformat(), date.fromordinal(first_day + b).isoformat()
+        for user_id in '124':
+            stats = index.query(user_id, since, until)
+            expected = brute_force_range(sessions, user_id, since, until)
+            assert (stats['total_duration'], stats['sessions'], stats['active_days']) == expected
+            assert stats['days'] == b - a + 1
+    store.close()
@@ -0,0 +1,130 @@
+import pytest
+import requests
+
+import webhook_dispatcher
+from webhook_dispatcher import WebhookDispatcher
+
+URL = 'https://discord.com/api/webhooks/1/a'
+OTHER_URL = 'https://discord.com/api/webhooks/2/b'
+
+
+class Response:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {}
+        self._body = body
+
+    def json(self):
+        if self._body is None:
+            raise ValueError('no body')
+        return self._body
+
+
+class FakeSession:
+    """Answers each post with the next scripted response or exception"""
+
+    def __init__(self, outcomes=()):
+        self.outcomes = list(outcomes)
+        self.posts = []
+
+    def post(self, url, timeout=None, **kwargs):
+        self.posts.append((url, kwargs))
+        outcome = self.outcomes.pop(0) if self.outcomes else Response(204)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(webhook_dispatcher.time, 'sleep', delays.append)
+    return delays
+
+
+def dispatcher_with(session, **options):
+    dispatcher = WebhookDispatcher(**options)
+    dispatcher._session = lambda url: session
+    return dispatcher
+
+
+def test_lines_for_one_webhook_are_coalesced():
+    session = FakeSession()
+    dispatcher = dispatcher_with(session, coalesce_window=0.2)
+    dispatcher.send_text(URL, 'alice came online', 'bot', None)
+    dispatcher.send_text(URL, 'bob came online', 'bot', None)
+    dispatcher.send_text(OTHER_URL, 'carol came online', 'bot', None)
+    dispatcher.send_text(OTHER_URL, '```already fenced```', 'bot', None)
+    assert dispatcher.flush(timeout=5)
+
+    contents = [(url, kwargs['json']['content']) for url, kwargs in session.posts]
+    assert contents == [
+        (URL, '```\nalice came online\nbob came online\n```'),
+        (OTHER_URL, '```\ncarol came online\n```'),
+        (OTHER_URL, '```already fenced```'),
+    ]
+    assert dispatcher.sent == 3
+
+
+def test_coalescing_stops_at_the_message_limit():
+    session = FakeSession()
+    dispatcher = dispatcher_with(session, coalesce_window=0.2)
+    for _ in range(3):
+        dispatcher.send_text(URL, 'x' * 900, 'bot', None)
+    assert dispatcher.flush(timeout=5)
+
+    contents = [kwargs['json']['content'] for _, kwargs in session.posts]
+    assert [content.count('x') for content in contents] == [1800, 900]
+    assert all(len(content) <= webhook_dispatcher.DISCORD_MESSAGE_LIMIT for content in contents)
+
+
+@pytest.mark.parametrize('failure', [
+    requests.ConnectionError('reset'),
+    requests.Timeout('timed out'),
+    Response(500),
+    Response(503),
+])
+def test_transient_failures_are_retried(sleeps, failure):
+    session = FakeSession([failure, failure])
+    dispatcher = dispatcher_with(session, max_retries=5)
+
+    assert dispatcher._post(URL, {'json': {}})
+    assert len(session.posts) == 3
+    assert sleeps == [0.5, 1.0]
+    assert (dispatcher.sent, dispatcher.failed) == (1, 0)
+
+
+def test_rate_limits_wait_for_retry_after(sleeps):
+    session = FakeSession([Response(429, {'retry_after': 2.5})])
+    dispatcher = dispatcher_with(session)
+
+    assert dispatcher._post(URL, {'json': {}})
+    assert sleeps == [2.5]
+
+
+@pytest.mark.parametrize('failure', [
+    requests.exceptions.MissingSchema('no schema'),
+    requests.exceptions.InvalidURL('bad url'),
+    requests.exceptions.InvalidSchema('no adapter'),
+    Response(400),
+    Response(401),
+    Response(404),
+])
+def test_permanent_failures_fail_fast(sleeps, failure):
+    session = FakeSession([failure])
+    dispatcher = dispatcher_with(session, max_retries=5)
+
+    assert not dispatcher._post(URL, {'json': {}})
+    assert len(session.posts) == 1
+    assert sleeps == []
+    assert (dispatcher.sent, dispatcher.failed) == (0, 1)
+
+
+def test_retries_give_up_after_max_retries(sleeps):
+    session = FakeSession([Response(502)] * 10)
+    dispatcher = dispatcher_with(session, max_retries=2)
+
+    assert not dispatcher._post(URL, {'json': {}})
+    assert len(session.posts) == 3
+    assert len(sleeps) == 2
+    assert dispatcher.failed == 1
@@ -0,0 +1,184 @@
+import logging
+import queue
+import threading
+import time
+
+import requests
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+REQUEST_SECONDS = metrics.REGISTRY.histogram(
+    'webhook_request_seconds', 'Webhook POST latency per attempt', ('status',))
+
+DISCORD_MESSAGE_LIMIT = 2000
+CODE_FENCE = "```"
+
+
+class WebhookDispatcher:
+    """
+    Background sender for Discord webhooks
+
+    Callers only enqueue; a single worker thread posts messages in order
+    over one keep-alive requests.Session per webhook URL. Consecutive log
+    lines for the same webhook and identity are coalesced into one message
+    (up to Discord's 2000 character limit). Connection errors, timeouts
+    and 429/5xx responses are retried with backoff, honouring Discord's
+    retry_after hint; an invalid URL or any other 4xx fails straight away.
+    """
+
+    def __init__(self, max_queue=1000, coalesce_window=0.5, max_retries=5):
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._sessions = {}
+        self._pending = None
+        self._thread = threading.Thread(target=self._run, name='webhook-dispatcher', daemon=True)
+        self._thread.start()
+
+    def send_text(self, url, text, username, avatar_url):
+        """Queue a plain log line for a webhook"""
+        self._put({'url': url, 'text': text, 'username': username, 'avatar_url': avatar_url})
+
+    def send_payload(self, url, json=None, data=None, files=None):
+        """Queue a prepared payload (embeds, attachments) that is sent as-is"""
+        self._put({'url': url, 'json': json, 'data': data, 'files': files})
+
+    def pending(self):
+        """Return the number of queued messages not yet sent"""
+        return self._queue.unfinished_tasks
+
+    def flush(self, timeout=10):
+        """
+        Wait until every queued message has been sent
+
+        Returns:
+            bool: True if the queue drained within timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+            log.error("Webhook queue full, dropping message")
+
+    def _next_item(self, timeout=None):
+        if self._pending is not None:
+            item, self._pending = self._pending, None
+            return item
+        return self._queue.get(timeout=timeout)
+
+    def _run(self):
+        while True:
+            item = self._next_item()
+            batch = [item]
+            try:
+                if 'text' in item and CODE_FENCE not in item['text']:
+                    self._coalesce(batch)
+                self._deliver(batch)
+            except Exception as e:
+                log.error(f"Webhook error: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _coalesce(self, batch):
+        # Keep pulling lines for the same webhook/identity until the window
+        # closes or the next line would not fit in one message
+        first = batch[0]
+        length = len(first['text']) + len(CODE_FENCE) * 2 + 2
+        deadline = time.monotonic() + self.coalesce_window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                item = self._next_item(timeout=remaining)
+            except queue.Empty:
+                return
+
+            if ('text' not in item or CODE_FENCE in item['text'] or
+                    (item['url'], item['username']) != (first['url'], first['username']) or
+                    length + len(item['text']) + 1 > DISCORD_MESSAGE_LIMIT):
+                self._pending = item
+                return
+            batch.append(item)
+            length += len(item['text']) + 1
+
+    def _deliver(self, batch):
+        first = batch[0]
+        if 'text' in first:
+            content = "\n".join(item['text'] for item in batch)
+            if CODE_FENCE not in content:
+                content = f"{CODE_FENCE}\n{content}\n{CODE_FENCE}"
+            if len(content) > DISCORD_MESSAGE_LIMIT:
+                content = content[:DISCORD_MESSAGE_LIMIT - 1] + "…"
+            kwargs = {'json': {
+                'username': first['username'],
+                'avatar_url': first['avatar_url'],
+                'content': content
+            }}
+        else:
+            kwargs = {key: first[key] for key in ('json', 'data', 'files') if first[key] is not None}
+
+        self._post(first['url'], kwargs)
+
+    def _session(self, url):
+        session = self._sessions.get(url)
+        if session is None:
+            session = self._sessions[url] = requests.Session()
+        return session
+
+    def _post(self, url, kwargs):
+        for attempt in range(self.max_retries + 1):
+            delay = min(2 ** attempt * 0.5, 30)
+            start = time.perf_counter()
+            try:
+                response = self._session(url).post(url, timeout=10, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, status='error')
+                log.error(f"Webhook error: {str(e)}")
+            except requests.RequestException as e:
+                # An invalid URL or schema fails the same way on every attempt
+                REQUEST_SECONDS.observe(time.perf_counter() - start, status='error')
+                log.error(f"Webhook error: {str(e)}")
+                break
+            else:
+                REQUEST_SECONDS.observe(time.perf_counter() - start, status=response.status_code)
+                if response.status_code < 400:
+                    self.sent += 1
+                    return True
+                if response.status_code != 429 and response.status_code < 500:
+                    log.error(f"Webhook error: {response.status_code}")
+                    break
+                delay = self._retry_after(response, delay)
+
+            if attempt < self.max_retries:
+                time.sleep(delay)
+
+        self.failed += 1
+        return False
+
+    @staticmethod
+    def _retry_after(response, default):
+        try:
+            return float(response.json()['retry_after'])
+        except Exception:
+            pass
+        try:
+            return float(response.headers['Retry-After'])
+        except Exception:
+            return default
@@ -0,0 +1,125 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+
+log = logging.getLogger(__name__)
+
+
+class Stage:
+    """
+    A named pipeline stage: bounded queues drained by worker threads
+
+    Each shard has its own queue and thread. Items submitted with the same
+    key always land on the same shard, so they are handled in submission
+    order (e.g. presence updates per user); items without a key are spread
+    round-robin.
+
+    When a shard's queue is full, submit() blocks for up to put_timeout
+    seconds (counted as backpressure) and then drops the item.
+    """
+
+    def __init__(self, name, handler, shards=1, max_queue=1000, put_timeout=1.0):
+        self.name = name
+        self.handler = handler
+        self.put_timeout = put_timeout
+        self.submitted = 0
+        self.processed = 0
+        self.errors = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.max_depth = 0
+        self.busy_time = 0.0
+        self._next_shard = 0
+        self._stats_lock = threading.Lock()
+        self._queues = [queue.Queue(maxsize=max_queue) for _ in range(shards)]
+        self._threads = []
+        for i, q in enumerate(self._queues):
+            thread = threading.Thread(target=self._run, args=(q,), name=f'{name}-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _shard_for(self, key):
+        if key is None:
+            self._next_shard = (self._next_shard + 1) % len(self._queues)
+            return self._queues[self._next_shard]
+        return self._queues[zlib.crc32(str(key).encode()) % len(self._queues)]
+
+    def submit(self, item, key=None):
+        """
+        Queue an item for the stage
+
+        Returns:
+            bool: False if the item was dropped because the stage is full
+        """
+        with self._stats_lock:
+            q = self._shard_for(key)
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            self.blocked += 1
+            try:
+                q.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                self.dropped += 1
+                log.error(f"{self.name} queue full, dropping item")
+                return False
+
+        with self._stats_lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, q.qsize())
+        return True
+
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def drain(self, timeout=10):
+        """
+        Wait until every queued item has been handled
+
+        Returns:
+            bool: True if all shards drained within timeout
+        """
+        deadline = time.monotonic() + timeout
+        for q in self._queues:
+            with q.all_tasks_done:
+                while q.unfinished_tasks:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    q.all_tasks_done.wait(remaining)
+        return True
+
+    def stats(self):
+        """Return the stage counters as a dict"""
+        return {
+            'name': self.name,
+            'depth': self.depth(),
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'processed': self.processed,
+            'errors': self.errors,
+            'blocked': self.blocked,
+            'dropped': self.dropped,
+            'busy_seconds': round(self.busy_time, 3)
+        }
+
+    def _run(self, q):
+        while True:
+            item = q.get()
+            start = time.perf_counter()
+            failed = False
+            try:
+                self.handler(item)
+            except Exception as e:
+                failed = True
+                log.error(f"{self.name} worker failed: {str(e)}")
+            finally:
+                with self._stats_lock:
+                    if failed:
+                        self.errors += 1
+                    else:
+                        self.processed += 1
+                    self.busy_time += time.perf_counter() - start
+                q.task_done()